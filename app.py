@@ -1,8 +1,12 @@
+import os
+
 from datetime import datetime
 from optparse import OptionParser
 
+from groupme.bulk import bulk_fetch
+from groupme.export import export_messages
 from groupme.filter import MessageFilter
-from groupme.groupme import GroupMe
+from groupme.leaderboard_store import LeaderboardStore
 from groupme.group_stats import *
 
 
@@ -23,6 +27,19 @@ DATEBEFORE_HELP = "Filter messages on or before exact date e.g. --filter_dateBef
 SEND_HELP = "Send message with provided text to chosen group/chat.  Use --group_name='<GROUP NAME>' flag to send to" + \
             " a selected group.  Use --chat_name='<CHAT USER NAME>' flag to send to selected direct message. " + \
             "e.g. python3 demo.py --send_message='Hello!' --group_name='Football Chat'"
+EXPORT_HELP = "Stream all messages (matching any filters) from the group/chat chosen with --group_name/--chat_name to a " + \
+              "JSON Lines file, gzipped if it ends in .gz.  Rerunning an interrupted export resumes it " + \
+              "e.g. --export='football.jsonl.gz' --group_name='Football Chat'"
+LEADERBOARDS_HELP = "Save leaderboard tallies to this file so later --group_rank_*/--group_most_liked_post/" + \
+                   "--orphaned_users runs only fetch new messages (default: $GROUPME_LEADERBOARDS) " + \
+                   "e.g. --leaderboards='leaderboards.json'"
+PROFILE_HELP = "After the action, print API calls per endpoint (count, latency, bytes, retries) and the time spent " + \
+               "waiting on the API vs decoding/filtering/aggregating e.g. --profile=True"
+FOLLOW_HELP = "Print new messages in the given groups (comma-separated, or 'all') as they're posted, until Ctrl-C.  " + \
+              "Quiet groups are polled less and less often, up to every --follow_interval seconds " + \
+              "e.g. --follow='Football Chat,Book Club'"
+BACKUP_HELP = "Download the full history of every group and direct message in parallel, one .jsonl file per " + \
+              "conversation, into the given directory e.g. --backup_all='./backup' [see --workers, --rate_limit]"
 
 def parse_input_date(d):
     try:
@@ -38,8 +55,8 @@ def parse_input_date(d):
 
 def main():
 
-    # Create a GroupMe API wrapper instance
-    g = GroupMe()
+    # Reuse the group_stats client so every action shares one connection pool
+    g = GM_INSTANCE
 
     # Set up command line options
     usage = "usage: interact with GroupMe API -- list chats/DMs/messages, send messages, " + \
@@ -62,6 +79,9 @@ def main():
                       help="Get all messages from a group message e.g. --get_group_messages='Football Chat'")
     parser.add_option("--filter_text", action="store", dest="filter_text", default=None,
                       help="Filter messages by regex text e.g. --filter_text='^Hello!$'")
+    parser.add_option("--filter_search", action="store", dest="filter_search", default=None,
+                      help="Filter messages by words, \"phrases\" and prefix* terms they all contain " + \
+                           "e.g. --filter_search='\"go birds\" eag*'")
     parser.add_option("--filter_user", action="store", dest="filter_user", default=None,
                       help="Filter messages by user who sent e.g. --filter_user='Rob'")
     parser.add_option("--filter_dateOn", action="store", dest="filter_dateOn", default=None, help=DATEON_HELP)
@@ -71,9 +91,20 @@ def main():
                       help="return number of messages fitting criteria i.e. --count=True")
     parser.add_option("--send_message", action="store", dest="send_message", default=None, help=SEND_HELP)
     parser.add_option("--group_name", action="store", dest="group_name", default=None, 
-                      help="Specify group to send message to e.g. --group_name='Football Chat'")
+                      help="Specify group to send message to (or --export) e.g. --group_name='Football Chat'")
     parser.add_option("--chat_name", action="store", dest="chat_name", default=None, 
-                      help="Specify user to send direct message to e.g. --chat_name='Rob'")
+                      help="Specify user to send direct message to (or --export) e.g. --chat_name='Rob'")
+    parser.add_option("--export", action="store", dest="export", default=None, help=EXPORT_HELP)
+    parser.add_option("--follow", action="store", dest="follow", default=None, help=FOLLOW_HELP)
+    parser.add_option("--follow_interval", action="store", dest="follow_interval", type="float", default=60,
+                      help="Longest wait in seconds between checks of a quiet group with --follow " + \
+                           "e.g. --follow_interval=30")
+    parser.add_option("--backup_all", action="store", dest="backup_all", default=None, help=BACKUP_HELP)
+    parser.add_option("--workers", action="store", dest="workers", type="int", default=8,
+                      help="Number of conversations to download at once with --backup_all e.g. --workers=16")
+    parser.add_option("--rate_limit", action="store", dest="rate_limit", type="float", default=None,
+                      help="Cap on API requests per second shared by all workers e.g. --rate_limit=20")
+    parser.add_option("--profile", action="store", dest="profile", default=None, help=PROFILE_HELP)
 
     # group_stats stuff
     parser.add_option("--group_rank_num_posts", action="store", dest="group_rank_num_posts", default=None,
@@ -94,6 +125,11 @@ def main():
     parser.add_option("--orphaned_users", action="store", dest="orphaned_users", default=None,
                       help="Find users that have left a group and list their usernames/GroupMe ID #s " + \
                            "e.g. --orphaned_users='Football Chat'")
+    parser.add_option("--leaderboards", action="store", dest="leaderboards",
+                      default=os.getenv('GROUPME_LEADERBOARDS'), help=LEADERBOARDS_HELP)
+    parser.add_option("--rescan_days", action="store", dest="rescan_days", type="float", default=7,
+                      help="With --leaderboards, re-read this many days of recent messages for new likes " + \
+                           "e.g. --rescan_days=3")
 
     # Grab input from command line
     (options, _) = parser.parse_args()
@@ -101,11 +137,22 @@ def main():
     # Let's look for any filter data and build that first
     message_filter = MessageFilter(username=options.filter_user,
                                    text=options.filter_text,
+                                   search=options.filter_search,
                                    date_on=parse_input_date(options.filter_dateOn),
                                    date_before=parse_input_date(options.filter_dateBefore),
-                                   date_after=parse_input_date(options.filter_dateAfter))
+                                   date_after=parse_input_date(options.filter_dateAfter),
+                                   groupme=g)
     filter_lambda = message_filter.filter_lambda()
 
+    # Every leaderboard requested this run, in report order, mapped to its group name
+    stats_options = {"num_posts": options.group_rank_num_posts,
+                     "num_likes": options.group_rank_num_likes,
+                     "num_liked": options.group_rank_num_liked,
+                     "len_posts": options.group_rank_len_posts,
+                     "most_liked": options.group_most_liked_post,
+                     "orphaned_users": options.orphaned_users}
+    requested_stats = {metric: groupname for metric, groupname in stats_options.items() if groupname}
+
     # Carry out specified action
     if options.get_dms:
         dms = g.get_chats()
@@ -149,51 +196,63 @@ def main():
 
     elif options.get_chat_messages:
 
-        messages = g.get_all_messages(name=options.get_chat_messages, chat=True, filt=filter_lambda)
-        if not messages:
-            print ("No messages match filter")
-            return
+        # Stream messages so neither printing nor counting holds the whole history in memory
+        messages = g.iter_messages(name=options.get_chat_messages, chat=True, filt=filter_lambda)
 
         if options.count:
-            print (f"\n# messages matching filter: {len(messages)}")
+            count = sum(1 for _ in messages)
+            if not count:
+                print ("No messages match filter")
+            else:
+                print (f"\n# messages matching filter: {count}")
         else:
             # TODO: probably a way to fold this and the below message-printer into one function
-            print ("")
-            if not messages:
-                print ("No messages match filter")
-                return
+            count = 0
             for message in messages:
+                if not count:
+                    print ("")
+                count += 1
                 message_meta = f"Sender: {message['name']} | " + \
                                 f"Date: {g.epoch_to_datetime(message['created_at']).date()}"
                 print (message_meta)
                 print (f"    Text: {message['text']}\n")
+            if not count:
+                print ("No messages match filter")
 
 
     elif options.get_group_messages:
 
-        messages = g.get_all_messages(name=options.get_group_messages, group=True, filt=filter_lambda)
-        if not messages:
-            print ("No messages match filter")
-            return
-
-        groupid = messages[0]['group_id']
-        members = g.get_group_members(groupid=groupid)
+        messages = g.iter_messages(name=options.get_group_messages, group=True, filt=filter_lambda)
 
         if options.count:
-            print (f"\n# messages matching filter: {len(messages)}")
+            count = sum(1 for _ in messages)
+            if not count:
+                print ("No messages match filter")
+            else:
+                print (f"\n# messages matching filter: {count}")
         else:
-            print ("")
+            groupid = g.get_group_id(options.get_group_messages)
+            users = g.user_directory()
+            count = 0
             for message in messages:
-                for member in members:
-                    if member['user_id'] == message['sender_id']:
-                        sender = member
-                sender_name = sender['nickname']
-                sender_nickname = sender['name']
+                if not count:
+                    print ("")
+                count += 1
+                sender = users.member(groupid, message['sender_id'])
+                if sender is not None:
+                    sender_name = sender['nickname']
+                    sender_nickname = sender['name']
+                else:  # Former member (or a system message): the name they posted under
+                    users.add_former_member(groupid, message['sender_id'], message['name'])
+                    sender_name = message['name']
+                    sender_nickname = users.name(message['sender_id']) or message['name']
                 message_meta = f"Sender: {sender_nickname} ({sender_name}) | " + \
                                 f"Date: {g.epoch_to_datetime(message['created_at']).date()}"
 
                 print (message_meta)
                 print (f"    Text: {message['text']}\n")
+            if not count:
+                print ("No messages match filter")
 
 
     elif options.send_message: 
@@ -206,27 +265,58 @@ def main():
         else:
             print ("Provide a --chat_name or --group_name! Try --help")
 
-    # group_stats stuff
-    elif options.group_rank_num_posts:
-        print (group_rank_num_posts(options.group_rank_num_posts))
-        
-    elif options.group_rank_num_likes:
-        print (group_rank_num_likes(options.group_rank_num_likes))
-
-    elif options.group_rank_num_liked:
-        print (group_rank_num_liked(options.group_rank_num_liked))
-
-    elif options.group_rank_len_posts:
-        print (group_rank_len_posts(options.group_rank_len_posts))
+    elif options.export:
+        if options.group_name:
+            count = export_messages(g, options.export, options.group_name, group=True, filt=filter_lambda)
+        elif options.chat_name:
+            count = export_messages(g, options.export, options.chat_name, chat=True, filt=filter_lambda)
+        else:
+            print ("Provide a --chat_name or --group_name! Try --help")
+            count = None
+        if count is not None:
+            print (f"\nExported {count} messages to \"{options.export}\"")
+
+    elif options.follow:
+        names = None if options.follow == "all" else [name.strip() for name in options.follow.split(",")]
+        messages = g.tail(group_names=names, filt=filter_lambda, max_interval=options.follow_interval)
+        group_names = {groupid: name for name, groupid in g.group_directory().group_ids.items()}
+        print (f"\nFollowing {options.follow} (Ctrl-C to stop)\n")
+        try:
+            for message in messages:
+                message_meta = f"[{group_names.get(message['group_id'], message['group_id'])}] " + \
+                               f"Sender: {message['name']} | Date: {g.epoch_to_datetime(message['created_at'])}"
+                print (message_meta)
+                print (f"    Text: {message['text']}\n")
+        except KeyboardInterrupt:
+            pass
 
-    elif options.group_most_liked_post:
-        print (group_most_liked_post(options.group_most_liked_post))
+    elif options.backup_all:
+        results = bulk_fetch(g, directory=options.backup_all, workers=options.workers, rate_limit=options.rate_limit,
+                             filt=filter_lambda)
+        print (f"\nBacked up {len(results)} conversations to \"{options.backup_all}\":")
+        for conversation, count in sorted(results.items()):
+            print (f"    {conversation}: {'FAILED' if count is None else count}")
 
-    elif options.orphaned_users:
-        print (orphaned_users(options.orphaned_users))
+    # group_stats stuff
+    elif requested_stats:
+        # Walk each group's history once no matter how many leaderboards were asked for
+        for groupname in dict.fromkeys(requested_stats.values()):
+            metrics = [metric for metric in requested_stats if requested_stats[metric] == groupname]
+            if options.leaderboards:
+                results = update_group_stats(groupname, metrics, store=LeaderboardStore(options.leaderboards),
+                                             rescan_window=options.rescan_days * 24 * 3600)
+            else:
+                results = group_stats(groupname, metrics)
+            for metric in metrics:
+                print (format_stat(metric, results[metric], groupname))
 
     else: # no input
         print ("Provide an action! Try --help")
 
+    if options.profile:
+        print (g.profile())
+
 if __name__ == "__main__":
-    main()
+    # Closing the client also saves the seek index and closes the archive
+    with GM_INSTANCE:
+        main()
@@ -0,0 +1,49 @@
+""" Benchmark GroupMe.split_message on generated multi-megabyte digest reports.
+
+    python3 -m benchmarks.bench_split_message [sizes in MB, default: 1 5 10 25 50]
+"""
+import os
+import random
+import sys
+import time
+
+os.environ.setdefault("GROUPME_TOKEN", "benchmark")
+
+from groupme.groupme import GroupMe
+
+
+def make_report(size, seed=0):
+    """ Leaderboard-style text: short lines, long paragraphs and the odd unbroken URL/blob. """
+
+    r = random.Random(seed)
+    words = ["Corey", "Burl", "Nick", "likes", "posts", "-", "Go", "Birds!", "(32.17)", "8,396", "the", "a"]
+    parts = []
+    total = 0
+    while total < size:
+        kind = r.random()
+        if kind < 0.7:
+            part = " ".join(r.choice(words) for _ in range(r.randint(2, 12)))
+        elif kind < 0.95:
+            part = " ".join(r.choice(words) for _ in range(r.randint(200, 600)))
+        else:
+            part = "https://i.groupme.com/" + "x" * r.randint(500, 3000)
+        parts.append(part)
+        total += len(part) + 1
+    return "\n".join(parts)[:size]
+
+
+def main(sizes_mb):
+    g = GroupMe()
+    print(f"{'size':>8} {'chunks':>9} {'seconds':>9} {'MB/s':>8}")
+    for mb in sizes_mb:
+        report = make_report(int(mb * 1024 * 1024))
+        start = time.perf_counter()
+        chunks = g.split_message(report)
+        elapsed = time.perf_counter() - start
+        assert all(len(chunk) <= 1000 for chunk in chunks)
+        assert len(report) - sum(len(chunk) for chunk in chunks) <= len(chunks) - 1
+        print(f"{mb:>6}MB {len(chunks):>9} {elapsed:>9.3f} {mb / elapsed:>8.1f}")
+
+
+if __name__ == "__main__":
+    main([float(arg) for arg in sys.argv[1:]] or [1, 5, 10, 25, 50])
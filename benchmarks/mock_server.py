@@ -0,0 +1,363 @@
+""" Local stand-in for the GroupMe v3 API, for benchmarks and tests that must run without a network.
+
+    Groups and direct messages are synthetic and generated on demand from a message's index, so a conversation
+    of millions of messages costs no memory.  Message ids increase (with gaps) and created_at increases with
+    them, like the real API; pages come newest-first and an exhausted history answers 304 Not Modified.
+    `push_url` is a Faye/Bayeux long-polling endpoint like GroupMe's push server: `add_message()` posts a new
+    message to a conversation and pushes it to subscribed clients, `drop_push_clients()` forgets them all.
+    `like()` adds likes to an existing message.
+
+    Usage:
+        with MockGroupMeServer(groups={"Bench Group": 100000}, chats={"Rob": 5000}, latency=0.01) as server:
+            g = GroupMe(api_token="mock", api_url=server.api_url)
+            g.get_all_messages(name="Bench Group", group=True)
+"""
+import itertools
+import json
+import random
+import threading
+import time
+import uuid
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+
+BASE_ID = 150000000000000000
+ID_STEP = 7919  # Gap between consecutive message ids
+BASE_TIME = 1500000000
+TIME_STEP = 600  # Seconds between consecutive messages
+
+WORDS = ["Go", "Birds!", "hello", "world", "lol", "who's", "in", "tonight?", "the", "game", "was", "great",
+         "Catan", "at", "8", "anyone", "seen", "this", "haha", "yes", "no", "maybe", "pizza", "Eagles"]
+
+
+class Conversation:
+    """ A synthetic group or direct message history of `size` messages. """
+
+    def __init__(self, kind, conversation_id, name, size, members, former_members, seed):
+
+        self.kind = kind
+        self.id = conversation_id
+        self.name = name
+        self.size = size
+        self.members = members
+        self.senders = [member['user_id'] for member in members] + [m['user_id'] for m in former_members]
+        self.names = {m['user_id']: m['name'] for m in members + former_members}
+        self.seed = seed
+        self.likes = {}  # message index -> user ids who liked it since it was generated
+
+    def message_id(self, i):
+        return BASE_ID + i * ID_STEP
+
+    def index_before(self, before_id):
+        """ Index of the newest message with id < before_id (-1 if none). """
+
+        return min(self.size - 1, (int(before_id) - BASE_ID - 1) // ID_STEP)
+
+    def index_after(self, after_id):
+        """ Index of the oldest message with id > after_id. """
+
+        return max(0, (int(after_id) - BASE_ID) // ID_STEP + 1)
+
+    def message(self, i):
+        r = random.Random(self.seed * 1000003 + i)
+        if r.random() < 0.01:
+            sender_id = "system"
+            name = "GroupMe"
+        else:
+            # Skewed towards the first few members, like real group chats
+            sender_id = self.senders[min(int(r.expovariate(0.15)), len(self.senders) - 1)]
+            name = self.names[sender_id]
+        text = " ".join(r.choice(WORDS) for _ in range(int(r.expovariate(0.12)) + 1))
+        attachments = []
+        if r.random() < 0.1:
+            attachments.append({"type": "image", "url": f"https://i.groupme.com/{r.getrandbits(64):x}.jpeg"})
+            if r.random() < 0.5:
+                text = None
+        num_likes = min(int(r.expovariate(0.6)), len(self.senders))
+        favorited_by = r.sample(self.senders, num_likes) if sender_id != "system" else []
+        favorited_by += self.likes.get(i, [])
+        message = {
+            "id": str(self.message_id(i)),
+            "source_guid": f"{r.getrandbits(128):032x}",
+            "created_at": BASE_TIME + i * TIME_STEP,
+            "user_id": sender_id,
+            "sender_id": sender_id,
+            "sender_type": "system" if sender_id == "system" else "user",
+            "name": name,
+            "avatar_url": f"https://i.groupme.com/avatar_{sender_id}",
+            "text": text,
+            "system": sender_id == "system",
+            "favorited_by": favorited_by,
+            "attachments": attachments,
+        }
+        if self.kind == "group":
+            message["group_id"] = self.id
+        else:
+            message["recipient_id"] = self.id
+            message["conversation_id"] = f"{self.id}+0"
+        return message
+
+    def page(self, before_id=None, after_id=None, since_id=None, limit=20):
+        """ Up to `limit` messages: newest-first before `before_id` (or from the newest), or oldest-first right
+            after `after_id`, or the newest ones after `since_id`. """
+
+        limit = min(int(limit), 100)
+        if after_id is not None:
+            first = self.index_after(after_id)
+            return [self.message(i) for i in range(first, min(self.size, first + limit))]
+        newest = self.size - 1 if before_id is None else self.index_before(before_id)
+        oldest = max(0, newest - limit + 1)
+        if since_id is not None:
+            oldest = max(oldest, self.index_after(since_id))
+        return [self.message(i) for i in range(newest, oldest - 1, -1)]
+
+
+class MockGroupMeServer:
+    """ Threaded HTTP server answering the endpoints GroupMe/AsyncGroupMe use.  `latency` (seconds) is added to
+        every request, and every `throttle_every`-th request (or a random `throttle_rate` fraction) gets a 429 with
+        a `retry_after` Retry-After header.  `requests` counts calls per endpoint and `sent` keeps POSTed bodies.
+        Push long-polls are held for up to `push_timeout` seconds waiting for a message. """
+
+    def __init__(self, groups=None, chats=None, members=20, former_members=3, latency=0.0, throttle_every=0,
+                 throttle_rate=0.0, retry_after=0, seed=0, host="127.0.0.1", port=0, push_timeout=1.0):
+
+        self.latency = latency
+        self.throttle_every = throttle_every
+        self.throttle_rate = throttle_rate
+        self.retry_after = retry_after
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.requests = {}
+        self.request_count = 0
+        self.sent = []
+        self.push_timeout = push_timeout
+        self.push_clients = {}  # Bayeux client id -> {"subscriptions": set of channels, "queue": [pushed messages]}
+        self.push_ids = itertools.count(1)
+        self.push_ready = threading.Condition(self.lock)
+
+        self.users = [{"user_id": str(1000 + i), "id": str(5000 + i), "name": f"User {i}",
+                       "nickname": f"Nickname {i}"} for i in range(members + former_members)]
+        current, former = self.users[:members], self.users[members:]
+        self.me = {"id": "999", "user_id": "999", "name": "Me"}
+
+        self.groups = {}
+        for n, (name, size) in enumerate((groups or {"Mock Group": 1000}).items()):
+            group_id = str(20000000 + n)
+            self.groups[group_id] = Conversation("group", group_id, name, size, current, former, seed + n)
+        self.chats = {}
+        for n, (name, size) in enumerate((chats or {}).items()):
+            user = {"user_id": str(3000 + n), "id": str(7000 + n), "name": name, "nickname": name}
+            self.chats[user['user_id']] = Conversation("chat", user['user_id'], name, size, [user, self.me], [],
+                                                       seed + 1000 + n)
+
+        self.server = ThreadingHTTPServer((host, port), self._handler())
+        self.server.daemon_threads = True
+        self.api_url = f"http://{host}:{self.server.server_address[1]}/v3"
+        self.push_url = f"http://{host}:{self.server.server_address[1]}/faye"
+        self.thread = None
+
+    def start(self):
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def group_id(self, name):
+        return next(group_id for group_id, group in self.groups.items() if group.name == name)
+
+    def add_message(self, conversation_id, push=True):
+        """ Post a new message to a group (or direct message, by the other user's id) and, with `push`, deliver
+            it to every push client subscribed to the user's channel.  Returns the message. """
+
+        conversation = self.groups.get(conversation_id) or self.chats[conversation_id]
+        with self.lock:
+            conversation.size += 1
+            message = conversation.message(conversation.size - 1)
+            if push:
+                kind = "line.create" if conversation.kind == "group" else "direct_message.create"
+                data = {"channel": f"/user/{self.me['id']}", "id": str(next(self.push_ids)),
+                        "data": {"type": kind, "alert": message["text"], "subject": message}}
+                for client in self.push_clients.values():
+                    if data["channel"] in client["subscriptions"]:
+                        client["queue"].append(data)
+                self.push_ready.notify_all()
+        return message
+
+    def like(self, conversation_id, index, user_ids):
+        """ Add likes from `user_ids` to the `index`-th (oldest first) message of a group or direct message. """
+
+        conversation = self.groups.get(conversation_id) or self.chats[conversation_id]
+        with self.lock:
+            conversation.likes.setdefault(index, []).extend(user_ids)
+
+    def drop_push_clients(self):
+        """ Forget every push client, like a push server restart; their next connect is told to re-handshake. """
+
+        with self.lock:
+            self.push_clients = {}
+            self.push_ready.notify_all()
+
+    def _push(self, message):
+        """ Answer one Bayeux message: handshake, subscribe to the user's channel, or a long-polling connect. """
+
+        channel = message.get("channel")
+        reply = {"channel": channel, "id": message.get("id")}
+        if channel == "/meta/handshake":
+            client_id = uuid.uuid4().hex
+            with self.lock:
+                self.push_clients[client_id] = {"subscriptions": set(), "queue": []}
+            return [dict(reply, successful=True, version="1.0", clientId=client_id,
+                         supportedConnectionTypes=["long-polling"],
+                         advice={"reconnect": "retry", "interval": 0, "timeout": int(self.push_timeout * 1000)})]
+
+        client = self.push_clients.get(message.get("clientId"))
+        if client is None:
+            return [dict(reply, successful=False, error="401::Unknown client",
+                         advice={"reconnect": "handshake", "interval": 0})]
+        if channel == "/meta/subscribe":
+            if message.get("subscription") != f"/user/{self.me['id']}" or \
+                    not (message.get("ext") or {}).get("access_token"):
+                return [dict(reply, successful=False, error="401::Unauthorized")]
+            with self.lock:
+                client["subscriptions"].add(message["subscription"])
+            return [dict(reply, successful=True, clientId=message["clientId"],
+                         subscription=message["subscription"])]
+        if channel == "/meta/connect":
+            with self.lock:
+                if not client["queue"]:
+                    self.push_ready.wait(self.push_timeout)
+                if self.push_clients.get(message["clientId"]) is not client:  # Dropped while waiting
+                    return [dict(reply, successful=False, error="401::Unknown client",
+                                 advice={"reconnect": "handshake", "interval": 0})]
+                pushed, client["queue"] = client["queue"], []
+            return [dict(reply, successful=True, clientId=message["clientId"],
+                         advice={"reconnect": "retry", "interval": 0,
+                                 "timeout": int(self.push_timeout * 1000)})] + pushed
+        return [dict(reply, successful=False, error=f"400::Unsupported channel {channel}")]
+
+    def _count(self, endpoint):
+        """ Record a request; returns True if it should be throttled. """
+
+        with self.lock:
+            self.requests[endpoint] = self.requests.get(endpoint, 0) + 1
+            self.request_count += 1
+            if self.throttle_every and self.request_count % self.throttle_every == 0:
+                return True
+            return self.throttle_rate and self.random.random() < self.throttle_rate
+
+    def _listing(self, items, query):
+        per_page = int(query.get("per_page", 10))
+        page = int(query.get("page", 1))
+        return items[(page - 1) * per_page:page * per_page]
+
+    def _group_json(self, group):
+        return {"id": group.id, "group_id": group.id, "name": group.name, "members": group.members,
+                "messages": {"count": group.size, "last_message_id": str(group.message_id(group.size - 1))}}
+
+    def _chat_json(self, chat):
+        return {"other_user": {"id": chat.id, "name": chat.name,
+                               "avatar_url": f"https://i.groupme.com/avatar_{chat.id}"},
+                "messages_count": chat.size, "last_message": {"id": str(chat.message_id(chat.size - 1))}}
+
+    def _handler(self):
+        mock = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            disable_nagle_algorithm = True  # Headers and body are separate writes; don't stall on delayed ACKs
+
+            def log_message(self, *args):
+                pass
+
+            def reply(self, code, body=None, headers=None):
+                raw = json.dumps(body).encode("utf-8") if body is not None else b""
+                self.send_response(code)
+                self.send_header("Content-Type", "application/json; charset=utf-8")
+                self.send_header("Content-Length", str(len(raw)))
+                for header, value in (headers or {}).items():
+                    self.send_header(header, value)
+                self.end_headers()
+                self.wfile.write(raw)
+
+            def route(self, method):
+                url = urlparse(self.path)
+                query = {key: values[0] for key, values in parse_qs(url.query).items()}
+                parts = url.path.strip("/").split("/")[1:]  # Drop the "v3" prefix
+                endpoint = "groups/{id}/messages" if len(parts) == 3 and parts[0] == "groups" else "/".join(parts)
+                if mock.latency:
+                    time.sleep(mock.latency)
+                if mock._count(f"{method} {endpoint}"):
+                    return self.reply(429, {"meta": {"code": 429}}, {"Retry-After": str(mock.retry_after)})
+                if query.get("token") is None:
+                    return self.reply(401, {"meta": {"code": 401, "errors": ["unauthorized"]}})
+                body = None
+                if method == "POST":
+                    length = int(self.headers.get("Content-Length", 0))
+                    body = json.loads(self.rfile.read(length) or b"{}")
+                return getattr(self, f"{method.lower()}_endpoint")(parts, query, body)
+
+            def do_GET(self):
+                self.route("GET")
+
+            def do_POST(self):
+                if urlparse(self.path).path == "/faye":
+                    return self.push()
+                self.route("POST")
+
+            def push(self):
+                """ Faye endpoint: a JSON array of Bayeux messages in, the array of replies out. """
+
+                with mock.lock:
+                    mock.requests["POST faye"] = mock.requests.get("POST faye", 0) + 1
+                length = int(self.headers.get("Content-Length", 0))
+                replies = []
+                for message in json.loads(self.rfile.read(length) or b"[]"):
+                    replies += mock._push(message)
+                return self.reply(200, replies)
+
+            def get_endpoint(self, parts, query, body):
+                if parts == ["groups"]:
+                    groups = [mock._group_json(group) for group in mock.groups.values()]
+                    return self.reply(200, {"response": mock._listing(groups, query)})
+                if parts == ["chats"]:
+                    chats = [mock._chat_json(chat) for chat in mock.chats.values()]
+                    return self.reply(200, {"response": mock._listing(chats, query)})
+                if parts == ["users", "me"]:
+                    return self.reply(200, {"response": mock.me})
+                if len(parts) == 3 and parts[0] == "groups" and parts[2] == "messages" and parts[1] in mock.groups:
+                    group = mock.groups[parts[1]]
+                    messages = group.page(query.get("before_id"), query.get("after_id"), query.get("since_id"),
+                                          query.get("limit", 20))
+                    if not messages:
+                        return self.reply(304)
+                    return self.reply(200, {"response": {"count": group.size, "messages": messages}})
+                if parts == ["direct_messages"] and query.get("other_user_id") in mock.chats:
+                    chat = mock.chats[query["other_user_id"]]
+                    messages = chat.page(query.get("before_id"), query.get("after_id"), query.get("since_id"),
+                                         query.get("limit", 20))
+                    if not messages:
+                        return self.reply(304)
+                    return self.reply(200, {"response": {"count": chat.size, "direct_messages": messages}})
+                return self.reply(404, {"meta": {"code": 404, "errors": ["not found"]}})
+
+            def post_endpoint(self, parts, query, body):
+                with mock.lock:
+                    mock.sent.append(body)
+                if len(parts) == 3 and parts[0] == "groups" and parts[1] in mock.groups:
+                    return self.reply(201, {"response": {"message": body.get("message")}})
+                if parts == ["direct_messages"]:
+                    return self.reply(201, {"response": {"direct_message": body.get("direct_message")}})
+                return self.reply(404, {"meta": {"code": 404, "errors": ["not found"]}})
+
+        return Handler
@@ -0,0 +1,180 @@
+""" Offline benchmark suite: throughput, per-request latency and peak memory of the history/filter/stats code paths,
+    run against the local MockGroupMeServer so results don't depend on the network or an API token.
+
+    python3 -m benchmarks.run_benchmarks --messages=100000 --latency=0.005
+    python3 -m benchmarks.run_benchmarks --only=get_all_messages,group_stats --throttle_every=50
+"""
+import os
+import statistics
+import time
+import tracemalloc
+
+from datetime import date, timedelta
+from optparse import OptionParser
+
+# Benchmark the API path: no archive/directory/seek-index files from the environment, and a dummy token
+for var in ("GROUPME_ARCHIVE", "GROUPME_DIRECTORY", "GROUPME_SEEK_INDEX"):
+    os.environ.pop(var, None)
+os.environ.setdefault("GROUPME_TOKEN", "benchmark")
+
+import groupme.group_stats as group_stats
+
+from benchmarks.mock_server import BASE_TIME, TIME_STEP, MockGroupMeServer
+from groupme.filter import MessageFilter
+from groupme.message import STATS_FIELDS
+from groupme.message_iterator import MessageIterator
+from groupme.reducers import RegexTally, WordCount, reduce_pages
+
+
+GROUP = "Benchmark Group"
+
+
+def count_pages(pages):
+    return sum(len(page) for page in pages)
+
+
+def has_next_loop(g):
+    it = MessageIterator(name=GROUP, group=True, groupme=g)
+    count = 0
+    while it.has_next():
+        count += len(it.next())
+    return count
+
+
+def prefetched_count(g):
+    with MessageIterator(name=GROUP, group=True, groupme=g, prefetch=True) as it:
+        return count_pages(it)
+
+
+def text_stats(g, executor=None):
+    """ CPU-heavy custom reducers: word counts and a regex tally per sender. """
+
+    reducers = {"words": WordCount(top=10), "pairs": RegexTally(r"(\w+) (\w+)", by="sender_id")}
+    reduce_pages(g.iter_pages(name=GROUP, group=True), reducers, executor=executor)
+    return sum(count for _, count in reducers["words"].result())
+
+
+def date_window(size):
+    """ A week in the middle of the synthetic history. """
+
+    middle = date.fromtimestamp(BASE_TIME + size // 2 * TIME_STEP)
+    return middle - timedelta(days=7), middle
+
+
+def scenarios(size):
+    after, before = date_window(size)
+    return {
+        "get_all_messages": lambda g: len(g.get_all_messages(name=GROUP, group=True)),
+        "get_all_messages(fields)":
+            lambda g: len(g.get_all_messages(name=GROUP, group=True, fields=STATS_FIELDS)),
+        "iter_messages": lambda g: sum(1 for _ in g.iter_messages(name=GROUP, group=True)),
+        "MessageIterator.has_next": has_next_loop,
+        "MessageIterator(prefetch)":
+            prefetched_count,
+        "MessageFilter(text)": lambda g: len(g.get_all_messages(
+            name=GROUP, group=True, filt=MessageFilter(text="Birds", groupme=g).filter_lambda())),
+        "MessageFilter(user)": lambda g: len(g.get_all_messages(
+            name=GROUP, group=True, filt=MessageFilter(username="User 1", groupme=g).filter_lambda())),
+        "MessageFilter(dates)": lambda g: len(g.get_all_messages(
+            name=GROUP, group=True,
+            filt=MessageFilter(date_after=after, date_before=before, groupme=g).filter_lambda())),
+        "group_rank_num_posts": lambda g: group_stats.group_rank_num_posts(GROUP),
+        "group_rank_num_likes": lambda g: group_stats.group_rank_num_likes(GROUP),
+        "group_rank_num_liked": lambda g: group_stats.group_rank_num_liked(GROUP),
+        "group_rank_len_posts": lambda g: group_stats.group_rank_len_posts(GROUP),
+        "group_most_liked_post": lambda g: group_stats.group_most_liked_post(GROUP),
+        "orphaned_users": lambda g: group_stats.orphaned_users(GROUP),
+        "group_stats(all)": lambda g: group_stats.group_stats(GROUP, list(group_stats.STATS)),
+        "group_stats(all, numpy)":
+            lambda g: group_stats.group_stats(GROUP, list(group_stats.STATS), backend="numpy"),
+        "group_stats(all, thread)":
+            lambda g: group_stats.group_stats(GROUP, list(group_stats.STATS), executor="thread"),
+        "group_stats(all, process)":
+            lambda g: group_stats.group_stats(GROUP, list(group_stats.STATS), executor="process"),
+        "reducers(text)": text_stats,
+        "reducers(text, process)": lambda g: text_stats(g, executor="process"),
+    }
+
+
+class RequestTimer:
+    """ Wraps a client's transport to record the wall time of every API call. """
+
+    def __init__(self, g):
+        self.latencies = []
+        request = g._request
+
+        def timed_request(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return request(*args, **kwargs)
+            finally:
+                self.latencies.append(time.perf_counter() - start)
+
+        g._request = timed_request
+
+
+def run(name, scenario, g, server, timer, memory):
+    """ Time one scenario, then (optionally) re-run it under tracemalloc for peak memory. """
+
+    timer.latencies.clear()
+    requests_before = server.request_count
+    start = time.perf_counter()
+    result = scenario(g)
+    elapsed = time.perf_counter() - start
+    requests = server.request_count - requests_before
+    latencies = sorted(timer.latencies)
+
+    peak = None
+    if memory:
+        tracemalloc.start()
+        scenario(g)
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+
+    return {
+        "name": name,
+        "seconds": elapsed,
+        "messages": result if isinstance(result, int) else None,
+        "requests": requests,
+        "latency_mean": statistics.mean(latencies) if latencies else 0.0,
+        "latency_p95": latencies[int(len(latencies) * 0.95)] if latencies else 0.0,
+        "peak_mb": peak / 2 ** 20 if peak is not None else None,
+    }
+
+
+def report(row):
+    messages = f"{row['messages']:>9,}" if row['messages'] is not None else f"{'-':>9}"
+    peak = f"{row['peak_mb']:>9.1f}" if row['peak_mb'] is not None else f"{'-':>9}"
+    return f"{row['name']:<28} {row['seconds']:>8.2f} {messages} {row['requests']:>8} " + \
+           f"{row['latency_mean'] * 1000:>9.2f} {row['latency_p95'] * 1000:>9.2f} {peak}"
+
+
+def main():
+    parser = OptionParser("usage: python3 -m benchmarks.run_benchmarks [options]")
+    parser.add_option("--messages", type="int", default=20000, help="Messages in the synthetic group")
+    parser.add_option("--members", type="int", default=50, help="Current members in the synthetic group")
+    parser.add_option("--latency", type="float", default=0.0, help="Seconds of latency added to every request")
+    parser.add_option("--throttle_every", type="int", default=0, help="Answer every Nth request with a 429")
+    parser.add_option("--only", default=None, help="Comma-separated scenario names (prefix match)")
+    parser.add_option("--no_memory", action="store_true", default=False, help="Skip the tracemalloc pass")
+    (options, _) = parser.parse_args()
+
+    with MockGroupMeServer(groups={GROUP: options.messages}, members=options.members, latency=options.latency,
+                           throttle_every=options.throttle_every) as server:
+        g = group_stats.GM_INSTANCE
+        g.api_url = server.api_url
+        timer = RequestTimer(g)
+
+        print(f"\n{options.messages:,} messages, {options.latency * 1000:.1f}ms latency" +
+              (f", 429 every {options.throttle_every} requests" if options.throttle_every else "") + "\n")
+        print(f"{'scenario':<28} {'seconds':>8} {'messages':>9} {'requests':>8} {'mean ms':>9} {'p95 ms':>9} " +
+              f"{'peak MB':>9}")
+        only = options.only.split(",") if options.only else None
+        for name, scenario in scenarios(options.messages).items():
+            if only and not any(name.startswith(prefix) for prefix in only):
+                continue
+            print(report(run(name, scenario, g, server, timer, not options.no_memory)))
+
+
+if __name__ == "__main__":
+    main()
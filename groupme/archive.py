@@ -0,0 +1,183 @@
+import json
+import sqlite3
+import threading
+
+from typing import Dict, Iterator, List
+
+from groupme.decoder import get_decoder
+
+
+class MessageArchive:
+    """ On-disk SQLite archive of group/chat message history, so repeat runs only fetch new messages.  When SQLite
+        has FTS5, message text is also indexed for full-text search (see `get_page(match=...)`). """
+
+    def __init__(self, path):
+
+        self.path = path
+        self.loads = get_decoder().loads  # Stored rows are JSON text; parse them with the fastest decoder installed
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.db.executescript("""
+            CREATE TABLE IF NOT EXISTS messages (
+                conversation TEXT NOT NULL,
+                id INTEGER NOT NULL,
+                created_at INTEGER NOT NULL,
+                data TEXT NOT NULL,
+                PRIMARY KEY (conversation, id)
+            );
+            CREATE TABLE IF NOT EXISTS sync_state (
+                conversation TEXT PRIMARY KEY,
+                head_id INTEGER,
+                tail_id INTEGER,
+                complete INTEGER NOT NULL DEFAULT 0
+            );
+        """)
+        self.fts = self._create_fts()
+        self.db.commit()
+
+
+    def _create_fts(self) -> bool:
+        """ Create the full-text index of message text (keyed by the messages table's rowid), indexing anything
+            archived before it existed.  Returns False if this SQLite build has no FTS5. """
+
+        exists = self.db.execute("SELECT 1 FROM sqlite_master WHERE name = 'messages_fts'").fetchone()
+        if exists:
+            return True
+        try:
+            self.db.execute('CREATE VIRTUAL TABLE messages_fts USING fts5(text, '
+                            'tokenize = "unicode61 remove_diacritics 0")')
+        except sqlite3.OperationalError:
+            return False
+        self.db.execute("INSERT INTO messages_fts (rowid, text) "
+                        "SELECT rowid, json_extract(data, '$.text') FROM messages")
+        return True
+
+
+    @staticmethod
+    def conversation_key(groupid=None, chatid=None) -> str:
+        """ Archive key for a group (`group:<id>`) or direct message (`chat:<other user id>`). """
+
+        return f"group:{groupid}" if groupid else f"chat:{chatid}"
+
+
+    def close(self):
+        self.db.close()
+
+
+    def store_page(self, conversation: str, page: List[Dict]):
+        """ Insert (or refresh, e.g. new likes) a page of raw API messages. """
+
+        rows = [(conversation, int(m['id']), int(m['created_at']), json.dumps(m)) for m in page]
+        with self.lock:
+            # Upsert rather than replace so a message keeps its rowid, which is also its full-text index key
+            self.db.executemany("INSERT INTO messages VALUES (?, ?, ?, ?) ON CONFLICT (conversation, id) "
+                                "DO UPDATE SET created_at = excluded.created_at, data = excluded.data", rows)
+            if self.fts:
+                self.db.executemany("INSERT OR REPLACE INTO messages_fts (rowid, text) "
+                                    "SELECT rowid, ? FROM messages WHERE conversation = ? AND id = ?",
+                                    [(m.get('text'), conversation, int(m['id'])) for m in page])
+            self.db.commit()
+
+
+    def get_state(self, conversation: str) -> Dict:
+        """ Sync watermarks: newest contiguous id, oldest contiguous id and whether history is complete. """
+
+        with self.lock:
+            row = self.db.execute("SELECT head_id, tail_id, complete FROM sync_state WHERE conversation = ?",
+                                  (conversation,)).fetchone()
+        if row is None:
+            return {"head_id": None, "tail_id": None, "complete": False}
+        return {"head_id": row[0], "tail_id": row[1], "complete": bool(row[2])}
+
+
+    def set_state(self, conversation: str, head_id=None, tail_id=None, complete=None):
+        """ Update whichever sync watermarks are given. """
+
+        state = self.get_state(conversation)
+        if head_id is not None:
+            state['head_id'] = int(head_id)
+        if tail_id is not None:
+            state['tail_id'] = int(tail_id)
+        if complete is not None:
+            state['complete'] = complete
+        with self.lock:
+            self.db.execute("INSERT OR REPLACE INTO sync_state VALUES (?, ?, ?, ?)",
+                            (conversation, state['head_id'], state['tail_id'], int(state['complete'])))
+            self.db.commit()
+
+
+    def get_page(self, conversation: str, before: int = 0, limit: int = 100, match: str = None) -> List[Dict]:
+        """ Read one page of archived messages newest-first, mirroring the API's `before_id` pagination.  With an
+            FTS5 `match` expression (see groupme.search), only messages whose text matches it are read, straight
+            from the full-text index; without FTS5 `match` is ignored and every message is returned. """
+
+        if match and self.fts:
+            return self.get_messages(conversation, self.search(conversation, match, before=before, limit=limit))
+        with self.lock:
+            if before:
+                rows = self.db.execute("SELECT data FROM messages WHERE conversation = ? AND id < ? "
+                                       "ORDER BY id DESC LIMIT ?", (conversation, int(before), limit)).fetchall()
+            else:
+                rows = self.db.execute("SELECT data FROM messages WHERE conversation = ? "
+                                       "ORDER BY id DESC LIMIT ?", (conversation, limit)).fetchall()
+        return [self.loads(row[0]) for row in rows]
+
+
+    def iter_pages(self, conversation: str, before: int = 0, limit: int = 100,
+                   match: str = None) -> Iterator[List[Dict]]:
+        """ Yield every archived page older than `before` (all of them by default), newest-first, optionally only
+            messages matching a full-text `match`. """
+
+        if match and self.fts:
+            # Run the search once, then read the matching messages a page at a time
+            ids = self.search(conversation, match, before=before)
+            for i in range(0, len(ids), limit):
+                yield self.get_messages(conversation, ids[i:i + limit])
+            return
+
+        page = self.get_page(conversation, before=before, limit=limit)
+        while page:
+            yield page
+            page = self.get_page(conversation, before=page[-1]['id'], limit=limit)
+
+
+    def search(self, conversation: str, match: str, before: int = 0, limit: int = -1) -> List[int]:
+        """ Ids (newest first) of archived messages older than `before` whose text matches FTS5 query `match`. """
+
+        # Drive the join from the full-text index; left to itself SQLite runs the MATCH once per message
+        query = ("SELECT m.id FROM messages_fts CROSS JOIN messages AS m ON m.rowid = messages_fts.rowid "
+                 "WHERE messages_fts MATCH ? AND m.conversation = ?")
+        params = [match, conversation]
+        if before:
+            query += " AND m.id < ?"
+            params.append(int(before))
+        with self.lock:
+            rows = self.db.execute(query + " ORDER BY m.id DESC LIMIT ?", params + [limit]).fetchall()
+        return [row[0] for row in rows]
+
+
+    def get_messages(self, conversation: str, ids: List[int]) -> List[Dict]:
+        """ The archived messages with these ids, newest first. """
+
+        if not ids:
+            return []
+        with self.lock:
+            rows = self.db.execute(f"SELECT data FROM messages WHERE conversation = ? AND id IN "
+                                   f"({', '.join('?' * len(ids))}) ORDER BY id DESC",
+                                   [conversation] + list(ids)).fetchall()
+        return [self.loads(row[0]) for row in rows]
+
+
+    def before_id(self, conversation: str, created_at: int) -> int:
+        """ Id of the oldest archived message created at/after `created_at` (0 if none), for use as `before`. """
+
+        with self.lock:
+            row = self.db.execute("SELECT MIN(id) FROM messages WHERE conversation = ? AND created_at >= ?",
+                                  (conversation, created_at)).fetchone()
+        return row[0] or 0
+
+
+    def count(self, conversation: str) -> int:
+        with self.lock:
+            return self.db.execute("SELECT COUNT(*) FROM messages WHERE conversation = ?",
+                                   (conversation,)).fetchone()[0]
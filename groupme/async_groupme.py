@@ -0,0 +1,344 @@
+import asyncio
+import json
+import logging
+import os
+
+from typing import Callable, Dict, List
+
+try:
+    import aiohttp
+except ImportError:  # Optional dependency, only needed for the asyncio client
+    aiohttp = None
+
+from groupme.decoder import JsonDecoder, get_decoder
+from groupme.directory import DirectoryCache
+from groupme.groupme import APIAuthException, APIServerException, BadMessageException, BadNameException, \
+                            BadRequestException, GroupMe, RateLimitException, new_source_guid
+from groupme.message import projection
+from groupme.ratelimit import RateLimiter, RetryPolicy
+
+
+class AsyncGroupMe:
+    """ asyncio counterpart to GroupMe.  Same methods, but awaitable, with every request sharing one pooled
+        aiohttp session and capped at `max_concurrency` in-flight requests. """
+
+    # Pure helpers don't touch the network, so share them with the blocking client
+    epoch_to_datetime = GroupMe.epoch_to_datetime
+    filter_response = GroupMe.filter_response
+    split_message = GroupMe.split_message
+
+    def __init__(self, api_token=os.getenv('GROUPME_TOKEN'), max_concurrency=100, pool_size=100, timeout=30,
+                 directory_ttl=300, rate_limit=None, retry_policy=None,
+                 api_url=os.getenv('GROUPME_API_URL', "https://api.groupme.com/v3"), json_decoder=None):
+        if aiohttp is None:
+            raise ImportError("AsyncGroupMe requires aiohttp, install it with `pip install aiohttp`.")
+        self.api_url = api_url
+        if api_token is None:
+            raise APIAuthException("No auth token provided, please set the GROUPME_TOKEN environment variable.")
+        self.api_token = api_token
+        self.pool_size = pool_size
+        self.timeout = aiohttp.ClientTimeout(total=timeout)
+        self.semaphore = asyncio.Semaphore(max_concurrency)
+        self.session = None  # Created on first use so it binds to the running event loop
+        self.directory = DirectoryCache(ttl=directory_ttl)
+        # Same optional rate budget and retry behaviour as the blocking client
+        self.rate_limiter = rate_limit if isinstance(rate_limit, RateLimiter) or not rate_limit \
+                            else RateLimiter(rate_limit)
+        self.retry_policy = retry_policy if retry_policy is not None else RetryPolicy()
+        self.decoder = json_decoder if isinstance(json_decoder, JsonDecoder) else get_decoder(json_decoder)
+
+
+    def _get_session(self):
+        if self.session is None or self.session.closed:
+            connector = aiohttp.TCPConnector(limit=self.pool_size)
+            self.session = aiohttp.ClientSession(connector=connector, timeout=self.timeout)
+        return self.session
+
+
+    async def close(self):
+        """ Release all pooled connections. """
+
+        if self.session is not None:
+            await self.session.close()
+
+
+    async def __aenter__(self):
+        return self
+
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+
+    async def _request(self, method, endpoint, **kwargs):
+        """ Send one API call through the shared rate limiter (if any), retrying rate limits (429), server errors
+            (5xx) and dropped connections with backoff, like GroupMe._request.  Returns (status code, body bytes). """
+
+        session = self._get_session()
+        url = f"{self.api_url}/{endpoint}"
+        attempt = 0
+        while True:
+            if self.rate_limiter is not None:
+                await asyncio.sleep(self.rate_limiter.reserve())
+            try:
+                async with self.semaphore:
+                    async with session.request(method, url, **kwargs) as response:
+                        code = response.status
+                        retry_after = response.headers.get("Retry-After")
+                        raw = await response.read()
+            except (aiohttp.ClientConnectionError, asyncio.TimeoutError):
+                if attempt >= self.retry_policy.max_retries:
+                    raise
+                await asyncio.sleep(self.retry_policy.delay(attempt))
+                attempt += 1
+                continue
+
+            if code == 429 or code >= 500:
+                if code == 429 and self.rate_limiter is not None:
+                    self.rate_limiter.throttled()
+                delay = self.retry_policy.delay(attempt, retry_after)
+                if attempt >= self.retry_policy.max_retries or delay is None:
+                    raise RateLimitException if code == 429 else APIServerException(code=code)
+                logging.warning(f"API {method} call: {url} | {code}, retrying in {delay:.1f}s")
+                await asyncio.sleep(delay)
+                attempt += 1
+                continue
+
+            if self.rate_limiter is not None:
+                self.rate_limiter.succeeded()
+            return code, raw
+
+
+    async def _api_request(self, endpoint, params=None):
+        """ Helper to do API GET calls. """
+
+        code, raw = await self._request("GET", endpoint, params=params)
+        if 200 <= code < 300:
+            logging.debug(f"API call: {self.api_url}/{endpoint} | {code}")
+            return self.decoder.loads(raw)
+        elif code == 304:  # Not Modified: nothing (newer/older) to return
+            logging.debug(f"API call: {self.api_url}/{endpoint} | 304, nothing new")
+        elif code in (401, 403):
+            raise APIAuthException
+        elif code >= 400:
+            raise BadRequestException(code=code)
+        else:
+            logging.error(f"ERROR: Bad API call: {self.api_url}/{endpoint} | {code}")
+
+
+    async def _api_request_post(self, endpoint, data, headers=None):
+        """ Helper to do API POST calls. """
+
+        all_headers = {"Content-Type": "application/json"}
+        if headers:  # Add additional headers to the default
+            all_headers.update(headers)
+
+        code, raw = await self._request("POST", endpoint, headers=all_headers, data=data)
+        logging.debug(f"API POST call: {self.api_url}/{endpoint} | {code}")
+        if 200 <= code < 300:
+            return self.decoder.loads(raw)
+        elif code in (401, 403):
+            raise APIAuthException
+        elif code > 400:
+            raise BadRequestException(code=code)
+        elif code == 400:
+            raise BadMessageException
+        else:
+            logging.error(f"ERROR: Bad API POST call: {self.api_url}/{endpoint} | {code}")
+
+
+    async def _get_listing(self, endpoint):
+        """ Page through a groups/chats listing 10 at a time. """
+
+        everything = []
+        params = {"token": self.api_token, "per_page": 10, "page": 1}
+        response = await self._api_request(endpoint, params=params)
+        while response['response'] is not None and response['response'] != []:
+            everything += response['response']
+            params['page'] += 1
+            response = await self._api_request(endpoint, params=params)
+        return everything
+
+
+    async def get_groups(self):
+        """ Get all groups the signed-in user is subscribed to. """
+
+        return await self._get_listing("groups")
+
+
+    async def get_chats(self):
+        """ Get all direct messages for signed-in user. """
+
+        return await self._get_listing("chats")
+
+
+    async def group_directory(self, refresh=False) -> DirectoryCache:
+        """ Directory with group names/ids/members loaded, re-fetching the group listing if it's stale. """
+
+        if refresh or self.directory.groups_stale():
+            self.directory.set_groups(await self.get_groups())
+        return self.directory
+
+
+    async def chat_directory(self, refresh=False) -> DirectoryCache:
+        """ Directory with direct message names/ids loaded, re-fetching the chat listing if it's stale. """
+
+        if refresh or self.directory.chats_stale():
+            self.directory.set_chats(await self.get_chats())
+        return self.directory
+
+
+    async def get_group_id(self, name):
+        """ Get internal ID for group chat with given `name`. """
+
+        cached = not self.directory.groups_stale()
+        groupid = (await self.group_directory()).group_id(name)
+        if groupid is None and cached:
+            groupid = (await self.group_directory(refresh=True)).group_id(name)  # Group may be newer than our cache
+        if groupid is None:
+            raise BadNameException(username=name)
+        return groupid
+
+
+    async def get_chat_id(self, username):
+        """ Get internal ID for direct message with given user `username`. """
+
+        cached = not self.directory.chats_stale()
+        chatid = (await self.chat_directory()).chat_id(username)
+        if chatid is None and cached:
+            chatid = (await self.chat_directory(refresh=True)).chat_id(username)  # Chat may be newer than our cache
+        if chatid is None:
+            raise BadNameException(username=username)
+        return chatid
+
+
+    async def get_group_members(self, name=None, groupid=None):
+        """ Get list of members for a given group via group `name` or internal `groupid`. """
+
+        cached = not self.directory.groups_stale()
+        members = (await self.group_directory()).members(name=name, groupid=groupid)
+        if members is None and cached:
+            members = (await self.group_directory(refresh=True)).members(name=name, groupid=groupid)
+        if members is None:
+            raise BadNameException(username=name)
+        return members
+
+
+    async def get_1page_group(self, groupid: int, before: int = 0, filt: Callable = None) -> List[Dict]:
+        """ Method for getting 1 page of messages from a group message. """
+
+        params = {"token": self.api_token, "limit": 100}
+        if before:
+            params["before_id"] = before
+        response = await self._api_request(f"groups/{groupid}/messages", params=params)
+        return self.filter_response(response, filt=filt)
+
+
+    async def get_1page_chat(self, chatid: int, before: int = 0, filt: Callable = None) -> List[Dict]:
+        """ Method for getting 1 page of messages from a direct message. """
+
+        params = {"token": self.api_token, "limit": 100, "other_user_id": chatid}
+        if before:
+            params["before_id"] = before
+        response = await self._api_request("direct_messages", params=params)
+        return self.filter_response(response, filt=filt)
+
+
+    async def get_1page_messages(self, name=None, groupid=None, chatid=None, before=0, group=False, chat=False,
+                                 filt=None) -> List[Dict]:
+        """ One page of messages from a group or direct message, by name or internal ID. """
+
+        if not name and not groupid and not chatid:
+            raise BadNameException(message="Must provide the name of a group message / direct message!")
+
+        if group:
+            if name and not groupid:
+                groupid = await self.get_group_id(name)
+            return await self.get_1page_group(groupid, before=before, filt=filt)
+        elif chat:
+            if name and not chatid:
+                chatid = await self.get_chat_id(name)
+            return await self.get_1page_chat(chatid, before=before, filt=filt)
+
+
+    async def get_all_messages(self, name=None, groupid=None, chatid=None, group=False, chat=False, filt=None,
+                               fields=None):
+        """ Helper to paginate messages -- paginates on id of last message.  With `fields` each message is a
+            CompactMessage holding only those fields. """
+
+        if not name and not groupid and not chatid:
+            raise BadNameException(message="Must provide the name of a group message / direct message!")
+
+        project = projection(fields)
+        all_messages = []
+        async for page in AsyncMessageIterator(self, name=name, groupid=groupid, chatid=chatid, group=group,
+                                               chat=chat, filt=filt):
+            all_messages += GroupMe.project_page(page, project)
+        return all_messages
+
+
+    async def send_message(self, text, name=None, groupid=None, chatid=None, group=False, chat=False):
+        """ Send message to specified group/chat. """
+
+        # Resolve the target once; long messages are sent as ordered chunks
+        if group and not groupid and name:
+            groupid = await self.get_group_id(name)
+        elif chat and not chatid and name:
+            chatid = await self.get_chat_id(name)
+
+        if len(text) > 1000:
+            for m in self.split_message(text):
+                await self.send_message(m, groupid=groupid, chatid=chatid, group=group, chat=chat)
+            return
+
+        if group and groupid:
+            data = {"message": {"source_guid": new_source_guid(), "text": text}}
+            return await self._api_request_post(f"groups/{groupid}/messages?token={self.api_token}",
+                                                json.dumps(data))
+        elif chat and chatid:
+            data = {"direct_message": {"source_guid": new_source_guid(), "recipient_id": chatid, "text": text}}
+            return await self._api_request_post(f"direct_messages?token={self.api_token}", json.dumps(data))
+
+
+class AsyncMessageIterator:
+    """ `async for` over the pages of a group/direct message history, newest first, with filters applied. """
+
+    def __init__(self, groupme: AsyncGroupMe, chat=False, group=False, name=None, groupid=None, chatid=None,
+                 filt=None, last=0):
+
+        self.groupme = groupme
+        self.chat = chat
+        self.group = group
+        self.name = name
+        self.groupid = groupid
+        self.chatid = chatid
+        self.filt = filt
+        self.last_mess_id = last
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        page = await self.next()
+        if page is None:
+            raise StopAsyncIteration
+        return page
+
+    async def next(self):
+        """ Get the next page of messages (None once history is exhausted), applying filters if specified. """
+
+        if self.group and not self.groupid:
+            self.groupid = await self.groupme.get_group_id(self.name)
+        elif self.chat and not self.chatid:
+            self.chatid = await self.groupme.get_chat_id(self.name)
+
+        if self.group:
+            page = await self.groupme.get_1page_group(self.groupid, before=self.last_mess_id)
+        else:
+            page = await self.groupme.get_1page_chat(self.chatid, before=self.last_mess_id)
+
+        if page is not None and len(page) > 0:
+            self.last_mess_id = page[-1]['id']
+            if self.filt:
+                page = self.filt(page)
+            return page
@@ -0,0 +1,119 @@
+import json
+import logging
+import os
+
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Callable, Dict, List
+
+from groupme.groupme import GroupMe
+from groupme.ratelimit import RateLimiter
+
+
+class JsonlSink:
+    """ Writes one conversation's messages to `<directory>/<kind>_<id>.jsonl`, one JSON message per line. """
+
+    def __init__(self, directory, conversation: Dict):
+
+        os.makedirs(directory, exist_ok=True)
+        self.path = os.path.join(directory, f"{conversation['kind']}_{conversation['id']}.jsonl")
+        self.file = open(self.path, "w", encoding="utf-8")
+
+    def write(self, page: List[Dict]):
+        self.file.writelines(json.dumps(message) + "\n" for message in page)
+
+    def close(self):
+        self.file.close()
+
+
+def list_conversations(groupme: GroupMe, groups=True, chats=True) -> List[Dict]:
+    """ Every group and/or direct message for the signed-in user as {"kind", "id", "name"} dicts. """
+
+    conversations = []
+    if groups:
+        conversations += [{"kind": "group", "id": group['id'], "name": group['name']}
+                          for group in groupme.get_groups()]
+    if chats:
+        conversations += [{"kind": "chat", "id": chat['other_user']['id'], "name": chat['other_user']['name']}
+                          for chat in groupme.get_chats()]
+    return conversations
+
+
+def log_progress(conversation: Dict, pages: int, messages: int, done: bool):
+    """ Default bulk_fetch progress callback, logs every 10th page and completion. """
+
+    if not done and pages % 10 != 0:
+        return
+    state = "done" if done else "fetching"
+    logging.info(f"{conversation['kind']} '{conversation['name']}': {messages} messages, {pages} pages ({state})")
+
+
+def fetch_conversation(groupme: GroupMe, conversation: Dict, sink, progress: Callable = None,
+                       filt: Callable = None) -> int:
+    """ Stream one conversation's full history into `sink`, page by page.  Returns # messages written. """
+
+    if conversation['kind'] == "group":
+        pages = groupme.iter_pages(groupid=conversation['id'], group=True, filt=filt)
+    else:
+        pages = groupme.iter_pages(chatid=conversation['id'], chat=True, filt=filt)
+
+    num_pages = 0
+    num_messages = 0
+    for page in pages:
+        sink.write(page)
+        num_pages += 1
+        num_messages += len(page)
+        if progress:
+            progress(conversation, num_pages, num_messages, False)
+    if progress:
+        progress(conversation, num_pages, num_messages, True)
+    return num_messages
+
+
+def bulk_fetch(groupme: GroupMe,
+               conversations: List[Dict] = None,
+               directory: str = None,
+               sink_factory: Callable = None,
+               workers: int = 8,
+               rate_limit: float = None,
+               progress: Callable = log_progress,
+               filt: Callable = None) -> Dict[str, int]:
+    """ Pull the history of many groups/DMs in parallel, one worker per conversation, streaming each into its
+        own sink (by default a JsonlSink under `directory`).  All workers share the client's connection pool and
+        rate budget; for the duration of the fetch the pool is grown to `workers` connections and a `rate_limit`
+        replaces the client's rate limiter, both restored afterwards.  Returns {"<kind>_<id>": # messages}; a
+        failed conversation is logged and maps to None. """
+
+    if conversations is None:
+        conversations = list_conversations(groupme)
+    if sink_factory is None:
+        sink_factory = lambda conversation: JsonlSink(directory, conversation)
+    rate_limiter, pool_size = groupme.rate_limiter, groupme.pool_size
+    if rate_limit:
+        groupme.rate_limiter = RateLimiter(rate_limit)
+    if workers > pool_size:
+        groupme.resize_pool(workers)
+
+    def work(conversation):
+        sink = sink_factory(conversation)
+        try:
+            return fetch_conversation(groupme, conversation, sink, progress=progress, filt=filt)
+        finally:
+            sink.close()
+
+    results = {}
+    try:
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            futures = {pool.submit(work, conversation): conversation for conversation in conversations}
+            for future in as_completed(futures):
+                conversation = futures[future]
+                key = f"{conversation['kind']}_{conversation['id']}"
+                try:
+                    results[key] = future.result()
+                except Exception as e:
+                    logging.error(f"ERROR: Could not fetch {conversation['kind']} '{conversation['name']}': {e}")
+                    results[key] = None
+    finally:
+        groupme.rate_limiter = rate_limiter
+        if groupme.pool_size != pool_size:
+            groupme.resize_pool(pool_size)
+    return results
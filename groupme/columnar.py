@@ -0,0 +1,240 @@
+from typing import Callable, Dict, Iterable, List
+
+try:
+    import numpy as np
+except ImportError:  # Optional dependency, only needed for the columnar backend
+    np = None
+
+
+NOT_USERS = ("system", "calendar")  # sender_ids of GroupMe's own event messages
+
+# Array name -> dtype; like_user holds every message's likers back to back (see MessageColumns)
+COLUMNS = {"sender": np.int32, "created_at": np.int64, "ids": np.int64, "text_len": np.int32, "has_text": bool,
+           "like_count": np.int32, "like_user": np.int32} if np is not None else {}
+
+
+class MessageColumns:
+    """ A conversation's history as parallel NumPy arrays, one entry per message in the order loaded (newest
+        first when built from the API): `sender` (index into `user_ids`), `created_at`, `ids`, `text_len`,
+        `has_text` and `like_count`, with favorited_by stored CSR-style -- the likers of message i are
+        `like_user[like_ptr[i]:like_ptr[i + 1]]`, also indexes into `user_ids`.  `texts` and the sparse
+        `attachments` ({message index: attachments}) are only kept to render most-liked posts.
+
+        Build once with `from_groupme`/`from_messages`, then the leaderboard functions in this module recompute
+        in milliseconds, e.g. over `columns.between(...)` date windows. """
+
+    def __init__(self):
+
+        if np is None:
+            raise ImportError("MessageColumns requires numpy, install it with `pip install numpy`.")
+        self.user_ids = []  # user index -> user id
+        self.user_names = []  # user index -> first non-empty name seen for them (their latest, newest first)
+        self.user_index = {}  # user id -> user index
+        self.texts = []
+        self.attachments = {}
+        for name in COLUMNS:
+            setattr(self, f"_{name}", [])  # Values added since the last finish()
+        self._finish()
+
+
+    def _user(self, user_id, name=None) -> int:
+        index = self.user_index.get(user_id)
+        if index is None:
+            index = self.user_index[user_id] = len(self.user_ids)
+            self.user_ids.append(user_id)
+            self.user_names.append(name)
+        elif name is not None and self.user_names[index] is None:
+            self.user_names[index] = name
+        return index
+
+
+    def add_page(self, page: List[Dict]):
+        """ Append a page of messages (raw dicts or CompactMessages); call `finish()` once all are in. """
+
+        user = self._user
+        for message in page:
+            self._sender.append(user(message.get('sender_id'), message.get('name')))
+            self._created_at.append(int(message.get('created_at') or 0))
+            self._ids.append(int(message.get('id') or 0))
+            text = message.get('text')
+            self.texts.append(text)
+            self._has_text.append(text is not None)
+            self._text_len.append(len(text) if text is not None else 0)
+            likes = message.get('favorited_by') or ()
+            self._like_count.append(len(likes))
+            self._like_user.extend(user(liker) for liker in likes)
+            attachments = message.get('attachments')
+            if attachments:
+                self.attachments[len(self.texts) - 1] = attachments
+
+
+    def _finish(self):
+        """ Move everything buffered by add_page() onto the end of the arrays. """
+
+        for name, dtype in COLUMNS.items():
+            buffer = getattr(self, f"_{name}")
+            values = np.array(buffer, dtype=dtype)
+            array = getattr(self, name, None)
+            setattr(self, name, values if array is None else np.concatenate([array, values]))
+            buffer.clear()
+        self.like_ptr = np.zeros(len(self.like_count) + 1, dtype=np.int64)
+        np.cumsum(self.like_count, out=self.like_ptr[1:])
+
+
+    def finish(self) -> "MessageColumns":
+        """ Turn everything added so far into arrays; more pages can still be added and finished afterwards. """
+
+        self._finish()
+        return self
+
+
+    @classmethod
+    def from_messages(cls, messages: Iterable[Dict]) -> "MessageColumns":
+        columns = cls()
+        columns.add_page(messages)
+        return columns.finish()
+
+
+    @classmethod
+    def from_groupme(cls, groupme, name=None, groupid=None, filt: Callable = None) -> "MessageColumns":
+        """ Load a group's history (through the archive, if the client has one), with `filt` applied. """
+
+        columns = cls()
+        for page in groupme.iter_pages(name=name, groupid=groupid, group=True, filt=filt):
+            columns.add_page(page)
+        return columns.finish()
+
+
+    def __len__(self):
+        return len(self.sender)
+
+
+    def between(self, min_created_at=None, max_created_at=None):
+        """ Boolean mask of messages created in [min_created_at, max_created_at], for any leaderboard's `where`. """
+
+        mask = np.ones(len(self), dtype=bool)
+        if min_created_at is not None:
+            mask &= self.created_at >= min_created_at
+        if max_created_at is not None:
+            mask &= self.created_at <= max_created_at
+        return mask
+
+
+    def user_mask(self, user_ids) -> "np.ndarray":
+        """ Boolean array over user indexes, True for the given user ids. """
+
+        mask = np.zeros(len(self.user_ids), dtype=bool)
+        mask[[self.user_index[user_id] for user_id in user_ids if user_id in self.user_index]] = True
+        return mask
+
+
+    def message(self, i: int) -> Dict:
+        """ Message i rebuilt as a dict with the fields the leaderboards report. """
+
+        likers = self.like_user[self.like_ptr[i]:self.like_ptr[i + 1]]
+        return {"id": str(self.ids[i]),
+                "sender_id": self.user_ids[self.sender[i]],
+                "favorited_by": tuple(self.user_ids[liker] for liker in likers),
+                "created_at": int(self.created_at[i]),
+                "text": self.texts[i],
+                "attachments": self.attachments.get(i, [])}
+
+
+def _scoreboard(columns, members, values):
+    """ {user_id: per-user value} for every member, in member order like RankStat's scoreboard, with names. """
+
+    names = {}
+    scores = {}
+    for member in members:
+        index = columns.user_index.get(member['user_id'])
+        scores[member['user_id']] = values[index] if index is not None and index < len(values) else 0
+        names.setdefault(member['user_id'], member['name'])
+    return scores, names
+
+
+def _member_messages(columns, members, where=None):
+    """ Mask of messages sent by current members (which never includes system messages, as RankStat does). """
+
+    is_member = columns.user_mask(member['user_id'] for member in members if member['user_id'] not in NOT_USERS)
+    mask = is_member[columns.sender]
+    return mask & where if where is not None else mask
+
+
+def _ranked(scores, names):
+    return sorted(((int(score), names[user_id]) for user_id, score in scores.items()), reverse=True)
+
+
+def num_posts(columns, members, where=None):
+    """ Vectorized NumPostsStat: [(# posts, name)] highest first. """
+
+    counts = np.bincount(columns.sender[_member_messages(columns, members, where)], minlength=len(columns.user_ids))
+    return _ranked(*_scoreboard(columns, members, counts))
+
+
+def num_likes(columns, members, where=None):
+    """ Vectorized NumLikesStat: [(likes received, name)] highest first. """
+
+    mask = _member_messages(columns, members, where)
+    counts = np.bincount(columns.sender[mask], weights=columns.like_count[mask], minlength=len(columns.user_ids))
+    return _ranked(*_scoreboard(columns, members, counts))
+
+
+def num_liked(columns, members, where=None):
+    """ Vectorized NumLikedStat: [(likes given, name)] highest first. """
+
+    is_system = columns.user_mask(NOT_USERS[:1])[columns.sender]
+    mask = ~is_system if where is None else ~is_system & where
+    likers = columns.like_user[np.repeat(mask, columns.like_count)]
+    counts = np.bincount(likers, minlength=len(columns.user_ids))
+    return _ranked(*_scoreboard(columns, members, counts))
+
+
+def len_posts(columns, members, where=None):
+    """ Vectorized LenPostsStat: [(# characters, avg characters/post, name)] highest first. """
+
+    mask = _member_messages(columns, members, where) & columns.has_text
+    chars = np.bincount(columns.sender[mask], weights=columns.text_len[mask], minlength=len(columns.user_ids))
+    posts = np.bincount(columns.sender[mask], minlength=len(columns.user_ids))
+    chars, names = _scoreboard(columns, members, chars)
+    posts, _ = _scoreboard(columns, members, posts)
+    return sorted(((int(chars[user_id]), float(0) if posts[user_id] == 0 else float(chars[user_id] / posts[user_id]),
+                    names[user_id]) for user_id in chars), reverse=True)
+
+
+def most_liked(columns, members, where=None):
+    """ Vectorized MostLikedStat: (top like count, [(sender name, message)]). """
+
+    mask = _member_messages(columns, members, where)
+    _, names = _scoreboard(columns, members, ())
+    top_likes = int(columns.like_count[mask].max()) if mask.any() else 0
+    top = np.flatnonzero(mask & (columns.like_count == top_likes))
+    posts = [columns.message(i) for i in top]
+    return (top_likes, [(names.get(post['sender_id']), post) for post in posts])
+
+
+def orphaned_users(columns, members, where=None):
+    """ Vectorized OrphanedUsersStat: {user_id: last known name} for senders who are no longer members, in the
+        order they first appear. """
+
+    is_member = columns.user_mask(member['user_id'] for member in members)
+    is_member |= columns.user_mask(NOT_USERS)
+    senders = columns.sender if where is None else columns.sender[where]
+    users, first = np.unique(senders, return_index=True)
+    orphans = [(index, user) for user, index in zip(users, first) if not is_member[user]]
+    return {columns.user_ids[user]: columns.user_names[user] for _, user in sorted(orphans)}
+
+
+LEADERBOARDS = {
+    "num_posts": num_posts,
+    "num_likes": num_likes,
+    "num_liked": num_liked,
+    "len_posts": len_posts,
+    "most_liked": most_liked,
+    "orphaned_users": orphaned_users,
+}
+
+
+def leaderboards(columns, members, metrics, where=None) -> Dict:
+    """ {metric: result} for group_stats metric names, with the same result structures as group_stats. """
+
+    return {metric: LEADERBOARDS[metric](columns, members, where=where) for metric in metrics}
@@ -0,0 +1,55 @@
+import json
+import os
+
+from typing import Callable, Dict, List
+
+try:
+    import orjson
+except ImportError:  # Optional dependency, a faster parser for API responses
+    orjson = None
+
+try:
+    import ujson
+except ImportError:  # Optional dependency, used if installed and orjson isn't
+    ujson = None
+
+
+class JsonDecoder:
+    """ Parses raw API response bodies (bytes, assumed UTF-8 as JSON requires) straight to Python objects, with no
+        intermediate str.  `messages()` returns just the message list of a group/direct message page. """
+
+    def __init__(self, name: str, loads: Callable):
+
+        self.name = name
+        self.loads = loads
+
+    def messages(self, raw: bytes) -> List[Dict]:
+        """ The `response.messages` / `response.direct_messages` list of a page, or None if there isn't one. """
+
+        response = (self.loads(raw) or {}).get('response') or {}
+        messages = response.get('messages')
+        return messages if messages is not None else response.get('direct_messages')
+
+    def __repr__(self):
+        return f"JsonDecoder({self.name!r})"
+
+
+# Fastest first; the stdlib parser accepts bytes itself, detecting UTF-8/16/32
+DECODERS = {}
+if orjson is not None:
+    DECODERS["orjson"] = JsonDecoder("orjson", orjson.loads)
+if ujson is not None:
+    DECODERS["ujson"] = JsonDecoder("ujson", ujson.loads)
+DECODERS["json"] = JsonDecoder("json", json.loads)
+
+
+def get_decoder(name: str = None) -> JsonDecoder:
+    """ The decoder called `name` ("orjson", "ujson" or "json"), or by default the one named by GROUPME_JSON,
+        else the fastest installed.  Raises ValueError for a decoder that isn't installed. """
+
+    name = name or os.getenv('GROUPME_JSON')
+    if not name:
+        return next(iter(DECODERS.values()))
+    if name not in DECODERS:
+        raise ValueError(f"JSON decoder '{name}' is not available, choose from: {', '.join(DECODERS)}")
+    return DECODERS[name]
@@ -0,0 +1,103 @@
+import json
+import os
+import threading
+import time
+
+from typing import Dict, List
+
+
+class DirectoryCache:
+    """ Name/ID lookups for groups and direct messages, rebuilt from the group/chat listings at most once
+        per `ttl` seconds and optionally persisted to a JSON file between runs. """
+
+    def __init__(self, ttl=300, path=None):
+
+        self.ttl = ttl
+        self.path = path
+        self.lock = threading.Lock()
+        self.invalidate()
+        if path and os.path.exists(path):
+            self.load()
+
+
+    def invalidate(self):
+        """ Drop everything so the next lookup re-fetches the listings. """
+
+        self.groups_fetched = 0
+        self.chats_fetched = 0
+        self.group_ids = {}      # group name -> group id
+        self.group_members = {}  # group id -> members
+        self.chat_ids = {}       # other user's name -> other user's id
+
+
+    def groups_stale(self) -> bool:
+        return time.time() - self.groups_fetched > self.ttl
+
+
+    def chats_stale(self) -> bool:
+        return time.time() - self.chats_fetched > self.ttl
+
+
+    def set_groups(self, groups: List[Dict]):
+        """ Index a fresh `get_groups()` listing. """
+
+        with self.lock:
+            self.group_ids = {}
+            self.group_members = {}
+            for group in groups:
+                self.group_ids.setdefault(group['name'], group['id'])
+                self.group_members[group['id']] = group['members']
+            self.groups_fetched = time.time()
+        self.save()
+
+
+    def set_chats(self, chats: List[Dict]):
+        """ Index a fresh `get_chats()` listing. """
+
+        with self.lock:
+            self.chat_ids = {}
+            for chat in chats:
+                self.chat_ids.setdefault(chat['other_user']['name'], chat['other_user']['id'])
+            self.chats_fetched = time.time()
+        self.save()
+
+
+    def group_id(self, name):
+        return self.group_ids.get(name)
+
+
+    def members(self, name=None, groupid=None):
+        if groupid in self.group_members:
+            return self.group_members[groupid]
+        return self.group_members.get(self.group_ids.get(name))
+
+
+    def chat_id(self, username):
+        return self.chat_ids.get(username)
+
+
+    def save(self):
+        """ Write the directory to `path` (if set) so later runs can skip the listing crawl within the TTL. """
+
+        if not self.path:
+            return
+        with self.lock:
+            data = {
+                "groups_fetched": self.groups_fetched,
+                "chats_fetched": self.chats_fetched,
+                "group_ids": self.group_ids,
+                "group_members": self.group_members,
+                "chat_ids": self.chat_ids,
+            }
+        tmp = f"{self.path}.tmp"
+        with open(tmp, "w") as f:
+            json.dump(data, f)
+        os.replace(tmp, self.path)
+
+
+    def load(self):
+        with open(self.path) as f:
+            data = json.load(f)
+        with self.lock:
+            for key in data:
+                setattr(self, key, data[key])
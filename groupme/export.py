@@ -0,0 +1,109 @@
+import gzip
+import json
+import logging
+import os
+
+from typing import Callable
+
+from groupme.groupme import GroupMe
+from groupme.message_iterator import MessageIterator
+
+
+class ExportCheckpoint:
+    """ Progress of one export, kept next to it in `<path>.checkpoint`: the `before_id` to resume paging from, the
+        output file size (`offset`) that covers every page up to it, the messages written so far and whether the
+        export finished.  Saved atomically, so it always describes a consistent prefix of the output. """
+
+    def __init__(self, path):
+
+        self.path = f"{path}.checkpoint"
+        self.before_id = 0
+        self.offset = 0
+        self.messages = 0
+        self.done = False
+        if os.path.exists(self.path):
+            with open(self.path) as f:
+                state = json.load(f)
+            self.before_id = state['before_id']
+            self.offset = state['offset']
+            self.messages = state['messages']
+            self.done = state['done']
+
+    def save(self):
+        tmp = f"{self.path}.tmp"
+        with open(tmp, "w") as f:
+            json.dump({"before_id": self.before_id, "offset": self.offset, "messages": self.messages,
+                       "done": self.done}, f)
+        os.replace(tmp, self.path)
+
+    def remove(self):
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+
+def export_messages(groupme: GroupMe,
+                    path: str,
+                    name: str,
+                    group: bool = False,
+                    chat: bool = False,
+                    filt: Callable = None,
+                    compress: bool = None,
+                    checkpoint_every: int = 10,
+                    restart: bool = False,
+                    progress: Callable = None) -> int:
+    """ Stream a group's/chat's history (newest first, `filt` applied) to `path` as JSON Lines, one message per
+        line, page by page so memory stays flat however long the history is.  With `compress` (default: `path`
+        ends in .gz) every page is written as its own gzip member, which `gzip`/`zcat` read as one stream.
+
+        Every `checkpoint_every` pages the output is flushed to disk and an ExportCheckpoint recorded; running
+        the same export again after an interruption truncates the file back to the last checkpoint and resumes
+        paging from there.  A finished export is left alone unless `restart` is set.  Returns the number of
+        messages in the export.  `progress(pages, messages)` is called after every page. """
+
+    if compress is None:
+        compress = path.endswith(".gz")
+    checkpoint = ExportCheckpoint(path)
+    if restart:
+        checkpoint.remove()
+        checkpoint = ExportCheckpoint(path)
+    if checkpoint.done:
+        logging.info(f"Export to {path} already finished ({checkpoint.messages} messages)")
+        return checkpoint.messages
+    if checkpoint.before_id:
+        logging.info(f"Resuming export to {path} after {checkpoint.messages} messages")
+
+    # Prefetch the next page while this one is encoded and written
+    it = MessageIterator(name=name, group=group, chat=chat, filt=filt, last=checkpoint.before_id, groupme=groupme,
+                         prefetch=True)
+    pages = 0
+    with open(path, "r+b" if os.path.exists(path) else "wb") as f:
+        f.truncate(checkpoint.offset)  # Drop anything written after the last checkpoint
+        f.seek(checkpoint.offset)
+        try:
+            for page in it:
+                data = "".join(json.dumps(message) + "\n" for message in page).encode("utf-8")
+                f.write(gzip.compress(data) if compress and data else data)
+                pages += 1
+                checkpoint.offset = f.tell()
+                checkpoint.messages += len(page)
+                checkpoint.before_id = it.last_mess_id
+                if pages % checkpoint_every == 0:
+                    _save(f, checkpoint)
+                if progress:
+                    progress(pages, checkpoint.messages)
+        except BaseException:
+            _save(f, checkpoint)  # Keep every whole page written before the failure
+            raise
+        finally:
+            it.close()
+        checkpoint.done = True
+        _save(f, checkpoint)
+    return checkpoint.messages
+
+
+def _save(f, checkpoint: ExportCheckpoint):
+    """ Make the output durable up to the checkpoint's offset, then record the checkpoint. """
+
+    f.flush()
+    os.fsync(f.fileno())
+    checkpoint.save()
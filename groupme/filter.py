@@ -1,9 +1,17 @@
 import re
 
-from datetime import timedelta
+from datetime import datetime, timedelta
 from typing import Callable
 
 from groupme.groupme import GroupMe
+from groupme.search import SearchQuery, regex_to_fts
+
+
+def date_to_epoch(d):
+    """ Epoch seconds of local midnight at the start of date `d` (matches GroupMe.epoch_to_datetime). """
+
+    return int(datetime(d.year, d.month, d.day).timestamp())
+
 
 class MessageFilter:
 
@@ -12,23 +20,51 @@ class MessageFilter:
                  text: str = None,
                  date_on: str = None, 
                  date_before: str = None, 
-                 date_after: str = None):
+                 date_after: str = None,
+                 search: str = None,
+                 groupme: GroupMe = None):
 
-        self.groupme = GroupMe()
+        self.groupme = groupme if groupme is not None else GroupMe()
 
         self.username = username
         self.userid = None
         self.text = text
+        self.search = SearchQuery(search) if search else None
         self.date_on = date_on
         # Can't mix these filters with date_on
         self.date_before = date_before if self.date_on is None else None
         self.date_after = date_after if self.date_on is None else None
 
+        # Compile once: regex for text, and [min_created_at, max_created_at) epoch bounds for dates so each
+        # message is checked with integer comparisons instead of datetime conversions
+        self.pattern = re.compile(text) if text else None
+        # Full-text index query every matching message also satisfies, so archived history can be searched
+        # without reading every message (the regex and search are still checked on what it returns)
+        clauses = [clause for clause in (self.search.to_fts() if self.search else None,
+                                         regex_to_fts(text) if text else None) if clause]
+        self.match = " AND ".join(clauses) or None
+        self.min_created_at = None
+        self.max_created_at = None
+        if self.date_on:
+            self.min_created_at = date_to_epoch(self.date_on)
+            self.max_created_at = date_to_epoch(self.date_on + timedelta(days=1))
+        if self.date_after:
+            self.min_created_at = date_to_epoch(self.date_after)
+        if self.date_before:
+            self.max_created_at = date_to_epoch(self.date_before + timedelta(days=1))
+
 
     def filter_lambda(self) -> Callable:
-        """ Make a Callable filter to apply to returned messages. """
+        """ Make a Callable filter to apply to returned messages.  Its `min_created_at` attribute tells paginators
+            (newest-first) they can stop once a page reaches messages older than the filter's date range, and its
+            `max_created_at` lets them start paging at the end of that range.  Its `match` is an FTS5 query that
+            narrows down archived messages (see MessageArchive.get_page). """
 
-        return lambda messages : self.filter_messages(messages)
+        filt = lambda messages : self.filter_messages(messages)
+        filt.min_created_at = self.min_created_at
+        filt.max_created_at = self.max_created_at
+        filt.match = self.match
+        return filt
 
 
     def filter_user(self, message):
@@ -53,39 +89,27 @@ class MessageFilter:
     def filter_date(self, message):
         """ Return message if it was sent in selected date range, otherwise discard. """
 
-        raw_time = message['created_at']
-        timestamp = self.groupme.epoch_to_datetime(raw_time).date()
+        created_at = int(message['created_at'])
 
-        if self.date_on:
-            if timestamp != self.date_on:
-                return None
-
-        elif self.date_before and self.date_after:
-            if (self.date_before - timestamp) < timedelta() or (timestamp - self.date_after) < timedelta():
-                return None
-
-        elif self.date_before:
-            # Either before OR on this date
-            if (self.date_before - timestamp) < timedelta():
-                return None
-
-        elif self.date_after:
-            # Either on OR after this date
-            if (timestamp - self.date_after) < timedelta():
-                return None
+        if self.min_created_at is not None and created_at < self.min_created_at:
+            return None
+        if self.max_created_at is not None and created_at >= self.max_created_at:
+            return None
         return message
 
 
     def filter_text(self, message):
-        """ Return message if it contains selected text, otherwise discard. """
+        """ Return message if it contains selected text (and search terms), otherwise discard. """
 
+        if self.search and not self.search.matches(message.get('text')):
+            return None
         if self.text:
             if 'text' in message:
                 t = message['text']
                 if t is None: 
                     return None  # No text to filter.  Could be image, etc.
                 else:
-                    search = re.search(self.text, t)
+                    search = self.pattern.search(t)
                     if search is None:
                         return None
             else:
@@ -96,25 +120,14 @@ class MessageFilter:
     def filter_messages(self, messages):
         """ Filter messages by text, sender, date, etc. """
 
-        filtered = []  # Messages to return to user
-
-        # Set up user data if not done already
-        if self.userid is None and self.username is not None:
-            try:
-                groupid = messages[0]['group_id']
-                group_members = self.groupme.get_group_members(groupid=groupid)
-                self.userid = self.groupme.get_user_id(group_members, name=self.username, nickname=self.username)
-            except: # Direct Messages
-               self.userid = None
-
-        # Apply filters
-        for message in messages:
-            message = self.filter_user(message)
-            if message:  # We can probably save some computation by not checking filters if it already failed
-                message = self.filter_date(message)
-            if message:
-                message = self.filter_text(message)
-            if message:  # Add to returned messages if it hasn't failed any filters
-                filtered += [message]
+        # Set up user data if not done already: a group member's (or former member's) name/nickname -> user id
+        if self.userid is None and self.username is not None and messages and 'group_id' in messages[0]:
+            users = self.groupme.user_directory()
+            self.userid = users.user_id(name=self.username, nickname=self.username, groupid=messages[0]['group_id'])
+
+        # Apply filters, skipping the remaining checks as soon as one fails
+        filter_user, filter_date, filter_text = self.filter_user, self.filter_date, self.filter_text
+        filtered = [message for message in messages
+                    if filter_user(message) and filter_date(message) and filter_text(message)]
 
         return filtered
\ No newline at end of file
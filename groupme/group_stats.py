@@ -1,152 +1,329 @@
+import copy
+import os
+import time
+
+from collections import Counter
+
+from groupme.columnar import MessageColumns, leaderboards
+from groupme.leaderboard_store import LeaderboardStore
+from groupme.message import CompactMessage, Projection
 from groupme.message_iterator import MessageIterator
 from groupme.groupme import GroupMe
+from groupme.reducers import Reducer, reduce_pages
 
 GM_INSTANCE = GroupMe()
 
-def group_rank_num_posts(name, filt=None, filtstr=None):
-    """ leaderboard of total messages sent per user in group chat """
+class RankStat(Reducer):
+    """ Base accumulator for a per-user leaderboard.  Counters are sparse, kept only for users seen in the
+        messages, so a blank tally (empty()) is cheap to send to every chunk of a parallel run and to merge back
+        however large the group (see reducers.reduce_pages).  The leaderboard's own tally is given the current
+        members, and result() ranks just them, under their names. """
 
-    it = MessageIterator(name=name, group=True, filt=filt)
-    members = GM_INSTANCE.get_group_members(name=name)
-    scoreboard = {}
-
-    for member in members:
-        scoreboard[member['user_id']] = 0
-
-    page = it.next()
-    while (page != None):
-        for message in page:
-            if 'sender_id' in message and message['sender_id'] != "system" and message['sender_id'] in scoreboard:
-                scoreboard[message['sender_id']] += 1
-        page = it.next()
-
-    score_format = []
-    for user_id in scoreboard:
-        for member in members:
-            if user_id == member['user_id']:
-                score_format += [(scoreboard[user_id], member['name'])]
-                break
-
-    score_sort = sorted(score_format)
-    score_sort.reverse()
-    
-    if filtstr:
-        out = f"\nNumber of posts by user {filtstr}:\n"
-    else:
-        out = "\nNumber of posts by user:\n"
-    for player in score_sort:
-         out += f"    {player[1]} - {player[0]}\n"
+    fields = ("sender_id",)  # message fields add() reads
 
-    return out
+    def __init__(self, members=None):
+        self.scoreboard = Counter()  # user id -> score
+        self.names = None  # current member id -> name; None in a blank tally
+        if members is not None:
+            self.names = {}
+            for member in members:
+                self.names.setdefault(member['user_id'], member['name'])
 
-def group_rank_num_likes(name):
-    """ leaderboard of total likes received per user in group chat """
+    def add(self, message):
+        raise NotImplementedError
 
-    it = MessageIterator(name=name, group=True)
-    members = GM_INSTANCE.get_group_members(name=name)
-    scoreboard = {}
+    def empty(self):
+        return type(self)()
 
-    for member in members:
-        scoreboard[member['user_id']] = 0
+    def merge(self, other):
+        """ add another tally's counters to ours """
 
-    page = it.next()
-    while (page != None):
-        for message in page:
-            if 'sender_id' in message and message['sender_id'] != "system" and message['sender_id'] in scoreboard and \
-                'favorited_by' in message:
-                num_likes = len(message['favorited_by'])
-                scoreboard[message['sender_id']] += num_likes
-        page = it.next()
+        self.scoreboard.update(other.scoreboard)
+        return self
 
-    score_format = []
-    for user_id in scoreboard:
-        for member in members:
-            if user_id == member['user_id']:
-                score_format += [(scoreboard[user_id], member['name'])]
-                break
+    def state(self):
+        """ JSON-serializable counters, for saving a partial tally (see LeaderboardStore) """
 
-    score_sort = sorted(score_format)
-    score_sort.reverse()
+        return {key: value for key, value in vars(self).items() if key != "names"}
 
-    out = "\nTotal number of likes on posts by user:\n"
-    for player in score_sort:
-        out += f"    {player[1]} - {player[0]}\n"
+    def load(self, state):
+        """ restore counters saved by state() """
 
-    return out
+        for key, value in state.items():
+            setattr(self, key, Counter(value) if isinstance(getattr(self, key, None), Counter) else value)
+        return self
 
-def group_rank_num_liked(name):
-    """ leaderboard of total likes given by user in group chat """
+    def result(self):
+        """ [(score, name)] sorted highest first """
 
-    it = MessageIterator(name=name, group=True)
-    members = GM_INSTANCE.get_group_members(name=name)
-    scoreboard = {}
-
-    for member in members:
-        scoreboard[member['user_id']] = 0
-
-    page = it.next()
-    while (page != None):
-        for message in page:
-            if 'sender_id' in message and message['sender_id'] != "system":
-                likes = message['favorited_by']
-                for like in likes:
-                    if like in scoreboard:
-                        scoreboard[like] += 1
-        page = it.next()
-
-    score_format = []
-    for user_id in scoreboard:
-        for member in members:
-            if user_id == member['user_id']:
-                score_format += [(scoreboard[user_id], member['name'])]
-                break
-
-    score_sort = sorted(score_format)
-    score_sort.reverse()
+        score_format = [(self.scoreboard[user_id], name) for user_id, name in self.names.items()]
+        return sorted(score_format, reverse=True)
 
-    out = "\nTotal number of liked posts by user:\n"
-    for player in score_sort:
+class NumPostsStat(RankStat):
+    """ total messages sent per user """
+
+    def add(self, message):
+        if 'sender_id' in message and message['sender_id'] != "system":
+            self.scoreboard[message['sender_id']] += 1
+
+class NumLikesStat(RankStat):
+    """ total likes received per user """
+
+    fields = ("sender_id", "favorited_by")
+
+    def add(self, message):
+        if 'sender_id' in message and message['sender_id'] != "system" and 'favorited_by' in message:
+            self.scoreboard[message['sender_id']] += len(message['favorited_by'])
+
+class NumLikedStat(RankStat):
+    """ total likes given per user """
+
+    fields = ("sender_id", "favorited_by")
+
+    def add(self, message):
+        if 'sender_id' in message and message['sender_id'] != "system":
+            self.scoreboard.update(message['favorited_by'])
+
+class LenPostsStat(RankStat):
+    """ total characters sent per user and avg characters/post """
+
+    fields = ("sender_id", "text")
+
+    def __init__(self, members=None):
+        super().__init__(members)
+        self.posts = Counter()  # user id -> # of posts with text; scoreboard counts their characters
+
+    def add(self, message):
+        if 'sender_id' in message and message['sender_id'] != "system" and message['text'] is not None:
+            self.scoreboard[message['sender_id']] += len(message['text'])
+            self.posts[message['sender_id']] += 1
+
+    def merge(self, other):
+        super().merge(other)
+        self.posts.update(other.posts)
+        return self
+
+    def result(self):
+        """ [(# characters, avg characters/post, name)] sorted highest first """
+
+        score_format = []
+        for user_id, name in self.names.items():
+            len_posts, num_posts = self.scoreboard[user_id], self.posts[user_id]
+            avg = float(0) if num_posts == 0 else len_posts/float(num_posts)
+            score_format += [(len_posts, avg, name)]
+        return sorted(score_format, reverse=True)
+
+class MostLikedStat(RankStat):
+    """ the message(s) with the most likes """
+
+    fields = ("id", "sender_id", "favorited_by", "created_at", "text", "attachments")
+
+    def __init__(self, members=None):
+        super().__init__(members)
+        self.top = {}  # sender id -> [their top like count, [their messages with that many likes]]
+
+    def add(self, message):
+        if 'favorited_by' in message and message['favorited_by'] is not None and message['sender_id'] != "system":
+            self._keep(message['sender_id'], len(message['favorited_by']), [message])
+
+    def _keep(self, sender_id, num_likes, posts):
+        top = self.top.get(sender_id)
+        if top is None or num_likes > top[0]:
+            self.top[sender_id] = [num_likes, list(posts)]
+        elif num_likes == top[0]:
+            top[1] += posts
+
+    def merge(self, other):
+        for sender_id, (num_likes, posts) in other.top.items():
+            self._keep(sender_id, num_likes, posts)
+        return self
+
+    def state(self):
+        state = super().state()
+        state['top'] = {sender_id: [num_likes, [dict(post.to_dict() if hasattr(post, "to_dict") else post)
+                                                for post in posts]]
+                        for sender_id, (num_likes, posts) in self.top.items()}
+        return state
+
+    def result(self):
+        """ (top like count, [(sender name, CompactMessage)]), newest message first """
+
+        tops = [self.top[user_id] for user_id in self.names if user_id in self.top]
+        top_likes = max((num_likes for num_likes, _ in tops), default=0)
+        top_posts = sorted((post for num_likes, posts in tops if num_likes == top_likes for post in posts),
+                           key=lambda post: int(post['id']), reverse=True)
+        # Posts merged back from worker processes or loaded from a saved tally are dicts of the same fields
+        top_posts = [post if isinstance(post, CompactMessage) else Projection(post.keys()).message(post)
+                     for post in top_posts]
+        return (top_likes, [(self.names[post['sender_id']], post) for post in top_posts])
+
+class OrphanedUsersStat(RankStat):
+    """ users who have posted in the group but are no longer members """
+
+    fields = ("sender_id", "name")
+
+    def __init__(self, members=None):
+        super().__init__(members)
+        self.senders = {}  # user id -> the first name (newest first) seen for them, of everyone who posted
+
+    def add(self, message):
+        sender_id = message['sender_id']
+        if sender_id != "system" and sender_id != "calendar" and self.senders.get(sender_id) is None:
+            if 'name' in message and message['name'] is not None:
+                self.senders[sender_id] = message['name']
+            else:
+                self.senders[sender_id] = None
+
+    def merge(self, other):
+        for sender_id, name in other.senders.items():
+            if self.senders.get(sender_id) is None:
+                self.senders[sender_id] = name
+        return self
+
+    def result(self):
+        """ {user_id: last known name} """
+
+        return {sender_id: name for sender_id, name in self.senders.items() if sender_id not in self.names}
+
+STATS = {
+    "num_posts": NumPostsStat,
+    "num_likes": NumLikesStat,
+    "num_liked": NumLikedStat,
+    "len_posts": LenPostsStat,
+    "most_liked": MostLikedStat,
+    "orphaned_users": OrphanedUsersStat,
+}
+
+def group_stats(name, metrics, filt=None, backend=None, executor=None, workers=None):
+    """ walk a group's history once, updating every requested metric per page; returns {metric: result}.
+        with an `executor` ("thread", "process" or an Executor) pages are tallied in parallel chunks and merged,
+        see reducers.reduce_pages.  backend="numpy" loads the history into columnar.MessageColumns and computes
+        the metrics vectorized """
+
+    groupid, members = group_members(name)
+    if backend == "numpy":
+        columns = MessageColumns.from_groupme(GM_INSTANCE, groupid=groupid, filt=filt)
+        with GM_INSTANCE.instrumentation.phase("stats"):
+            return record_orphans(groupid, leaderboards(columns, members, metrics))
+
+    stats = {metric: STATS[metric](members) for metric in metrics}
+    # Prefetch the next page while this one is being tallied, keeping only the fields the metrics read
+    fields = [field for stat in stats.values() for field in stat.fields]
+    it = MessageIterator(name=name, group=True, filt=filt, groupme=GM_INSTANCE, prefetch=True, fields=fields)
+    try:
+        if executor is not None:
+            reduce_pages(it, stats, executor=executor, workers=workers)
+        else:
+            for page in it:
+                with GM_INSTANCE.instrumentation.phase("stats"):
+                    for stat in stats.values():
+                        stat.update(page)
+    finally:
+        it.close()
+
+    return record_orphans(groupid, {metric: stats[metric].result() for metric in stats})
+
+def group_members(name):
+    """ (group id, current members) for a group name, from the shared user directory """
+
+    groupid = GM_INSTANCE.get_group_id(name)
+    return groupid, GM_INSTANCE.user_directory().group_members(groupid)
+
+def record_orphans(groupid, results):
+    """ note orphaned users in the user directory as former members, filling in names it knows for them """
+
+    if "orphaned_users" in results:
+        users = GM_INSTANCE.user_directory()
+        for user_id, user_name in results["orphaned_users"].items():
+            users.add_former_member(groupid, user_id, user_name)
+        results["orphaned_users"] = {user_id: user_name if user_name is not None else users.name(user_id)
+                                     for user_id, user_name in results["orphaned_users"].items()}
+    return results
+
+# Metrics whose results depend on favorited_by, which keeps changing on recent messages
+LIKE_METRICS = ("num_likes", "num_liked", "most_liked")
+
+# Layout of the tallies update_group_stats() saves; a saved tally in any other layout starts over
+STATE_VERSION = 2
+
+def update_group_stats(name, metrics, store=None, rescan_window=7 * 24 * 3600):
+    """ group_stats() for a leaderboard that is recomputed often: starts from the tally saved in `store` (a
+        LeaderboardStore, by default one at $GROUPME_LEADERBOARDS) and only fetches messages newer than it.
+        Messages from the last `rescan_window` seconds are re-read every time when a like-based metric is
+        tracked (from the API, refreshing them in the archive if there is one), and only folded into the saved
+        tally once they are older than that.  The saved counters cover everyone who posted, so they carry over
+        when the group's members change; the tally starts over when a metric it doesn't have yet is asked for. """
+
+    if store is None:
+        store = LeaderboardStore(os.getenv('GROUPME_LEADERBOARDS'))
+    groupid, members = group_members(name)
+
+    saved = store.get(groupid)
+    if saved is not None and saved.get('version') != STATE_VERSION:
+        saved = None
+    if saved is None or not set(metrics) <= set(saved['metrics']):
+        tracked = list(dict.fromkeys(list(saved['metrics']) + list(metrics))) if saved else list(metrics)
+        saved = {"version": STATE_VERSION, "settled_id": 0, "metrics": {metric: None for metric in tracked}}
+
+    # `settled` holds what will be saved; `current` is that plus every newer message, i.e. the full history
+    settled = {metric: STATS[metric](members) for metric in saved['metrics']}
+    for metric, state in saved['metrics'].items():
+        if state is not None:
+            settled[metric].load(copy.deepcopy(state))
+    current = {metric: STATS[metric](members).load(copy.deepcopy(stat.state())) for metric, stat in settled.items()}
+
+    window = rescan_window if any(metric in LIKE_METRICS for metric in settled) else 0
+    cutoff = time.time() - window
+    settled_id = newest_settled = saved['settled_id']
+    fields = ["id", "created_at"] + [field for stat in settled.values() for field in stat.fields]
+    for page in GM_INSTANCE.iter_pages(groupid=groupid, group=True, fields=fields, refresh_window=window or None):
+        with GM_INSTANCE.instrumentation.phase("stats"):
+            done = False
+            for message in page:
+                if int(message['id']) <= settled_id:
+                    done = True  # Everything from here back is already in the saved tally
+                    break
+                if message['created_at'] < cutoff:
+                    for stat in settled.values():
+                        stat.add(message)
+                    newest_settled = max(newest_settled, int(message['id']))
+                for stat in current.values():
+                    stat.add(message)
+        if done:
+            break
+
+    saved['settled_id'] = newest_settled
+    saved['metrics'] = {metric: stat.state() for metric, stat in settled.items()}
+    store.set(groupid, saved)
+    return record_orphans(groupid, {metric: current[metric].result() for metric in metrics})
+
+def format_num_posts(result, filtstr=None):
+    if filtstr:
+        out = f"\nNumber of posts by user {filtstr}:\n"
+    else:
+        out = "\nNumber of posts by user:\n"
+    for player in result:
+         out += f"    {player[1]} - {player[0]}\n"
+
+    return out
+
+def format_num_likes(result):
+    out = "\nTotal number of likes on posts by user:\n"
+    for player in result:
         out += f"    {player[1]} - {player[0]}\n"
 
     return out
 
-def group_rank_len_posts(name):
-    """ tally total number of characters each user has sent in group and avg characters/post """
+def format_num_liked(result):
+    out = "\nTotal number of liked posts by user:\n"
+    for player in result:
+        out += f"    {player[1]} - {player[0]}\n"
 
-    it = MessageIterator(name=name, group=True)
-    members = GM_INSTANCE.get_group_members(name=name)
-    scoreboard = {}
-
-    for member in members:
-        scoreboard[member['user_id']] = [0, 0] # [# of characters sent, # of posts]
-
-    page = it.next()
-    while (page != None):
-        for message in page:
-            if 'sender_id' in message and message['sender_id'] != "system" and message['sender_id'] in scoreboard:
-                if message['text'] is not None:
-                    len_text = len(message['text'])
-                    scoreboard[message['sender_id']][0] += len_text
-                    scoreboard[message['sender_id']][1] += 1
-        page = it.next()
-
-    score_format = []
-    for user_id in scoreboard:
-        for member in members:
-            if user_id == member['user_id']:
-                len_posts = scoreboard[user_id][0]
-                num_posts = scoreboard[user_id][1]
-                if num_posts == 0:
-                    score_format += [(len_posts, float(0), member['name'])]
-                else:
-                    score_format += [(len_posts, len_posts/float(num_posts), member['name'])]
-                break
-
-    score_sort = sorted(score_format)
-    score_sort.reverse()
+    return out
 
+def format_len_posts(result):
     out = "\nTotal number of characters of text sent by user (avg characters per message):\n"
-    for player in score_sort:
+    for player in result:
         n = player[2]
         count = f"{player[0]:,}"
         av = float(f"{player[1]:.2f}")
@@ -155,39 +332,12 @@ def group_rank_len_posts(name):
 
     return out
 
-def group_most_liked_post(name):
-    """ return the message(s) with the most likes in a group chat and its like count """
-    
-    it = MessageIterator(name=name, group=True)
-    members = GM_INSTANCE.get_group_members(name=name)
-    ids = [member['user_id'] for member in members]
-    scoreboard = {}
-
-    top_likes = 0
-    top_posts = []
-
-    page = it.next()
-    while (page != None):
-        for message in page:
-            if 'favorited_by' in message and message['favorited_by'] is not None and message['sender_id'] != "system" \
-                and message['sender_id'] in ids:
-                num_likes = len(message['favorited_by'])
-                if num_likes > top_likes:
-                    top_posts = [message]
-                    top_likes = num_likes
-                elif num_likes == top_likes:
-                    top_posts += [message]
-        page = it.next()
-    
+def format_most_liked(result):
+    top_likes, top_posts = result
     out = f"\nMost-liked post(s) in group ({top_likes} likes):\n\n"
-    for post in top_posts:
-        user_name = None
-        user_id = post['sender_id']
+    for user_name, post in top_posts:
         posttime = GM_INSTANCE.epoch_to_datetime(post['created_at'])
         attachments = post['attachments']
-        for member in members:
-            if user_id == member['user_id']:
-                user_name = member['name']
         out += f"Sender: {user_name} | Date: {posttime}\n"
         out += f"    Text: {post['text']}\n"
         if attachments is not None and len(attachments) > 0:
@@ -200,30 +350,53 @@ def group_most_liked_post(name):
 
     return out
 
-def orphaned_users(groupname):
-    """ return list of users who have left a group chat """
-
-    it = MessageIterator(name=groupname, group=True)
-    current_members = GM_INSTANCE.get_group_members(name=groupname)
-    current_ids = [member['user_id'] for member in current_members]
-    orphan_ids = {}
-
-    page = it.next()
-    while (page != None):
-        for message in page:
-            if message['sender_id'] != "system" and message['sender_id'] != "calendar" and \
-                message['sender_id'] not in current_ids and (message['sender_id'] not in orphan_ids or \
-                (message['sender_id'] in orphan_ids and orphan_ids[message['sender_id']] is None) ):
-                    if 'name' in message and message['name'] is not None:
-                        orphan_ids[message['sender_id']] = message['name']
-                    else:
-                        orphan_ids[message['sender_id']] = None
-        page = it.next()
-
+def format_orphaned_users(result, groupname):
     out = f"\nUsers that have left group '{groupname}':\n"
-    for orphan_id in orphan_ids:
-        out += f"    Name: {orphan_ids[orphan_id]} | GroupMe ID #: {orphan_id}\n"
+    for orphan_id in result:
+        out += f"    Name: {result[orphan_id]} | GroupMe ID #: {orphan_id}\n"
     out += "\n"
 
     return out
 
+def format_stat(metric, result, groupname):
+    """ render any group_stats() result the same way its single-metric function does """
+
+    if metric == "orphaned_users":
+        return format_orphaned_users(result, groupname)
+    return {
+        "num_posts": format_num_posts,
+        "num_likes": format_num_likes,
+        "num_liked": format_num_liked,
+        "len_posts": format_len_posts,
+        "most_liked": format_most_liked,
+    }[metric](result)
+
+def group_rank_num_posts(name, filt=None, filtstr=None):
+    """ leaderboard of total messages sent per user in group chat """
+
+    return format_num_posts(group_stats(name, ["num_posts"], filt=filt)["num_posts"], filtstr=filtstr)
+
+def group_rank_num_likes(name):
+    """ leaderboard of total likes received per user in group chat """
+
+    return format_num_likes(group_stats(name, ["num_likes"])["num_likes"])
+
+def group_rank_num_liked(name):
+    """ leaderboard of total likes given by user in group chat """
+
+    return format_num_liked(group_stats(name, ["num_liked"])["num_liked"])
+
+def group_rank_len_posts(name):
+    """ tally total number of characters each user has sent in group and avg characters/post """
+
+    return format_len_posts(group_stats(name, ["len_posts"])["len_posts"])
+
+def group_most_liked_post(name):
+    """ return the message(s) with the most likes in a group chat and its like count """
+
+    return format_most_liked(group_stats(name, ["most_liked"])["most_liked"])
+
+def orphaned_users(groupname):
+    """ return list of users who have left a group chat """
+
+    return format_orphaned_users(group_stats(groupname, ["orphaned_users"])["orphaned_users"], groupname)
@@ -1,13 +1,26 @@
+import heapq
 import logging
 import json
 import os
 import re
 import requests
+import threading
+import time
 
-from datetime import datetime, date, timedelta
-from math import ceil
-from random import randint
-from typing import Callable, Dict, List
+from datetime import datetime
+from typing import Callable, Dict, Iterator, List
+
+from requests.adapters import HTTPAdapter
+
+from groupme.archive import MessageArchive
+from groupme.decoder import JsonDecoder, get_decoder
+from groupme.directory import DirectoryCache
+from groupme.instrumentation import Instrumentation
+from groupme.message import projection
+from groupme.ratelimit import RateLimiter, RetryPolicy
+from groupme.seek_index import SeekIndex
+from groupme.send_queue import SendQueue, new_source_guid
+from groupme.user_directory import UserDirectory
 
 
 logging.basicConfig(level=logging.INFO)
@@ -39,6 +52,28 @@ class BadMessageException(Exception):
         super().__init__(self.message)
 
 
+class RateLimitException(Exception):
+
+    def __init__(self, message="GroupMe API rate limit exceeded and retries ran out.  Slow down and try again later."):
+        self.message = message
+        super().__init__(self.message)
+
+
+class APIServerException(Exception):
+
+    def __init__(self, message="GroupMe API is unavailable (status %s) and retries ran out.  Try again later.",
+                 code=""):
+        self.message = message % code
+        super().__init__(self.message)
+
+
+class BadRequestException(Exception):
+
+    def __init__(self, message="GroupMe API rejected the request (status %s).", code=""):
+        self.message = message % code
+        super().__init__(self.message)
+
+
 class BadDateStringException(Exception):
 
     def __init__(self, message="Invalid date string entered.  " +
@@ -49,28 +84,141 @@ class BadDateStringException(Exception):
 
 class GroupMe:
 
-    def __init__(self, api_token=os.getenv('GROUPME_TOKEN')):
-        self.api_url = "https://api.groupme.com/v3"
+    def __init__(self, api_token=os.getenv('GROUPME_TOKEN'), pool_size=10, timeout=30,
+                 archive_path=os.getenv('GROUPME_ARCHIVE'), directory_ttl=300,
+                 directory_path=os.getenv('GROUPME_DIRECTORY'), rate_limit=None,
+                 seek_index_path=os.getenv('GROUPME_SEEK_INDEX'), retry_policy=None,
+                 api_url=os.getenv('GROUPME_API_URL', "https://api.groupme.com/v3"), json_decoder=None,
+                 archive_refresh=24 * 3600):
+        self.api_url = api_url
         if api_token is None:
             raise APIAuthException("No auth token provided, please set the GROUPME_TOKEN environment variable.")
         self.api_token = api_token
+        self.timeout = timeout
+        self.pool_size = pool_size
+        self.session = self._make_session(pool_size)
+        # Optional local copy of message history; when set, history reads come from here after a sync
+        self.archive = MessageArchive(archive_path) if archive_path else None
+        # Archived messages younger than this many seconds are re-downloaded on every sync to pick up new likes
+        self.archive_refresh = archive_refresh
+        # Cached name/id/member lookups so we don't crawl every group/chat listing per lookup
+        self.directory = DirectoryCache(ttl=directory_ttl, path=directory_path)
+        # O(1) member lookups by id/name/nickname across all groups, rebuilt whenever the directory is refreshed
+        self.users = None
+        self.users_fetched = None
+        self.me = None  # Signed-in user, see get_me()
+        # Optional requests/second budget shared by every thread using this client: a number is a hard cap, and a
+        # RateLimiter (e.g. RateLimiter(20, max_rate=100)) can adapt to the highest rate the API sustains.  None
+        # (the default) sends requests unthrottled, only backing off when the API answers 429.
+        self.rate_limiter = rate_limit if isinstance(rate_limit, RateLimiter) or not rate_limit \
+                            else RateLimiter(rate_limit)
+        self.retry_policy = retry_policy if retry_policy is not None else RetryPolicy()
+        # Message id <-> date boundaries seen while paging, used to jump to the end of a date range
+        self.seek_index = SeekIndex(seek_index_path)
+        # Request counts/latencies and time per phase (network, JSON, filtering, ...), see `profile()`
+        self.instrumentation = Instrumentation()
+        # Response parser: a JsonDecoder or decoder name, by default the fastest installed (see decoder.py)
+        self.decoder = json_decoder if isinstance(json_decoder, JsonDecoder) else get_decoder(json_decoder)
+
+
+    def _make_session(self, pool_size):
+        """ Build a keep-alive HTTP session so every API call reuses pooled connections. """
+
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+        session.headers["Connection"] = "keep-alive"
+        return session
+
+
+    def resize_pool(self, pool_size):
+        """ Grow/shrink the connection pool, e.g. to give every worker thread its own kept-alive connection. """
+
+        self.pool_size = pool_size
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        for prefix in ("https://", "http://"):
+            self.session.get_adapter(prefix).close()  # Release the old pool's kept-alive sockets
+            self.session.mount(prefix, adapter)
+
+
+    def close(self):
+        """ Release all pooled connections. """
+
+        self.session.close()
+        self.seek_index.save()
+        if self.archive is not None:
+            self.archive.close()
+
+
+    def __enter__(self):
+        return self
+
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+    def _request(self, method, endpoint, **kwargs):
+        """ Send one API call through the shared rate limiter (if any), retrying rate limits (429), server errors
+            (5xx) and dropped connections with backoff.  Raises RateLimitException/APIServerException when retries
+            run out or the server's Retry-After is longer than the retry policy allows. """
+
+        url = f"{self.api_url}/{endpoint}"
+        attempt = 0
+        while True:
+            if self.rate_limiter is not None:
+                with self.instrumentation.phase("wait"):
+                    self.rate_limiter.acquire()
+            start = time.perf_counter()
+            try:
+                response = self.session.request(method, url, timeout=self.timeout, **kwargs)
+            except (requests.ConnectionError, requests.Timeout):
+                self.instrumentation.add_time("network", time.perf_counter() - start)
+                if attempt >= self.retry_policy.max_retries:
+                    raise
+                delay = self.retry_policy.delay(attempt)
+                self.instrumentation.retry(method, endpoint, "connection", delay)
+                logging.warning(f"API {method} call: {url} | connection failed, retrying in {delay:.1f}s")
+                time.sleep(delay)
+                attempt += 1
+                continue
+
+            code = response.status_code
+            self.instrumentation.request(method, endpoint, code, time.perf_counter() - start, len(response.content))
+            if code == 429 or code >= 500:
+                if code == 429 and self.rate_limiter is not None:
+                    self.rate_limiter.throttled()
+                delay = self.retry_policy.delay(attempt, response.headers.get("Retry-After"))
+                if attempt >= self.retry_policy.max_retries or delay is None:
+                    raise RateLimitException if code == 429 else APIServerException(code=code)
+                self.instrumentation.retry(method, endpoint, code, delay)
+                logging.warning(f"API {method} call: {url} | {code}, retrying in {delay:.1f}s")
+                time.sleep(delay)
+                attempt += 1
+                continue
+
+            if self.rate_limiter is not None:
+                self.rate_limiter.succeeded()
+            return response
 
 
-    def _api_request(self, endpoint, params=None):
-        """ Helper to do API GET calls. """
+    def _api_request(self, endpoint, params=None, messages=False):
+        """ Helper to do API GET calls.  With `messages`, returns just the page's list of messages. """
         
-        if params:
-            response = requests.get(url=f"{self.api_url}/{endpoint}", params=params)
-        else:
-            response = requests.get(url=f"{self.api_url}/{endpoint}")
+        response = self._request("GET", endpoint, params=params)
         code = response.status_code
         if 200 <= code < 300:
             logging.debug(f"API call: {self.api_url}/{endpoint} | {code}")
-            encoding = response.encoding
             raw = response.content
-            return json.loads(raw.decode(encoding))
-        elif code >= 400:
+            with self.instrumentation.phase("json"):
+                return self.decoder.messages(raw) if messages else self.decoder.loads(raw)
+        elif code == 304:  # Not Modified: nothing (newer/older) to return
+            logging.debug(f"API call: {self.api_url}/{endpoint} | 304, nothing new")
+        elif code in (401, 403):
             raise APIAuthException
+        elif code >= 400:
+            raise BadRequestException(code=code)
         else:
             logging.error(f"ERROR: Bad API call: {self.api_url}/{endpoint} | {code}")
 
@@ -84,14 +232,17 @@ class GroupMe:
             for header in headers:
                 all_headers[header] = headers[header]
 
-        response = requests.post(url=f"{self.api_url}/{endpoint}", headers=all_headers, data=data)
+        response = self._request("POST", endpoint, headers=all_headers, data=data)
         code = response.status_code
         logging.debug(f"API POST call: {self.api_url}/{endpoint} | {code}")
         if 200 <= code < 300:
             raw = response.content
-            return json.loads(raw)
-        elif code > 400:
+            with self.instrumentation.phase("json"):
+                return self.decoder.loads(raw)
+        elif code in (401, 403):
             raise APIAuthException
+        elif code > 400:
+            raise BadRequestException(code=code)
         elif code == 400:
             raise BadMessageException
         else:
@@ -124,44 +275,107 @@ class GroupMe:
         return all_groups
 
 
+    def get_me(self) -> Dict:
+        """ The signed-in user (id, user_id, name, ...). """
+
+        if self.me is None:
+            self.me = self._api_request("users/me", params={"token": self.api_token})['response']
+        return self.me
+
+
+    def group_directory(self, refresh=False) -> DirectoryCache:
+        """ Directory with group names/ids/members loaded, re-fetching the group listing if it's stale. """
+
+        if refresh or self.directory.groups_stale():
+            self.directory.set_groups(self.get_groups())
+        return self.directory
+
+
+    def chat_directory(self, refresh=False) -> DirectoryCache:
+        """ Directory with direct message names/ids loaded, re-fetching the chat listing if it's stale. """
+
+        if refresh or self.directory.chats_stale():
+            self.directory.set_chats(self.get_chats())
+        return self.directory
+
+
+    def user_directory(self, refresh=False) -> UserDirectory:
+        """ Index of every member of every group (plus former members seen so far) and of every direct message
+            partner already listed, kept in step with the group/chat directory. """
+
+        directory = self.group_directory(refresh)
+        fetched = (directory.groups_fetched, directory.chats_fetched)
+        if self.users is None or self.users_fetched != fetched:
+            former = self.users.former if self.users is not None else None
+            self.users = UserDirectory(directory.group_members, former=former, chat_ids=directory.chat_ids)
+            self.users_fetched = fetched
+        return self.users
+
+
+    def invalidate_directory(self):
+        """ Forget cached names/ids, e.g. after joining a group, so the next lookup sees fresh listings. """
+
+        self.directory.invalidate()
+
+
     def get_group_id(self, name):
         """ Get internal ID for group chat with given `name`. """
 
-        groups = self.get_groups()
-        for group in groups:
-            if group['name'] == name:
-                return group['id']
-        raise BadNameException(username=name)  # We've parsed all group names and didn't find a match
+        cached = not self.directory.groups_stale()
+        groupid = self.group_directory().group_id(name)
+        if groupid is None and cached:
+            groupid = self.group_directory(refresh=True).group_id(name)  # Group may be newer than our cache
+        if groupid is None:
+            raise BadNameException(username=name)  # We've parsed all group names and didn't find a match
+        return groupid
 
 
     def get_chat_id(self, username):
         """ Get internal ID for direct message with given user `username`. """
 
-        chats = self.get_chats()
-        for chat in chats:
-            if chat['other_user']['name'] == username:
-                return chat['other_user']['id']
-        raise BadNameException(username=username)  # We've parsed all group names and didn't find a match
+        cached = not self.directory.chats_stale()
+        chatid = self.chat_directory().chat_id(username)
+        if chatid is None and cached:
+            chatid = self.chat_directory(refresh=True).chat_id(username)  # Chat may be newer than our cache
+        if chatid is None:
+            raise BadNameException(username=username)  # We've parsed all chat names and didn't find a match
+        return chatid
 
 
     def get_group_members(self, name=None, groupid=None):
         """ Get list of members for a given group via group `name` or internal `groupid`. """
 
         if name or groupid:
-            groups = self.get_groups()
-            for group in groups:
-                if group['name'] == name or group['id'] == groupid:
-                    return group['members']
+            cached = not self.directory.groups_stale()
+            members = self.group_directory().members(name=name, groupid=groupid)
+            if members is None and cached:
+                members = self.group_directory(refresh=True).members(name=name, groupid=groupid)
+            if members is not None:
+                return members
         raise BadNameException(username=name)  # We've parsed all group names and didn't find a match
+
+
+    def get_user_name(self, user_id):
+        """ Name for a user id seen in any group or direct message listing, or None. """
+
+        name = self.user_directory().name(user_id)
+        if name is None and self.directory.chats_stale():
+            self.chat_directory()
+            name = self.user_directory().name(user_id)
+        return name
             
 
-    def get_user_id(self, members, name=None, nickname=None):
-        """ Given a list of group members, turn name/nickname into uuid that is consistent across all GroupMe chats. """
+    def get_user_id(self, members=None, name=None, nickname=None, groupid=None):
+        """ Turn name/nickname into uuid that is consistent across all GroupMe chats: from the given list of group
+            `members`, or else from the user directory, preferring members of group `groupid` if given. """
 
         if name or nickname:
-            for member in members:
-                if member['name'] == name or member['nickname'] == nickname:
-                    return member['user_id']
+            if members is not None:
+                for member in members:
+                    if member['name'] == name or member['nickname'] == nickname:
+                        return member['user_id']
+                return None
+            return self.user_directory().user_id(name=name, nickname=nickname, groupid=groupid)
 
 
     def filter_response(self, response, filt: Callable = None):
@@ -179,29 +393,59 @@ class GroupMe:
                 return resp_content
         
 
-    def get_1page_group(self, groupid: int, before: int = 0, filt: Callable = None) -> List[str]:
-        """ Method for getting 1 page of messages from a group message. """
+    def filter_page(self, page, filt: Callable = None):
+        """ Apply `filt` to a page of messages, timing it as the "filter" phase. """
+
+        if not filt or not page:
+            return page
+        with self.instrumentation.phase("filter"):
+            return filt(page)
+
+
+    @staticmethod
+    def project_page(page, project=None):
+        """ Apply a message.Projection to a page, if given. """
+
+        return project(page) if project is not None else page
+
+
+    def profile(self) -> str:
+        """ Breakdown of API calls and where the time went since this client was created (or last reset). """
+
+        return self.instrumentation.report()
+
+
+    def get_1page_group(self, groupid: int, before: int = 0, filt: Callable = None, after: int = None) -> List[str]:
+        """ Method for getting 1 page of messages from a group message.  With `after`, the page is the messages
+            right after that id, oldest first. """
 
         # Set params for API GET call based on input
         params = {"token": self.api_token, "limit": 100}
         if before:
             params["before_id"] = before
+        if after is not None:
+            params["after_id"] = after
 
-        response = self._api_request(f"groups/{groupid}/messages", params=params)
-        return self.filter_response(response, filt=filt)
+        page = self._api_request(f"groups/{groupid}/messages", params=params, messages=True) or None
+        self.seek_index.record(MessageArchive.conversation_key(groupid=groupid), page)
+        return self.filter_page(page, filt)
 
 
-    def get_1page_chat(self, chatid: int, before: int = 0, filt: Callable = None) -> List[str]:
-        """ Method for getting 1 page of messages from a direct message. """
+    def get_1page_chat(self, chatid: int, before: int = 0, filt: Callable = None, since: int = None) -> List[str]:
+        """ Method for getting 1 page of messages from a direct message.  With `since`, only messages newer than
+            that id (the newest of them, newest first). """
 
         # Set params for API GET call based on input
         params = {"token": self.api_token, "limit": 100}
         if before:
             params["before_id"] = before
+        if since is not None:
+            params["since_id"] = since
         params["other_user_id"] = chatid
 
-        response = self._api_request(f"direct_messages", params=params)
-        return self.filter_response(response, filt=filt)
+        page = self._api_request(f"direct_messages", params=params, messages=True) or None
+        self.seek_index.record(MessageArchive.conversation_key(chatid=chatid), page)
+        return self.filter_page(page, filt)
 
     
     def get_1page_messages(self,
@@ -229,8 +473,28 @@ class GroupMe:
             return self.get_1page_chat(chatid, before=before, filt=filt)
 
 
-    def get_all_messages(self, name=None, groupid=None, chatid=None, group=False, chat=False, filt=None):
-        """ Helper to paginate messages -- paginates on id of last message """
+    def get_all_messages(self, name=None, groupid=None, chatid=None, group=False, chat=False, filt=None,
+                         fields=None):
+        """ Helper to paginate messages -- paginates on id of last message.  With `fields` (e.g.
+            message.STATS_FIELDS) each message is a CompactMessage holding only those fields. """
+
+        return list(self.iter_messages(name=name, groupid=groupid, chatid=chatid, group=group, chat=chat, filt=filt,
+                                       fields=fields))
+
+
+    def iter_messages(self, name=None, groupid=None, chatid=None, group=False, chat=False, filt=None, fields=None):
+        """ Lazily yield every message (newest first) without holding the whole history in memory. """
+
+        for page in self.iter_pages(name=name, groupid=groupid, chatid=chatid, group=group, chat=chat, filt=filt,
+                                    fields=fields):
+            yield from page
+
+
+    def iter_pages(self, name=None, groupid=None, chatid=None, group=False, chat=False, filt=None, fields=None,
+                   refresh_window=None):
+        """ Lazily yield pages of messages as they arrive, newest first, with `filt` applied to each page and
+            the survivors projected down to `fields` (as CompactMessages) if given.  With an archive, messages
+            from the last `refresh_window` seconds are re-downloaded first (see sync_archive). """
 
         # Need a group/user `name` or ID in order to get messages
         if not name and not groupid and not chatid:
@@ -242,21 +506,268 @@ class GroupMe:
         if name and not chatid and chat:
             chatid = self.get_chat_id(name)
 
-        all_messages = []
-        some_messages = self.get_1page_messages(name=name, groupid=groupid, chatid=chatid, group=group, chat=chat)
+        # Pages come newest-first, so a filter with a lower date bound lets us stop once we've paged past it,
+        # and one with an upper bound lets us skip straight to where its date range starts
+        min_created_at = getattr(filt, 'min_created_at', None)
+        max_created_at = getattr(filt, 'max_created_at', None)
+        project = projection(fields)
+
+        if self.archive is not None:
+            # Archived history: fetch only what's new, then serve every page locally
+            conversation = self.sync_archive(groupid=groupid if group else None, chatid=chatid if chat else None,
+                                             refresh_window=refresh_window)
+            before = self.archive.before_id(conversation, max_created_at) if max_created_at else 0
+            # A text filter's full-text query means only candidate matches are read from the archive
+            for some_messages in self.archive.iter_pages(conversation, before=before,
+                                                         match=getattr(filt, 'match', None)):
+                yield self.project_page(self.filter_page(some_messages, filt), project)
+                if self.past_date_range(some_messages, min_created_at):
+                    return
+            return
+
+        before = 0
+        if max_created_at is not None:
+            before = self.seek_before_id(groupid=groupid if group else None, chatid=chatid if chat else None,
+                                         max_created_at=max_created_at)
+        some_messages = self.get_1page_messages(name=name, groupid=groupid, chatid=chatid, before=before,
+                                                group=group, chat=chat)
 
         while some_messages is not None and len(some_messages) > 0:
 
             # Grab this before we filter out any messages so we don't poll the same messages twice
             last_id = some_messages[-1]['id']
+            done = self.past_date_range(some_messages, min_created_at)
 
-            if filt:
-                some_messages = filt(some_messages)
-            all_messages += some_messages
+            yield self.project_page(self.filter_page(some_messages, filt), project)
+            if done:
+                return
             # Get next page of messages based on the ID we grabbed
             some_messages = self.get_1page_messages(name=name, groupid=groupid, chatid=chatid, before=last_id, group=group, chat=chat)
 
-        return all_messages
+
+    def seek_before_id(self, groupid=None, chatid=None, max_created_at=None, max_probes=64) -> int:
+        """ A `before_id` whose older messages include everything created before `max_created_at`, as close to
+            that date as we can find, so paging can skip newer history.  Uses the seek index when it already
+            brackets the date and otherwise probes: exponentially back from the newest known message until a
+            page is older than the date, then by bisecting message ids until a page spans the gap.  Every probe
+            page warms the index, and the exact boundary found is indexed too.
+            Returns 0 (start from the newest message) if no skip is possible. """
+
+        conversation = MessageArchive.conversation_key(groupid=groupid, chatid=chatid)
+        get_page = (lambda before: self.get_1page_group(groupid, before=before)) if groupid else \
+                   (lambda before: self.get_1page_chat(chatid, before=before))
+
+        span = None  # Id distance one page of messages covers, once we've fetched a page
+        lo, hi = self.seek_index.bracket(conversation, max_created_at)
+        if hi is None:
+            page = get_page(0)  # Newest page
+            if not page or int(page[-1]['created_at']) < max_created_at:
+                return 0
+            span = max(100, int(page[0]['id']) - int(page[-1]['id']))
+            lo, hi = self.seek_index.bracket(conversation, max_created_at)
+
+        step = 0  # Id distance to jump back while no older message is known, at least twice a page's span
+        floor = lo  # Ids at or below this hold nothing newer than `max_created_at`, once known
+        for _ in range(max_probes):
+            if floor is not None and hi - floor <= 1:
+                break
+            if span is None or (floor is not None and hi - floor <= span):
+                probe = hi  # The page before `hi` shows what's right below it (and teaches us the span)
+            elif floor is None:
+                step = max(step * 2, 2 * span)
+                probe = max(hi - step, 1)
+            else:
+                probe = (floor + hi) // 2
+
+            page = get_page(probe)
+            if page:
+                span = max(span or 100, int(page[0]['id']) - int(page[-1]['id']))
+            if not page or int(page[0]['created_at']) < max_created_at:
+                if probe == hi:
+                    break  # Nothing between the newest older message and `hi`, so `hi` is where the range ends
+                floor = max(floor or 0, probe - 1)  # No message in (page[0], probe) so nothing newer below `probe`
+            elif int(page[-1]['created_at']) < max_created_at:
+                # This page straddles the date: index the exact boundary so later seeks go straight to it
+                i = next(i for i, message in enumerate(page) if int(message['created_at']) < max_created_at)
+                self.seek_index.record(conversation, page[i - 1:i + 1])
+                break
+            lo, hi = self.seek_index.bracket(conversation, max_created_at)
+            if lo is not None:
+                floor = max(floor or 0, lo)
+
+        return self.seek_index.bracket(conversation, max_created_at)[1]
+
+
+    @staticmethod
+    def past_date_range(page, min_created_at) -> bool:
+        """ True if a newest-first page already reaches messages older than `min_created_at`, i.e. every later
+            page would be filtered out entirely. """
+
+        return min_created_at is not None and len(page) > 0 and int(page[-1]['created_at']) < min_created_at
+
+
+    def sync_archive(self, groupid=None, chatid=None, refresh_window=None) -> str:
+        """ Bring the archive for a group/chat up to date, only paging until we reach already-archived messages
+            older than `refresh_window` seconds (default: the client's `archive_refresh`).  Messages within the
+            window are re-downloaded, since their likes (`favorited_by`) may have changed; older ones keep the likes
+            they had when archived.  Returns the archive key for the conversation. """
+
+        conversation = self.archive.conversation_key(groupid=groupid, chatid=chatid)
+        state = self.archive.get_state(conversation)
+        if refresh_window is None:
+            refresh_window = self.archive_refresh
+        cutoff = time.time() - (refresh_window or 0)
+        get_page = (lambda before: self.get_1page_group(groupid, before=before)) if groupid else \
+                   (lambda before: self.get_1page_chat(chatid, before=before))
+
+        # Catch up from the newest message.  On a fresh archive this pass is the whole backfill, so progress
+        # is recorded page-by-page and an interrupted run resumes from the oldest id it reached.
+        fresh = state['head_id'] is None
+        head_id = None
+        page = get_page(0)
+        while page:
+            self.archive.store_page(conversation, page)
+            if head_id is None:
+                head_id = page[0]['id']
+            if fresh:
+                self.archive.set_state(conversation, head_id=head_id, tail_id=page[-1]['id'])
+            elif int(page[-1]['id']) <= state['head_id'] and int(page[-1]['created_at']) < cutoff:
+                break  # Caught up, and re-read everything recent enough to have new likes
+            page = get_page(page[-1]['id'])
+
+        if fresh:
+            self.archive.set_state(conversation, complete=True)
+            return conversation
+        if head_id is not None:
+            self.archive.set_state(conversation, head_id=head_id)
+
+        # Finish a backfill that a previous run didn't complete
+        if not state['complete']:
+            page = get_page(state['tail_id'])
+            while page:
+                self.archive.store_page(conversation, page)
+                self.archive.set_state(conversation, tail_id=page[-1]['id'])
+                page = get_page(page[-1]['id'])
+            self.archive.set_state(conversation, complete=True)
+
+        return conversation
+
+
+    def get_messages_after(self, after: int, groupid=None, chatid=None, filt: Callable = None) -> List[Dict]:
+        """ Every message in a group/direct message newer than message id `after`, oldest first ([] if none):
+            pages of `after_id` for groups, of `since_id` (newest-first, so collected then reversed) for chats. """
+
+        messages = []
+        if groupid:
+            page = self.get_1page_group(groupid, after=after)
+            while page:
+                messages += page
+                if len(page) < 100:  # A short page is the newest there is
+                    break
+                page = self.get_1page_group(groupid, after=max(int(m['id']) for m in page))
+        elif chatid:
+            page = self.get_1page_chat(chatid, since=after)
+            while page:
+                messages += page
+                if len(page) < 100:
+                    break
+                page = self.get_1page_chat(chatid, before=page[-1]['id'], since=after)
+        messages.sort(key=lambda message: int(message['id']))
+        return self.filter_page(messages, filt)
+
+
+    def latest_message_ids(self, groups=True, chats=True) -> Dict[str, int]:
+        """ Newest message id of every group and/or direct message, keyed by archive conversation key, from the
+            group/chat listings (which also refreshes the directory). """
+
+        latest = {}
+        if groups:
+            listing = self.get_groups()
+            self.directory.set_groups(listing)
+            for group in listing:
+                last_id = (group.get('messages') or {}).get('last_message_id')
+                if last_id:
+                    latest[MessageArchive.conversation_key(groupid=group['id'])] = int(last_id)
+        if chats:
+            listing = self.get_chats()
+            self.directory.set_chats(listing)
+            for chat in listing:
+                last_id = (chat.get('last_message') or {}).get('id')
+                if last_id:
+                    latest[MessageArchive.conversation_key(chatid=chat['other_user']['id'])] = int(last_id)
+        return latest
+
+
+    def tail(self, group_names=None, chat_names=None, groupids=None, chatids=None, filt: Callable = None,
+             min_interval: float = 2, max_interval: float = 60, stop: threading.Event = None) -> Iterator[Dict]:
+        """ Follow groups/direct messages (every group if none are given), yielding each message posted from now on
+            as it's seen, oldest first per conversation, with `filt` applied.  Runs until `stop` is set or the
+            generator is closed.
+
+            One loop polls every conversation for only the messages after the newest it has seen (`after_id` /
+            `since_id`, so a quiet conversation costs a bodiless 304), each on its own schedule: `min_interval`
+            seconds after it had something new, doubling up to `max_interval` while it stays quiet.  A
+            conversation that fails is backed off (to `max_interval` if access is refused) or, if the API rejects
+            it outright (e.g. a group we've left), dropped; the others carry on. """
+
+        conversations = [MessageArchive.conversation_key(groupid=self.get_group_id(name)) for name in group_names or []]
+        conversations += [MessageArchive.conversation_key(chatid=self.get_chat_id(name)) for name in chat_names or []]
+        conversations += [MessageArchive.conversation_key(groupid=groupid) for groupid in groupids or []]
+        conversations += [MessageArchive.conversation_key(chatid=chatid) for chatid in chatids or []]
+        conversations = list(dict.fromkeys(conversations))
+
+        # Start from each conversation's newest message, per the listings (one call per 10 conversations)
+        if conversations:
+            latest = self.latest_message_ids(groups=any(key.startswith("group:") for key in conversations),
+                                             chats=any(key.startswith("chat:") for key in conversations))
+        else:
+            latest = self.latest_message_ids(chats=False)  # Also refreshes the group directory we list
+            conversations = [MessageArchive.conversation_key(groupid=groupid)
+                             for groupid in self.directory.group_members]
+        last_ids = {key: latest.get(key) for key in conversations}
+        intervals = {key: min_interval for key in conversations}
+        now = time.monotonic()
+        due = [(now, key) for key in conversations]  # (next poll time, conversation), soonest first
+
+        while due:
+            when, key = heapq.heappop(due)
+            delay = max(when - time.monotonic(), 0)
+            if stop is not None:
+                if stop.wait(delay):
+                    return
+            elif delay:
+                time.sleep(delay)
+
+            kind, conversation_id = key.split(":", 1)
+            groupid = conversation_id if kind == "group" else None
+            chatid = conversation_id if kind == "chat" else None
+            try:
+                if last_ids[key] is None:  # Not in the listing: start from its newest message instead
+                    page = self.get_1page_messages(groupid=groupid, chatid=chatid, group=bool(groupid),
+                                                   chat=bool(chatid))
+                    last_ids[key] = int(page[0]['id']) if page else 0
+                    new = []
+                else:
+                    new = self.get_messages_after(last_ids[key], groupid=groupid, chatid=chatid)
+            except (APIServerException, RateLimitException, requests.RequestException) as e:
+                logging.warning(f"Polling {key} failed ({e}), backing off")
+                new = []
+            except APIAuthException as e:  # Not allowed to read it (any more); keep checking, rarely
+                logging.warning(f"Polling {key} was refused ({e}), retrying every {max_interval}s")
+                new = []
+                intervals[key] = max_interval
+            except BadRequestException as e:  # e.g. 404 after leaving the group
+                logging.warning(f"Polling {key} failed ({e}), no longer following it")
+                continue
+            if new:
+                last_ids[key] = int(new[-1]['id'])
+                intervals[key] = min_interval
+            else:
+                intervals[key] = min(intervals[key] * 2, max_interval)
+            heapq.heappush(due, (time.monotonic() + intervals[key], key))
+
+            for message in self.filter_page(new, filt):
+                yield message
 
 
     def get_chats(self):
@@ -282,138 +793,97 @@ class GroupMe:
     def send_dm(self, text: str, name: str) -> Dict:
         """ Helper to send a message to a DM. """
 
-        chatid = self.get_chat_id(name)
-        data = {
-            "direct_message": {
-                "source_guid": f"{randint(1, 9999)}",
-                "recipient_id": chatid,
-                "text": text
-            }
-        }
-        
-        return self._api_request_post(f"direct_messages?token={self.api_token}", json.dumps(data))
+        return self.post_message(text, chatid=self.get_chat_id(name))
 
 
     def send_group_message(self, text: str, name: str) -> Dict:
         """ Helper to send a message to a group. """
 
-        groupid = self.get_group_id(name)
+        return self.post_message(text, groupid=self.get_group_id(name))
+
+
+    def post_message(self, text: str, groupid=None, chatid=None, source_guid: str = None) -> Dict:
+        """ Send one message (<= 1000 characters) to a group `groupid` or direct message with user `chatid`.
+            `source_guid` lets the server drop duplicates of the same send; a unique one is generated if omitted. """
+
+        source_guid = source_guid or new_source_guid()
+        if groupid:
+            data = {
+                "message": {
+                    "source_guid": source_guid,
+                    "text": text
+                }
+            }
+            return self._api_request_post(f"groups/{groupid}/messages?token={self.api_token}", json.dumps(data))
+
         data = {
-            "message": {
-                "source_guid": f"{randint(1, 9999)}",
+            "direct_message": {
+                "source_guid": source_guid,
+                "recipient_id": chatid,
                 "text": text
             }
         }
-
-        return self._api_request_post(f"groups/{groupid}/messages?token={self.api_token}", json.dumps(data))
+        return self._api_request_post(f"direct_messages?token={self.api_token}", json.dumps(data))
 
     
     def send_message(self, text, name=None, groupid=None, chatid=None, group=False, chat=False):
         """ Send message to specified group/chat. """
-        # TODO: split into group/chat functions
-
-        # If message is >1000chars, split into manageable chunks and call send_message() recursively on chunks.
-        if len(text) > 1000:
-            messages = self.split_message(text)
-            for m in messages:
-                self.send_message(m, name=name, groupid=groupid, chatid=chatid, group=group, chat=chat)
-            return
 
         # Need a group/user `name` or ID in order to send message
         if not group and not chat:
             return
 
+        # Resolve the target once, not once per chunk
         elif group:
-            # return self.send_group_message(data, groupid)
-
-            data = {
-                "message": {
-                    "source_guid": f"{randint(1, 9999)}",
-                    "text": text
-                }
-            }
-
             if not name and not groupid:
                 return
             elif not groupid and name:
                 groupid = self.get_group_id(name)
-            
-
-            response = self._api_request_post(f"groups/{groupid}/messages?token={self.api_token}", json.dumps(data))
-            return response
+            chatid = None
 
         elif chat:
-            # return self.send_dm(data, groupid)
-
             if not chatid and not name:
                 return
             elif not chatid and name:
                 chatid = self.get_chat_id(name)
+            groupid = None
 
-            data = {
-                "direct_message": {
-                    "source_guid": f"{randint(1, 9999)}",
-                    "recipient_id": chatid,
-                    "text": text
-                }
-            }
-            
+        # If message is >1000chars, split into manageable chunks and send them in order
+        if len(text) > 1000:
+            for m in self.split_message(text):
+                self.post_message(m, groupid=groupid, chatid=chatid)
+            return
 
-            response = self._api_request_post(f"direct_messages?token={self.api_token}", json.dumps(data))
-            return response
+        return self.post_message(text, groupid=groupid, chatid=chatid)
 
 
-    def split_message(self, m):
-        # TODO: comment / make more readable
-        """ split message into chunks if too long for GroupMe (max message len=1000 characters)"""
-        
-        maxlen = 920 # lets set this low because we'll re-add newlines and spaces that are cut
+    def send_queue(self, workers: int = 8) -> SendQueue:
+        """ Pipeline for sending lots of messages: concurrent across conversations, in order within each. """
+
+        return SendQueue(self, workers=workers)
+
+
+    def split_message(self, m, maxlen=1000):
+        """ Split message into chunks short enough for GroupMe (max message len=1000 characters).
+
+            Single pass: each chunk ends at the last newline that fits, otherwise the last space, otherwise it's
+            cut hard at `maxlen`.  Only the newline/space a chunk is split on is dropped; all other text is kept. """
+
         out = []
-        if "\n" in m:
-            segments = m.split("\n")
-            goodstr = ""
-            for segment in segments:
-                if len(segment) > maxlen:
-                    segments2 = self.split_message(segment)
-                    if len(goodstr) != 0:
-                        out += [goodstr]
-                    else:
-                        for s in segments2:
-                            out += [s]
-                else:
-                    if len(segment) + len(goodstr) <= maxlen:
-                        goodstr += "\n" + segment
-                    else:
-                        out += [goodstr]
-                        goodstr = ""
-        else:
-            if " " in m:
-                segments = m.split(" ")
-                goodstr = ""
-                for segment in segments:
-                    if len(segment) > maxlen:
-                        segments2 = self.split_message(segment)
-                        if len(goodstr) != 0:
-                            out += [goodstr]
-                        else:
-                            for s in segments2:
-                                out += [s]
-                    else:
-                        if len(segment) + len(goodstr) <= maxlen:
-                            goodstr += " " + segment
-                        else:
-                            out += [goodstr]
-                            goodstr = ""
+        start = 0
+        end_of_message = len(m)
+        while end_of_message - start > maxlen:
+            end = start + maxlen
+            # The separator may sit just past a full-length chunk, so search up to and including `end`
+            cut = m.rfind("\n", start + 1, end + 1)
+            if cut == -1:
+                cut = m.rfind(" ", start + 1, end + 1)
+            if cut == -1:
+                out.append(m[start:end])
+                start = end
             else:
-                mlen = len(m)
-                num_segs = ceil(mlen/1000.)
-                start = 0
-                end = 999
-                tick = 0
-                while tick < num_segs:
-                    seg = m[start:end]
-                    start += 999
-                    end += 999
-                    tick += 1
-                    out += [seg]
+                out.append(m[start:cut])
+                start = cut + 1
+        if start < end_of_message:
+            out.append(m[start:])
         return out
@@ -0,0 +1,167 @@
+import re
+import threading
+import time
+
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Callable
+
+
+# Upper bounds (ms) of the request latency histogram buckets; the last bucket is everything slower
+LATENCY_BUCKETS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+
+# Phases a GroupMe client times on its own; callers may time any others (e.g. "stats") with `phase()`
+PHASES = ("wait", "network", "json", "filter", "stats")
+
+
+def endpoint_name(endpoint: str) -> str:
+    """ Group calls by route: "groups/123/messages?token=..." -> "groups/{id}/messages". """
+
+    return re.sub(r"/\d+(?=/|$)", "/{id}", endpoint.split("?", 1)[0])
+
+
+class EndpointStats:
+    """ Counters for one method + endpoint. """
+
+    def __init__(self):
+        self.requests = 0
+        self.errors = 0  # Responses with status >= 400, including ones that were retried
+        self.retries = 0
+        self.bytes = 0
+        self.seconds = 0.0
+        self.max_seconds = 0.0
+        self.histogram = [0] * (len(LATENCY_BUCKETS) + 1)
+
+    def percentile(self, p: float) -> float:
+        """ Approximate latency percentile in ms: the upper bound of the bucket it falls in (at most the max). """
+
+        rank = p * self.requests
+        seen = 0
+        for i, count in enumerate(self.histogram):
+            seen += count
+            if count and seen >= rank:
+                return min(LATENCY_BUCKETS[i] if i < len(LATENCY_BUCKETS) else float("inf"), self.max_seconds * 1000)
+        return 0.0
+
+
+class Instrumentation:
+    """ Thread-safe record of what a GroupMe client spends its time on: per-endpoint request counts, latency
+        histograms, bytes received and retries, plus time per phase (waiting on the rate limiter, network, JSON
+        decoding, filtering, stats aggregation).  Hooks added with `add_hook` are called as
+        `hook(event, data)` for every "request", "retry" and "phase" event, e.g. to feed an external metrics
+        system; they run on the calling thread so should be quick. """
+
+    def __init__(self):
+
+        self.lock = threading.Lock()
+        self.hooks = []
+        self.reset()
+
+
+    def reset(self):
+        with self.lock:
+            self.endpoints = {}  # "GET groups/{id}/messages" -> EndpointStats
+            self.phases = dict.fromkeys(PHASES, 0.0)
+            self.started = time.perf_counter()
+
+
+    def add_hook(self, hook: Callable):
+        self.hooks.append(hook)
+
+
+    def remove_hook(self, hook: Callable):
+        self.hooks.remove(hook)
+
+
+    def _emit(self, event, data):
+        for hook in self.hooks:
+            hook(event, data)
+
+
+    def _endpoint(self, method, endpoint) -> EndpointStats:
+        key = f"{method} {endpoint_name(endpoint)}"
+        stats = self.endpoints.get(key)
+        if stats is None:
+            stats = self.endpoints[key] = EndpointStats()
+        return stats
+
+
+    def request(self, method: str, endpoint: str, status: int, seconds: float, size: int):
+        """ Record one HTTP round trip (`size` bytes of response body, `seconds` including the download). """
+
+        with self.lock:
+            stats = self._endpoint(method, endpoint)
+            stats.requests += 1
+            stats.errors += status >= 400
+            stats.bytes += size
+            stats.seconds += seconds
+            stats.max_seconds = max(stats.max_seconds, seconds)
+            stats.histogram[bisect_left(LATENCY_BUCKETS, seconds * 1000)] += 1
+            self.phases["network"] += seconds
+        if self.hooks:
+            self._emit("request", {"method": method, "endpoint": endpoint_name(endpoint), "status": status,
+                                   "seconds": seconds, "bytes": size})
+
+
+    def retry(self, method: str, endpoint: str, reason, delay: float):
+        """ Record that a call is being retried after `reason` (a status code or "connection"). """
+
+        with self.lock:
+            self._endpoint(method, endpoint).retries += 1
+        if self.hooks:
+            self._emit("retry", {"method": method, "endpoint": endpoint_name(endpoint), "reason": reason,
+                                 "delay": delay})
+
+
+    def add_time(self, phase: str, seconds: float):
+        with self.lock:
+            self.phases[phase] = self.phases.get(phase, 0.0) + seconds
+        if self.hooks:
+            self._emit("phase", {"phase": phase, "seconds": seconds})
+
+
+    @contextmanager
+    def phase(self, name: str):
+        """ Time the body of a `with` block towards phase `name`. """
+
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_time(name, time.perf_counter() - start)
+
+
+    def report(self) -> str:
+        """ Human-readable breakdown of everything recorded since the last reset. """
+
+        with self.lock:
+            wall = time.perf_counter() - self.started
+            endpoints = sorted(self.endpoints.items())
+            phases = dict(self.phases)
+
+        out = f"\nProfile ({wall:.2f}s wall time):\n"
+        out += f"    {'endpoint':<32} {'calls':>6} {'errors':>6} {'retries':>7} {'KB':>9} " + \
+               f"{'mean ms':>8} {'p50 ms':>7} {'p95 ms':>7} {'max ms':>7}\n"
+        for key, stats in endpoints:
+            mean = stats.seconds / stats.requests * 1000 if stats.requests else 0.0
+            out += f"    {key:<32} {stats.requests:>6} {stats.errors:>6} {stats.retries:>7} " + \
+                   f"{stats.bytes / 1024:>9,.1f} {mean:>8.1f} {stats.percentile(0.5):>7.0f} " + \
+                   f"{stats.percentile(0.95):>7.0f} {stats.max_seconds * 1000:>7.0f}\n"
+
+        out += "\n    Latency histogram (all endpoints):\n"
+        histogram = [sum(stats.histogram[i] for _, stats in endpoints) for i in range(len(LATENCY_BUCKETS) + 1)]
+        labels = [f"<= {bound}ms" for bound in LATENCY_BUCKETS] + [f"> {LATENCY_BUCKETS[-1]}ms"]
+        for label, count in zip(labels, histogram):
+            if count:
+                out += f"    {label:>10} {count:>6}\n"
+
+        # Phases on background threads (prefetching, bulk workers) overlap, so these can add up past wall time
+        out += "\n    Time by phase (summed across threads):\n"
+        for name, seconds in phases.items():
+            share = seconds / wall * 100 if wall else 0.0
+            out += f"    {name:>10} {seconds:>8.2f}s {share:>5.0f}%\n"
+        busy = phases["network"] + phases["wait"]
+        cpu = sum(seconds for name, seconds in phases.items() if name not in ("network", "wait"))
+        out += f"\n    {'API-bound' if busy >= cpu else 'CPU-bound'}: {busy:.2f}s waiting on the API " + \
+               f"vs {cpu:.2f}s decoding/filtering/aggregating\n"
+        return out
@@ -0,0 +1,54 @@
+import json
+import os
+import threading
+
+from typing import Dict
+
+
+class LeaderboardStore:
+    """ Persisted, partially-tallied group_stats leaderboards so reruns only have to look at new messages.
+
+        Per group it keeps the tally's layout `version`, `settled_id` (the newest message folded in for good) and
+        each metric's counters (RankStat.state()).  Only messages older than the like re-scan window
+        are settled, since likes on recent messages keep changing; see group_stats.update_group_stats. """
+
+    def __init__(self, path=None):
+
+        self.path = path
+        self.lock = threading.Lock()
+        self.groups = {}  # group id -> {"version": int, "settled_id": int, "metrics": {metric: state}}
+        if path and os.path.exists(path):
+            with open(path) as f:
+                self.groups = json.load(f)
+
+
+    def get(self, groupid) -> Dict:
+        with self.lock:
+            return self.groups.get(str(groupid))
+
+
+    def set(self, groupid, state: Dict):
+        with self.lock:
+            self.groups[str(groupid)] = state
+        self.save()
+
+
+    def invalidate(self, groupid=None):
+        """ Forget one group's tally (or all of them) so the next update rescans from the beginning. """
+
+        with self.lock:
+            if groupid is None:
+                self.groups = {}
+            else:
+                self.groups.pop(str(groupid), None)
+        self.save()
+
+
+    def save(self):
+        if not self.path:
+            return
+        with self.lock:
+            tmp = f"{self.path}.tmp"
+            with open(tmp, "w") as f:
+                json.dump(self.groups, f)
+            os.replace(tmp, self.path)
@@ -0,0 +1,90 @@
+import sys
+
+from typing import Dict, Iterable, List
+
+
+# What the leaderboards in group_stats read from a message
+STATS_FIELDS = ("id", "created_at", "sender_id", "name", "text", "favorited_by")
+
+# Fields whose values repeat across a conversation (user ids, display names) and are worth sharing one copy of
+INTERNED_FIELDS = ("sender_id", "user_id", "name", "group_id", "recipient_id", "sender_type")
+
+
+class CompactMessage:
+    """ Slotted stand-in for a message dict that keeps only a chosen set of fields.  Reads like the dict it came
+        from (`message['text']`, `message.get('text')`, `'text' in message`), so code written against raw API
+        messages works unchanged; a field that wasn't projected, or wasn't in the original message, is missing.
+        Build them with `Projection`, which makes one subclass per field set. """
+
+    __slots__ = ()
+    fields = ()
+
+    def __getitem__(self, key):
+        try:
+            return getattr(self, key)
+        except (AttributeError, TypeError):
+            raise KeyError(key) from None
+
+    def get(self, key, default=None):
+        try:
+            return getattr(self, key)
+        except (AttributeError, TypeError):
+            return default
+
+    def __contains__(self, key):
+        return key in self.fields and hasattr(self, key)
+
+    def keys(self) -> List[str]:
+        return [field for field in self.fields if hasattr(self, field)]
+
+    def to_dict(self) -> Dict:
+        return {field: getattr(self, field) for field in self.keys()}
+
+    def __eq__(self, other):
+        if isinstance(other, (CompactMessage, dict)):
+            return self.to_dict() == (other.to_dict() if isinstance(other, CompactMessage) else other)
+        return NotImplemented
+
+    def __repr__(self):
+        return f"{type(self).__name__}({self.to_dict()!r})"
+
+
+class Projection:
+    """ Callable turning a page of raw message dicts into CompactMessages holding only `fields`.  Repeated
+        strings (user ids, names) are interned and `favorited_by` becomes a tuple of interned user ids, so a
+        million-message history costs a few hundred bytes per message instead of a full JSON dict. """
+
+    _classes = {}
+
+    def __init__(self, fields: Iterable[str]):
+
+        self.fields = tuple(dict.fromkeys(fields))
+        self.cls = Projection._classes.get(self.fields)
+        if self.cls is None:
+            self.cls = Projection._classes[self.fields] = type("CompactMessage", (CompactMessage,),
+                                                               {"__slots__": self.fields, "fields": self.fields})
+
+    def message(self, raw: Dict) -> CompactMessage:
+        message = self.cls()
+        for field in self.fields:
+            if field in raw:
+                value = raw[field]
+                if field == "favorited_by" and value is not None:
+                    value = tuple(sys.intern(user_id) for user_id in value)
+                elif field in INTERNED_FIELDS and type(value) is str:
+                    value = sys.intern(value)
+                setattr(message, field, value)
+        return message
+
+    def __call__(self, page: List[Dict]) -> List[CompactMessage]:
+        if not page:
+            return page
+        return [self.message(raw) for raw in page]
+
+
+def projection(fields):
+    """ A Projection for `fields`, or None (keep raw dicts) when no fields are given. """
+
+    if fields is None or isinstance(fields, Projection):
+        return fields
+    return Projection(fields)
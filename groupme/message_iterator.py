@@ -1,60 +1,124 @@
+from concurrent.futures import ThreadPoolExecutor
+
 from groupme.groupme import GroupMe
+from groupme.message import projection
+
+_NOT_FETCHED = object()
 
 class MessageIterator:
-    """ Helper to iterate thru the individual pages of results returned from GroupMe API. """
+    """ Helper to iterate thru the individual pages of results returned from GroupMe API.
+        Use as `for page in MessageIterator(...)` or with has_next()/next(); with `prefetch=True` the page after
+        the one just returned is fetched on a background thread while the caller works on the current one, and
+        with `fields` pages hold CompactMessages with only those fields.  The prefetch thread stops once the pages
+        run out; a caller that may stop early should use `with MessageIterator(...) as it:` or close() it. """
 
-    def __init__(self, chat=False, group=False, name=None, filt=None, last=0):
+    def __init__(self, chat=False, group=False, name=None, filt=None, last=0, groupme=None, prefetch=False,
+                 fields=None):
 
-        self.groupme = GroupMe()
+        # Share the caller's client (and its connection pool) when given one
+        self.groupme = groupme if groupme is not None else GroupMe()
 
         self.chatid = None
         self.groupid = None
         self.last_mess_id = last
         self.filt = filt
-        
+        self.project = projection(fields)
+        self.min_created_at = getattr(filt, 'min_created_at', None)  # Stop paging once past a date filter
+        self.match = getattr(filt, 'match', None)  # Full-text query narrowing down archived messages
+        self.archive_pages = None  # Generator over archived pages, once started
+        self.lookahead = _NOT_FETCHED  # Raw page after the last one returned, once fetched
+        self.pending = None  # Future for a prefetched page
+        self.executor = None
+
         if chat:
             self.chatid = self.groupme.get_chat_id(name)
         elif group:
             self.groupid = self.groupme.get_group_id(name)
 
-    def next(self):
-        """ Get the next page of messages, applying filters if specified. """
-
-        if self.chatid:
-            page = self.groupme.get_1page_messages(chatid=self.chatid, before=self.last_mess_id, chat=True)
-            if page is not None and len(page) > 0:
-                self.last_mess_id = page[-1]['id']
-                if self.filt:
-                    page = self.filt(page)
-                    return page
-                else:
-                    return page
+        # Read pages from the local archive (after pulling in anything new) when the client has one
+        self.conversation = None
+        if self.groupme.archive is not None and (self.chatid or self.groupid):
+            self.conversation = self.groupme.sync_archive(groupid=self.groupid, chatid=self.chatid)
 
+        # Skip history newer than the filter's date range
+        max_created_at = getattr(filt, 'max_created_at', None)
+        if not last and max_created_at is not None and (self.chatid or self.groupid):
+            if self.conversation:
+                self.last_mess_id = self.groupme.archive.before_id(self.conversation, max_created_at)
+            else:
+                self.last_mess_id = self.groupme.seek_before_id(groupid=self.groupid, chatid=self.chatid,
+                                                                max_created_at=max_created_at)
+
+        # Started last, so a failed lookup above doesn't leave a thread behind
+        if prefetch:
+            self.executor = ThreadPoolExecutor(max_workers=1)
+
+    def _fetch_page(self, before):
+        """ Get the raw page of messages older than message id `before`. """
+
+        if self.conversation:
+            # The archive pages (and runs any full-text search) itself; `before` only sets where it starts
+            if self.archive_pages is None:
+                self.archive_pages = self.groupme.archive.iter_pages(self.conversation, before=before,
+                                                                     match=self.match)
+            return next(self.archive_pages, [])
+        elif self.chatid:
+            return self.groupme.get_1page_messages(chatid=self.chatid, before=before, chat=True)
         elif self.groupid:
-            page = self.groupme.get_1page_messages(groupid=self.groupid, before=self.last_mess_id, group=True)
-            if page is not None and len(page) > 0:
-                self.last_mess_id = page[-1]['id']
-                if self.filt:
-                    page = self.filt(page)
-                    return page
-                else:
-                    return page
+            return self.groupme.get_1page_messages(groupid=self.groupid, before=before, group=True)
+
+    def _peek(self):
+        """ The raw page after the last one returned, fetched (or waited on, if prefetching) only once. """
+
+        if self.pending is not None:
+            self.lookahead = self.pending.result()
+            self.pending = None
+        elif self.lookahead is _NOT_FETCHED:
+            self.lookahead = self._fetch_page(self.last_mess_id)
+        return self.lookahead
+
+    def next(self):
+        """ Get the next page of messages, applying filters if specified.  Returns None when there are no more. """
+
+        page = self._peek()
+        self.lookahead = _NOT_FETCHED
+        if page is not None and len(page) > 0:
+            self.last_mess_id = page[-1]['id']
+            if self.groupme.past_date_range(page, self.min_created_at):
+                self.lookahead = []  # Everything older is outside the filter's dates
+            elif self.executor is not None:
+                self.pending = self.executor.submit(self._fetch_page, self.last_mess_id)
+            return self.groupme.project_page(self.groupme.filter_page(page, self.filt), self.project)
+        self.close()
 
     def has_next(self):
         """ Returns boolean corresponding to whether there are still more messages to parse. """
 
-        if self.chatid:
-            page = self.groupme.get_1page_messages(chatid=self.chatid, before=self.last_mess_id, chat=True)
-            if page is not None and len(page) > 0:
-                return True
-            else:
-                return False
+        page = self._peek()
+        if page is not None and len(page) > 0:
+            return True
+        self.close()
+        return False
 
-        if self.groupid:
-            page = self.groupme.get_1page_messages(groupid=self.groupid, before=self.last_mess_id, group=True)
-            if page is not None and len(page) > 0:
-                return True
-            else:
-                return False
+    def close(self):
+        """ Stop the prefetch thread, if any. """
+
+        if self.executor is not None:
+            self.executor.shutdown(wait=False, cancel_futures=True)
+            self.executor = None
+            self.pending = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
 
+    def __iter__(self):
+        return self
 
+    def __next__(self):
+        page = self.next()
+        if page is None:
+            raise StopIteration
+        return page
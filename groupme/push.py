@@ -0,0 +1,284 @@
+import asyncio
+import itertools
+import logging
+import os
+import threading
+import time
+
+from typing import Callable, Dict, List
+
+import requests
+
+from groupme.archive import MessageArchive
+from groupme.groupme import APIAuthException, APIServerException, BadRequestException, GroupMe, \
+                            RateLimitException
+
+
+class PushException(Exception):
+
+    def __init__(self, message="GroupMe push server refused the request (%s).", error=""):
+        self.message = message % error
+        super().__init__(self.message)
+
+
+class PushSubscriber:
+    """ Real-time new group and direct messages from GroupMe's push server (Faye/Bayeux over long-polling), so
+        watching any number of conversations costs one open request instead of polling each of them.
+
+        A background thread subscribes to the signed-in user's channel, which carries every group and direct
+        message they receive, and hands each new message (passing `filt`, if given) to the callbacks, oldest first.
+        When the connection or the server's session is lost it re-handshakes with backoff and, with `gap_fill`,
+        fetches whatever was posted meanwhile through the REST API (`after_id`/`since_id`), for every conversation
+        whose newest message id in the group/chat listings moved past the last one delivered.  Each message is
+        delivered once, in id order per conversation.
+
+        Usage:
+            with PushSubscriber(g, callback=print):
+                ...
+        or, from asyncio:
+            async for message in PushSubscriber(g):
+                ...
+    """
+
+    def __init__(self, groupme: GroupMe = None, callback: Callable = None, filt: Callable = None,
+                 push_url=os.getenv('GROUPME_PUSH_URL', "https://push.groupme.com/faye"), gap_fill=True):
+
+        self.groupme = groupme if groupme is not None else GroupMe()
+        self.push_url = push_url
+        self.filt = filt
+        self.gap_fill = gap_fill
+        self.lock = threading.Lock()
+        self.callbacks = [callback] if callback is not None else []
+        self.session = requests.Session()  # Its own connection, so the long poll doesn't hold one of the API pool's
+        self.message_ids = itertools.count(1)
+        self.client_id = None   # Bayeux session, None until (re-)handshaken
+        self.channel = None     # /user/<signed-in user id>
+        self.user_id = None
+        self.last_ids = {}      # archive conversation key -> newest message id delivered
+        self.baseline = {}      # archive conversation key -> newest message id when we first subscribed
+        self.timeout = 30       # Seconds the server may hold a connect open, per its advice
+        self.interval = 0       # Seconds to wait between connects, per its advice
+        self.error = None       # Why the subscriber gave up, if it did
+        self.connected = threading.Event()
+        self.stopped = threading.Event()
+        self.thread = None
+
+
+    def add_callback(self, callback: Callable):
+        """ Call `callback(message)` for every new message. """
+
+        with self.lock:
+            self.callbacks.append(callback)
+
+
+    def remove_callback(self, callback: Callable):
+        with self.lock:
+            if callback in self.callbacks:
+                self.callbacks.remove(callback)
+
+
+    def start(self):
+        """ Start listening on a background thread (no-op if already listening). """
+
+        if self.thread is None or not self.thread.is_alive():
+            self.stopped.clear()
+            self.thread = threading.Thread(target=self.run, name="groupme-push", daemon=True)
+            self.thread.start()
+        return self
+
+
+    def stop(self, timeout: float = None):
+        """ Stop listening.  Nothing is delivered afterwards; waits up to `timeout` seconds for an open long poll
+            to finish (by default it is abandoned). """
+
+        self.stopped.set()
+        self.connected.clear()
+        if timeout and self.thread is not None and self.thread is not threading.current_thread():
+            self.thread.join(timeout)
+
+
+    def wait_connected(self, timeout: float = None) -> bool:
+        """ Block until subscribed (and caught up); False if `timeout` seconds pass first. """
+
+        return self.connected.wait(timeout)
+
+
+    def __enter__(self):
+        return self.start()
+
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+    async def messages(self):
+        """ Async iterator over new messages, starting the subscriber if it isn't running:
+            `async for message in subscriber.messages()`. """
+
+        loop = asyncio.get_running_loop()
+        queue = asyncio.Queue()
+        callback = lambda message: loop.call_soon_threadsafe(queue.put_nowait, message)
+        self.add_callback(callback)
+        self.start()
+        try:
+            while True:
+                yield await queue.get()
+        finally:
+            self.remove_callback(callback)
+
+
+    def __aiter__(self):
+        return self.messages()
+
+
+    def run(self):
+        """ Listen until stop(): handshake and subscribe, then long-poll /meta/connect, re-handshaking (and
+            filling any gap) whenever the connection or the server's session is lost. """
+
+        attempt = 0
+        while not self.stopped.is_set():
+            try:
+                if self.client_id is None:
+                    self._handshake()
+                self._connect()
+                attempt = 0
+            except APIAuthException as e:
+                self.error = e
+                logging.error(f"Push subscription rejected: {e}")
+                break
+            except (requests.RequestException, PushException, ValueError, APIServerException, BadRequestException,
+                    RateLimitException) as e:
+                if self.stopped.is_set():
+                    break
+                self.client_id = None
+                self.connected.clear()
+                delay = self.groupme.retry_policy.delay(min(attempt, 10))
+                logging.warning(f"Push connection lost ({e}), reconnecting in {delay:.1f}s")
+                self.stopped.wait(delay)
+                attempt += 1
+                continue
+            if self.interval:
+                self.stopped.wait(self.interval)
+        self.connected.clear()
+
+
+    def _bayeux(self, message: Dict, timeout: float = 30) -> List[Dict]:
+        """ POST one Bayeux message, returning the server's replies (and any pushed messages). """
+
+        message["id"] = str(next(self.message_ids))
+        response = self.session.post(self.push_url, json=[message], timeout=timeout)
+        if response.status_code != 200:
+            raise PushException(error=f"status {response.status_code}")
+        return response.json()
+
+
+    def _advise(self, advice: Dict):
+        """ Adopt the server's long-poll timeout and reconnect interval (both given in ms). """
+
+        if advice:
+            self.timeout = advice.get("timeout", self.timeout * 1000) / 1000
+            self.interval = advice.get("interval", self.interval * 1000) / 1000
+
+
+    def _handshake(self):
+        """ Open a Bayeux session, subscribe to the user's channel and catch up on anything missed. """
+
+        reply = self._bayeux({"channel": "/meta/handshake", "version": "1.0",
+                              "supportedConnectionTypes": ["long-polling"]})[0]
+        if not reply.get("successful"):
+            raise PushException(error=reply.get("error"))
+        self.client_id = reply["clientId"]
+        self._advise(reply.get("advice"))
+
+        if self.user_id is None:
+            self.user_id = str(self.groupme.get_me()["id"])
+            self.channel = f"/user/{self.user_id}"
+        reply = self._bayeux({"channel": "/meta/subscribe", "clientId": self.client_id, "subscription": self.channel,
+                              "ext": {"access_token": self.groupme.api_token, "timestamp": int(time.time())}})[0]
+        if not reply.get("successful"):
+            if str(reply.get("error", "")).startswith("401"):
+                raise APIAuthException
+            raise PushException(error=reply.get("error"))
+
+        # Subscribed first, so anything posted while we catch up is pushed too (and de-duplicated)
+        self._catch_up()
+        self.connected.set()
+
+
+    def _connect(self):
+        """ One long poll: deliver whatever the server pushes before it answers. """
+
+        replies = self._bayeux({"channel": "/meta/connect", "clientId": self.client_id,
+                                "connectionType": "long-polling"}, timeout=self.timeout + 30)
+        failed = None
+        for reply in replies:
+            if reply.get("channel") == "/meta/connect":
+                self._advise(reply.get("advice"))
+                if not reply.get("successful"):
+                    failed = reply
+            elif reply.get("channel") == self.channel:
+                data = reply.get("data") or {}
+                if data.get("type") in ("line.create", "direct_message.create") and data.get("subject"):
+                    self._deliver([data["subject"]])
+
+        if failed is not None:
+            reconnect = (failed.get("advice") or {}).get("reconnect")
+            if reconnect == "none":
+                raise APIAuthException(message=f"Push server closed the subscription ({failed.get('error')}).")
+            self.client_id = None
+            self.connected.clear()
+            if reconnect != "handshake":
+                raise PushException(error=failed.get("error"))
+
+
+    def _catch_up(self):
+        """ Deliver messages posted since the last one delivered in each conversation.  The first time through
+            this just records where every conversation stands; that baseline isn't used to drop pushed messages,
+            since anything pushed was posted after we subscribed. """
+
+        for conversation, newest in self.groupme.latest_message_ids().items():
+            known = self.last_ids.get(conversation, self.baseline.get(conversation))
+            if known is None or not self.gap_fill:
+                self.baseline[conversation] = newest
+            elif newest > known:
+                self._fill(conversation, known)
+
+
+    def _fill(self, conversation: str, after: int):
+        """ Fetch and deliver a conversation's messages newer than id `after` through the REST API. """
+
+        kind, conversation_id = conversation.split(":", 1)
+        self._deliver(self.groupme.get_messages_after(after, groupid=conversation_id if kind == "group" else None,
+                                                      chatid=conversation_id if kind == "chat" else None))
+
+
+    def conversation_key(self, message: Dict) -> str:
+        """ Archive key of the group or direct message (by the other user's id) a message belongs to. """
+
+        if message.get("group_id"):
+            return MessageArchive.conversation_key(groupid=message["group_id"])
+        sender_id = str(message.get("sender_id"))
+        return MessageArchive.conversation_key(chatid=message.get("recipient_id") if sender_id == self.user_id
+                                               else sender_id)
+
+
+    def _deliver(self, messages: List[Dict]):
+        """ Hand each not-yet-delivered message that passes the filter to every callback. """
+
+        new = []
+        for message in messages:
+            conversation = self.conversation_key(message)
+            if int(message["id"]) > self.last_ids.get(conversation, 0):
+                self.last_ids[conversation] = int(message["id"])
+                new.append(message)
+        new = self.groupme.filter_page(new, self.filt)
+        with self.lock:
+            callbacks = list(self.callbacks)
+        for message in new or []:
+            if self.stopped.is_set():
+                return
+            for callback in callbacks:
+                try:
+                    callback(message)
+                except Exception:
+                    logging.exception("Push message callback failed")
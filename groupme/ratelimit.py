@@ -0,0 +1,97 @@
+import random
+import threading
+import time
+
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import Optional
+
+
+class RateLimiter:
+    """ Thread-safe token bucket: at most `rate` requests/second on average, with bursts of up to `burst`.
+        One limiter shared by every thread using a client keeps them all inside the same request budget.
+
+        The rate adapts to the API: every throttled (429) response halves it (down to `min_rate`) and every
+        successful one raises it by `increase` req/s (up to `max_rate`, which defaults to the starting rate). """
+
+    def __init__(self, rate, burst=None, min_rate=None, max_rate=None, increase=0.1):
+
+        self.rate = float(rate)
+        self.burst = float(burst if burst is not None else max(1, rate))
+        self.min_rate = float(min_rate if min_rate is not None else min(1, rate))
+        self.max_rate = float(max_rate if max_rate is not None else rate)
+        self.increase = increase
+        self.tokens = self.burst
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+
+    def reserve(self) -> float:
+        """ Take a token, returning how many seconds the caller must wait before using it. """
+
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.tokens -= 1
+            return 0.0 if self.tokens >= 0 else -self.tokens / self.rate
+
+
+    def acquire(self):
+        """ Block until a request may be sent. """
+
+        wait = self.reserve()
+        if wait > 0:
+            time.sleep(wait)
+
+
+    def throttled(self):
+        """ The API pushed back: halve the rate. """
+
+        with self.lock:
+            self.rate = max(self.min_rate, self.rate / 2)
+
+
+    def succeeded(self):
+        """ A request went through: creep the rate back up. """
+
+        if self.rate < self.max_rate:
+            with self.lock:
+                self.rate = min(self.max_rate, self.rate + self.increase)
+
+
+class RetryPolicy:
+    """ How often and how long to wait before retrying rate-limited (429), server error (5xx) and dropped
+        requests: the server's Retry-After when it sends one, otherwise full-jitter exponential backoff of at
+        most `max_backoff` seconds.  A Retry-After longer than `max_backoff` isn't waited out at all. """
+
+    def __init__(self, max_retries=5, backoff=0.5, max_backoff=60):
+
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+
+
+    def delay(self, attempt: int, retry_after: str = None) -> Optional[float]:
+        """ Seconds to wait before retry number `attempt` (0-based), or None to give up because the server asked
+            for a longer wait than the policy allows. """
+
+        wait = parse_retry_after(retry_after)
+        if wait is not None:
+            return wait if wait <= self.max_backoff else None
+        return random.uniform(0, min(self.max_backoff, self.backoff * 2 ** attempt))
+
+
+def parse_retry_after(value: str):
+    """ Seconds from a Retry-After header (delta-seconds or HTTP-date), or None if missing/unparseable. """
+
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, (parsedate_to_datetime(value) - datetime.now(timezone.utc)).total_seconds())
+    except (TypeError, ValueError):
+        return None
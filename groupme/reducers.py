@@ -0,0 +1,198 @@
+import os
+import re
+
+from collections import Counter, deque
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, List
+
+from groupme.message import CompactMessage
+from groupme.search import tokenize
+
+
+class Reducer:
+    """ A statistic over message history, computed in pieces that can run anywhere and be combined:
+
+            stat = WordCount()   # init: construct an empty tally
+            part = stat.empty()  # a blank tally of the same statistic, for a chunk of history
+            part.update(page)    # fold in a page of messages
+            stat.merge(part)     # fold in the same stat tallied over other messages
+            stat.result()        # finalize
+
+        `merge` is called in history order (the tally of newer messages absorbing the next older chunk's), so a
+        stat whose result depends on order sees the same sequence a single pass would.  Each chunk starts from
+        `empty()`, which is pickled to worker processes, so keep it small and plain data (and define subclasses
+        at module level): anything only result() needs, like a group's member list, stays out of it.  `fields`
+        are the message fields update() reads, for projecting pages. """
+
+    fields = None  # None: reads whole messages
+
+    def add(self, message):
+        raise NotImplementedError
+
+    def update(self, page: List[Dict]):
+        for message in page:
+            self.add(message)
+
+    def empty(self) -> "Reducer":
+        raise NotImplementedError
+
+    def merge(self, other: "Reducer") -> "Reducer":
+        raise NotImplementedError
+
+    def result(self):
+        raise NotImplementedError
+
+
+class WordCount(Reducer):
+    """ How often each word appears in message text (case-insensitive); result is the `top` most common
+        [(word, count)], or all of them. """
+
+    fields = ("text",)
+
+    def __init__(self, top: int = None):
+        self.top = top
+        self.counts = Counter()
+
+    def empty(self):
+        return WordCount(self.top)
+
+    def update(self, page):
+        counts = self.counts
+        for message in page:
+            text = message.get('text')
+            if text:
+                counts.update(tokenize(text))
+
+    def merge(self, other):
+        self.counts.update(other.counts)
+        return self
+
+    def result(self):
+        return self.counts.most_common(self.top)
+
+
+class RegexTally(Reducer):
+    """ Matches of regex `pattern` in message text, per value of field `by` (e.g. "sender_id"), or in total
+        (under None) if `by` is None; result is {key: # matches}. """
+
+    def __init__(self, pattern: str, by: str = None, flags: int = 0):
+        self.pattern = re.compile(pattern, flags)
+        self.by = by
+        self.fields = ("text",) if by is None else ("text", by)
+        self.counts = {}
+
+    def empty(self):
+        return RegexTally(self.pattern.pattern, self.by, self.pattern.flags)
+
+    def update(self, page):
+        findall, by, counts = self.pattern.findall, self.by, self.counts
+        for message in page:
+            text = message.get('text')
+            if text:
+                matches = len(findall(text))
+                if matches:
+                    key = message.get(by) if by is not None else None
+                    counts[key] = counts.get(key, 0) + matches
+
+    def merge(self, other):
+        for key, count in other.counts.items():
+            self.counts[key] = self.counts.get(key, 0) + count
+        return self
+
+    def result(self):
+        return dict(self.counts)
+
+
+def reduce_chunk(reducers: Dict[str, Reducer], pages: List[List[Dict]]) -> Dict[str, Reducer]:
+    """ Blank copies of `reducers` with `pages` folded in (the unit of work sent to a pool). """
+
+    reducers = {name: reducer.empty() for name, reducer in reducers.items()}
+    for page in pages:
+        for reducer in reducers.values():
+            reducer.update(page)
+    return reducers
+
+
+def merge_reducers(reducers: Dict[str, Reducer], partial: Dict[str, Reducer]) -> Dict[str, Reducer]:
+    for name, reducer in reducers.items():
+        reducer.merge(partial[name])
+    return reducers
+
+
+@contextmanager
+def reducer_pool(executor=None, workers: int = None):
+    """ The Executor to reduce on: `executor` itself if it is one, a new thread/process pool of `workers` for
+        "thread"/"process" (shut down afterwards), or None to reduce inline. """
+
+    if executor is None or isinstance(executor, Executor):
+        yield executor
+        return
+    if executor not in ("thread", "process"):
+        raise ValueError(f"executor must be an Executor, 'thread', 'process' or None, not {executor!r}")
+    pool = ThreadPoolExecutor(max_workers=workers) if executor == "thread" else ProcessPoolExecutor(workers)
+    try:
+        yield pool
+    finally:
+        pool.shutdown(cancel_futures=True)
+
+
+def reduce_pages(pages: Iterable[List[Dict]], reducers: Dict[str, Reducer], executor=None, workers: int = None,
+                 chunk_pages: int = 10, max_pending: int = None) -> Dict[str, Reducer]:
+    """ Fold a history's pages into `reducers` (updated in place and returned).  Inline by default; with an
+        `executor` (see reducer_pool) the pages are cut into chunks of `chunk_pages` that are reduced in parallel
+        and merged back in order.  At most `max_pending` chunks (default: 2 per worker) wait in memory at once,
+        so a long history streams through.  Pages of CompactMessages are sent to processes as dicts. """
+
+    with reducer_pool(executor, workers) as pool:
+        if pool is None:
+            for page in pages:
+                for reducer in reducers.values():
+                    reducer.update(page)
+            return reducers
+
+        if max_pending is None:
+            max_pending = 2 * (workers or os.cpu_count() or 4)
+        template = {name: reducer.empty() for name, reducer in reducers.items()}  # What's sent with every chunk
+        pickled = isinstance(pool, ProcessPoolExecutor)
+        pending = deque()
+        chunk = []
+        for page in pages:
+            if pickled:
+                page = [message.to_dict() if isinstance(message, CompactMessage) else message for message in page]
+            chunk.append(page)
+            if len(chunk) == chunk_pages:
+                pending.append(pool.submit(reduce_chunk, template, chunk))
+                chunk = []
+                while len(pending) > max_pending:
+                    merge_reducers(reducers, pending.popleft().result())
+        if chunk:
+            pending.append(pool.submit(reduce_chunk, template, chunk))
+        while pending:
+            merge_reducers(reducers, pending.popleft().result())
+    return reducers
+
+
+def reduce_groups(groupme, make_reducers: Callable, groupids: List = None, executor=None, workers: int = None,
+                  fetch_workers: int = 8, chunk_pages: int = 10, filt: Callable = None) -> Dict[str, Dict]:
+    """ Run reducers over many groups' histories (every group by default): `make_reducers(members)` builds a
+        group's {name: Reducer} from its current members.  Histories are fetched `fetch_workers` groups at a time
+        on threads (through the client's archive, if it has one) and reduced inline in those threads, or on a
+        shared `executor` pool (see reducer_pool).  Returns {group id: {name: result}}. """
+
+    if groupids is None:
+        groupids = list(groupme.group_directory().group_members)
+    users = groupme.user_directory()
+
+    with reducer_pool(executor, workers) as pool:
+        def reduce_group(groupid):
+            reducers = make_reducers(users.group_members(groupid))
+            fields = [field for reducer in reducers.values() for field in (reducer.fields or ())]
+            projected = all(reducer.fields is not None for reducer in reducers.values())
+            pages = groupme.iter_pages(groupid=groupid, group=True, filt=filt, fields=fields if projected else None)
+            reduce_pages(pages, reducers, executor=pool, workers=workers, chunk_pages=chunk_pages)
+            return {name: reducer.result() for name, reducer in reducers.items()}
+
+        with ThreadPoolExecutor(max_workers=fetch_workers) as fetchers:
+            results = dict(zip(groupids, fetchers.map(reduce_group, groupids)))
+    return results
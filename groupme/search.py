@@ -0,0 +1,107 @@
+import re
+
+from typing import List
+
+try:
+    import re._parser as sre_parse
+    import re._constants as sre_constants
+except ImportError:  # Python < 3.11
+    import sre_parse
+    import sre_constants
+
+
+TOKEN = re.compile(r"[^\W_]+")  # Runs of letters/digits, like SQLite FTS5's unicode61 tokenizer
+CLAUSE = re.compile(r'"([^"]*)"(\*?)|(\S+)')
+
+
+def tokenize(text: str) -> List[str]:
+    return [token.lower() for token in TOKEN.findall(text)]
+
+
+class SearchQuery:
+    """ A full-text query: whitespace-separated words, "exact phrases" and prefix* terms, all of which must occur
+        in a message's text (case-insensitively, on word boundaries).  Matches in Python with `matches()`, or
+        as an SQLite FTS5 MATCH expression with `to_fts()`. """
+
+    def __init__(self, query: str):
+
+        self.query = query
+        self.clauses = []  # [(tokens, last token is a prefix)]
+        for phrase, phrase_star, word in CLAUSE.findall(query):
+            text = phrase if not word else word
+            prefix = bool(phrase_star) if not word else word.endswith("*")
+            tokens = tokenize(text)
+            if tokens:
+                self.clauses.append((tokens, prefix))
+
+    def matches(self, text: str) -> bool:
+        if text is None:
+            return not self.clauses
+        words = tokenize(text)
+        return all(self._contains(words, tokens, prefix) for tokens, prefix in self.clauses)
+
+    @staticmethod
+    def _contains(words, tokens, prefix) -> bool:
+        n = len(tokens)
+        for i in range(len(words) - n + 1):
+            if words[i:i + n - 1] == tokens[:-1] and \
+                    (words[i + n - 1].startswith(tokens[-1]) if prefix else words[i + n - 1] == tokens[-1]):
+                return True
+        return False
+
+    def to_fts(self) -> str:
+        return " AND ".join(f'"{" ".join(tokens)}"' + ("*" if prefix else "") for tokens, prefix in self.clauses)
+
+    def __bool__(self):
+        return bool(self.clauses)
+
+    def __repr__(self):
+        return f"SearchQuery({self.query!r})"
+
+
+_BEGIN = (sre_constants.AT_BEGINNING, sre_constants.AT_BEGINNING_STRING, sre_constants.AT_BOUNDARY)
+_END = (sre_constants.AT_END, sre_constants.AT_END_STRING, sre_constants.AT_BOUNDARY)
+
+
+def _flatten(items, out):
+    """ Regex parse items -> literal characters, (starts a word, ends a word) tuples for anchors and None for
+        anything else. """
+
+    for op, arg in items:
+        if op is sre_constants.LITERAL:
+            out.append(chr(arg))
+        elif op is sre_constants.SUBPATTERN:
+            _flatten(arg[3], out)
+        elif op is sre_constants.AT:
+            out.append((arg in _BEGIN, arg in _END))
+        else:
+            out.append(None)
+    return out
+
+
+def regex_to_fts(pattern: str) -> str:
+    """ An FTS5 MATCH expression that every message `pattern` matches also matches (a superset of candidates), or
+        None if the regex doesn't require any whole or leading word.  E.g. r"^Go Birds" -> '"go" AND "birds"*'. """
+
+    try:
+        items = _flatten(sre_parse.parse(pattern), [])
+    except Exception:
+        return None
+
+    # Walk runs of literal characters; a word in a run is only usable if we know where it starts
+    clauses = []
+    run = ""
+    left = False  # Does the current run start on a word boundary?
+    for item in items + [None]:
+        if isinstance(item, str):
+            run += item
+            continue
+        right = item is not None and item[1]
+        for match in TOKEN.finditer(run):
+            starts = match.start() > 0 or left
+            ends = match.end() < len(run) or right
+            if starts:
+                clauses.append(f'"{match.group().lower()}"' + ("" if ends else "*"))
+        run = ""
+        left = item is not None and item[0]
+    return " AND ".join(clauses) or None
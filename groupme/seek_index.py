@@ -0,0 +1,65 @@
+import json
+import os
+import threading
+
+from bisect import bisect_left, insort
+from typing import Dict, List
+
+
+class SeekIndex:
+    """ Sparse, optionally persisted map of message id <-> created_at for each conversation, filled in from the
+        first/last message of every page we fetch.  Lets a date-bounded query start paging right at its end date
+        instead of at the newest message. """
+
+    def __init__(self, path=None, save_every=100):
+
+        self.path = path
+        self.save_every = save_every
+        self.lock = threading.Lock()
+        self.entries = {}  # conversation -> sorted [(created_at, id)]
+        self.unsaved = 0
+        if path and os.path.exists(path):
+            with open(path) as f:
+                self.entries = {conversation: [tuple(entry) for entry in entries]
+                                for conversation, entries in json.load(f).items()}
+
+
+    def record(self, conversation: str, page: List[Dict]):
+        """ Remember the boundary messages of a newest-first page. """
+
+        if not page:
+            return
+        with self.lock:
+            entries = self.entries.setdefault(conversation, [])
+            for message in (page[0], page[-1]):
+                entry = (int(message['created_at']), int(message['id']))
+                i = bisect_left(entries, entry)
+                if i == len(entries) or entries[i] != entry:
+                    insort(entries, entry)
+                    self.unsaved += 1
+        if self.path and self.unsaved >= self.save_every:
+            self.save()
+
+
+    def bracket(self, conversation: str, created_at: int):
+        """ (id of the newest indexed message older than `created_at`, id of the oldest indexed message at or
+            after it); either is None if nothing is indexed on that side. """
+
+        with self.lock:
+            entries = self.entries.get(conversation, [])
+            i = bisect_left(entries, (created_at, -1))
+            lo = entries[i - 1][1] if i > 0 else None
+            hi = entries[i][1] if i < len(entries) else None
+        return lo, hi
+
+
+    def save(self):
+        if not self.path:
+            return
+        with self.lock:
+            data = {conversation: entries for conversation, entries in self.entries.items()}
+            tmp = f"{self.path}.tmp"
+            with open(tmp, "w") as f:
+                json.dump(data, f)
+            os.replace(tmp, self.path)
+            self.unsaved = 0
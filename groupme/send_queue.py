@@ -0,0 +1,125 @@
+import logging
+import threading
+import uuid
+
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import List
+
+
+def new_source_guid() -> str:
+    """ Collision-free client id for an outgoing message, which the server uses to de-duplicate retried sends. """
+
+    return uuid.uuid4().hex
+
+
+class SendResult:
+    """ Outcome of sending one message chunk. """
+
+    def __init__(self, text, source_guid, response=None, error=None):
+        self.text = text
+        self.source_guid = source_guid
+        self.response = response
+        self.error = error
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+    def __repr__(self):
+        state = "ok" if self.ok else f"error={self.error!r}"
+        return f"SendResult(source_guid={self.source_guid!r}, {state})"
+
+
+class SendQueue:
+    """ Outbound send pipeline on top of a GroupMe client.  Each submitted message has its target resolved once and
+        is split into <= 1000 character chunks, each with its own unique source_guid.  Different conversations send
+        concurrently on a thread pool while messages (and chunks) to the same conversation go out in order.
+
+        Usage:
+            with groupme.send_queue(workers=8) as queue:
+                future = queue.submit("Hello!", name="Football Chat", group=True)
+            results = future.result()  # [SendResult, ...] one per chunk
+    """
+
+    def __init__(self, groupme, workers: int = 8):
+
+        self.groupme = groupme
+        self.executor = ThreadPoolExecutor(max_workers=workers)
+        self.lock = threading.Lock()
+        self.lanes = {}  # conversation -> deque of (chunks, target, future) waiting to be sent, in order
+        self.futures = []
+
+
+    def submit(self, text, name=None, groupid=None, chatid=None, group=False, chat=False) -> Future:
+        """ Queue a message; returns a Future for its list of per-chunk SendResults. """
+
+        if group and not groupid:
+            groupid = self.groupme.get_group_id(name)
+        elif chat and not chatid:
+            chatid = self.groupme.get_chat_id(name)
+        if not (group and groupid) and not (chat and chatid):
+            raise ValueError("Provide a group (group=True) or direct message (chat=True) name or id to send to.")
+
+        target = {"groupid": groupid} if group else {"chatid": chatid}
+        conversation = f"group:{groupid}" if group else f"chat:{chatid}"
+        chunks = self.groupme.split_message(text) if len(text) > 1000 else [text]
+        future = Future()
+
+        with self.lock:
+            lane = self.lanes.setdefault(conversation, deque())
+            lane.append((chunks, target, future))
+            idle = len(lane) == 1  # Nobody is draining this conversation yet
+            self.futures.append(future)
+        if idle:
+            self.executor.submit(self._drain, conversation)
+        return future
+
+
+    def _drain(self, conversation):
+        """ Send everything queued for one conversation, oldest first, until its lane is empty. """
+
+        while True:
+            with self.lock:
+                chunks, target, future = self.lanes[conversation][0]
+
+            results = []
+            for chunk in chunks:
+                result = SendResult(chunk, new_source_guid())
+                try:
+                    result.response = self.groupme.post_message(chunk, source_guid=result.source_guid, **target)
+                except Exception as e:
+                    logging.error(f"ERROR: Could not send message to {conversation}: {e}")
+                    result.error = e
+                results.append(result)
+                if result.error is not None:
+                    break  # Don't send later chunks out of order
+            future.set_result(results)
+
+            with self.lock:
+                lane = self.lanes[conversation]
+                lane.popleft()
+                if not lane:
+                    del self.lanes[conversation]
+                    return
+
+
+    def join(self) -> List[List[SendResult]]:
+        """ Wait for everything submitted so far; returns each message's results in submission order. """
+
+        with self.lock:
+            futures, self.futures = self.futures, []
+        return [future.result() for future in futures]
+
+
+    def close(self):
+        self.join()
+        self.executor.shutdown()
+
+
+    def __enter__(self):
+        return self
+
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,117 @@
+import threading
+
+from typing import Dict, List
+
+
+SYSTEM_SENDERS = ("system", "calendar")  # sender_ids of GroupMe's own event messages
+
+
+class UserDirectory:
+    """ Every user across the account's groups, indexed for O(1) lookups by user id, name and nickname, per group
+        and account-wide.  Built from the group listing's member lists and the direct message partners in the
+        DirectoryCache (see GroupMe.user_directory()); users seen posting in a group they're no longer in are
+        recorded as that group's former members, and kept when the directory is rebuilt from a fresh listing. """
+
+    def __init__(self, group_members: Dict[str, List[Dict]] = None, former: Dict[str, Dict[str, str]] = None,
+                 chat_ids: Dict[str, str] = None):
+
+        self.lock = threading.Lock()
+        self.members = {}       # group id -> {user id: member}
+        self.names = {}         # user id -> account name
+        self.by_name = {}       # name -> user id (first seen)
+        self.by_nickname = {}   # nickname -> user id (first seen)
+        self.group_by_name = {}  # group id -> {name or nickname: user id}
+        self.former = {}        # group id -> {user id: last known name}
+        for groupid, members in (group_members or {}).items():
+            self.add_group(groupid, members)
+        for groupid, users in (former or {}).items():
+            for user_id, name in users.items():
+                self.add_former_member(groupid, user_id, name)
+        self.add_chats(chat_ids or {})
+
+
+    def add_group(self, groupid, members: List[Dict]):
+        """ Index a group's current members. """
+
+        groupid = str(groupid)
+        with self.lock:
+            self.members[groupid] = {member['user_id']: member for member in members}
+            lookup = self.group_by_name[groupid] = {}
+            for member in members:
+                user_id = member['user_id']
+                self.names.setdefault(user_id, member.get('name'))
+                for key, index in ((member.get('name'), self.by_name), (member.get('nickname'), self.by_nickname)):
+                    if key is not None:
+                        index.setdefault(key, user_id)
+                        lookup.setdefault(key, user_id)
+
+
+    def add_chats(self, chat_ids: Dict[str, str]):
+        """ Index direct message partners, {name: user id} as in DirectoryCache.chat_ids. """
+
+        with self.lock:
+            for name, user_id in chat_ids.items():
+                self.names.setdefault(user_id, name)
+                self.by_name.setdefault(name, user_id)
+
+
+    def add_former_member(self, groupid, user_id: str, name: str = None):
+        """ Record that `user_id` has posted in `groupid` without being a current member. """
+
+        groupid = str(groupid)
+        with self.lock:
+            if user_id in SYSTEM_SENDERS or user_id in self.members.get(groupid, ()):
+                return
+            former = self.former.setdefault(groupid, {})
+            if former.get(user_id) is None:
+                former[user_id] = name
+            if name is not None:
+                self.names.setdefault(user_id, name)
+                self.by_name.setdefault(name, user_id)
+                self.group_by_name.setdefault(groupid, {}).setdefault(name, user_id)
+
+
+    def member(self, groupid, user_id: str) -> Dict:
+        """ The current member entry (user_id, name, nickname, ...) for `user_id` in a group, or None. """
+
+        return self.members.get(str(groupid), {}).get(user_id)
+
+
+    def group_members(self, groupid) -> List[Dict]:
+        return list(self.members.get(str(groupid), {}).values())
+
+
+    def former_members(self, groupid) -> Dict[str, str]:
+        """ {user id: last known name} of users seen posting in a group they've left. """
+
+        return dict(self.former.get(str(groupid), {}))
+
+
+    def name(self, user_id: str) -> str:
+        """ Account name of a user from any group (or their history) or direct message, or None. """
+
+        return self.names.get(user_id)
+
+
+    def display_name(self, groupid, user_id: str, default: str = None) -> str:
+        """ The user's nickname in the group, falling back to their name, then `default`. """
+
+        member = self.member(groupid, user_id)
+        if member is not None:
+            return member.get('nickname') or member.get('name')
+        name = self.former.get(str(groupid), {}).get(user_id) or self.names.get(user_id)
+        return name if name is not None else default
+
+
+    def user_id(self, name: str = None, nickname: str = None, groupid=None) -> str:
+        """ User id for a name or nickname, preferring members (current or former) of `groupid` if given. """
+
+        if groupid is not None:
+            lookup = self.group_by_name.get(str(groupid), {})
+            for key in (name, nickname):
+                if key is not None and key in lookup:
+                    return lookup[key]
+        if name is not None and name in self.by_name:
+            return self.by_name[name]
+        if nickname is not None:
+            return self.by_nickname.get(nickname)
@@ -0,0 +1,4 @@
+import os
+
+# GroupMe() reads its token when groupme.groupme is imported; no request is made in unit tests
+os.environ.setdefault("GROUPME_TOKEN", "test-token")
@@ -0,0 +1,31 @@
+import time
+
+from benchmarks.mock_server import BASE_TIME, TIME_STEP, MockGroupMeServer
+from groupme.groupme import GroupMe
+
+
+def test_sync_archive_refreshes_recent_likes(tmp_path):
+    with MockGroupMeServer(groups={"Mock Group": 1000}) as server:
+        groupid = server.group_id("Mock Group")
+        # Re-download roughly the newest 50 messages on every sync
+        window = time.time() - (BASE_TIME + 950 * TIME_STEP)
+        g = GroupMe(api_token="mock", api_url=server.api_url, archive_path=str(tmp_path / "archive.db"),
+                    archive_refresh=window)
+        conversation = g.sync_archive(groupid=groupid)
+
+        server.like(groupid, 990, ["1000", "1001"])  # Inside the refresh window
+        server.like(groupid, 500, ["1000"])          # Long since archived
+        before = server.requests["GET groups/{id}/messages"]
+        g.sync_archive(groupid=groupid)
+        assert server.requests["GET groups/{id}/messages"] - before == 1
+
+        archived = {int(m['id']): m for page in g.archive.iter_pages(conversation) for m in page}
+        group = server.groups[groupid]
+        assert archived[group.message_id(990)]['favorited_by'] == group.message(990)['favorited_by']
+        assert archived[group.message_id(500)]['favorited_by'] != group.message(500)['favorited_by']
+
+        # A wider window for one sync reaches the older message too
+        g.sync_archive(groupid=groupid, refresh_window=time.time() - (BASE_TIME + 400 * TIME_STEP))
+        archived = {int(m['id']): m for m in g.archive.get_page(conversation, before=group.message_id(501))}
+        assert archived[group.message_id(500)]['favorited_by'] == group.message(500)['favorited_by']
+        g.close()
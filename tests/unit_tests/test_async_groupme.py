@@ -0,0 +1,76 @@
+import asyncio
+
+import pytest
+
+from benchmarks.mock_server import Conversation, MockGroupMeServer
+from groupme.groupme import BadNameException, GroupMe
+from groupme.ratelimit import RetryPolicy
+
+pytest.importorskip("aiohttp")
+from groupme.async_groupme import AsyncGroupMe, AsyncMessageIterator  # noqa: E402
+
+
+def test_get_all_messages_matches_blocking_client():
+    with MockGroupMeServer(groups={"Mock Group": 450}, chats={"Rob": 130}) as server:
+        g = GroupMe(api_token="mock", api_url=server.api_url)
+        expected_group = g.get_all_messages(name="Mock Group", group=True)
+        expected_chat = g.get_all_messages(name="Rob", chat=True)
+        g.close()
+
+        async def fetch():
+            async with AsyncGroupMe(api_token="mock", api_url=server.api_url) as ag:
+                group = await ag.get_all_messages(name="Mock Group", group=True)
+                chat = await ag.get_all_messages(name="Rob", chat=True)
+                pages = [page async for page in AsyncMessageIterator(ag, name="Mock Group", group=True,
+                                                                     filt=lambda page: page[:1])]
+            return group, chat, pages
+
+        group, chat, pages = asyncio.run(fetch())
+        assert group == expected_group
+        assert chat == expected_chat
+        assert [page[0] for page in pages] == expected_group[::100]
+
+
+def test_names_missing_from_a_warm_cache_are_refetched_once():
+    with MockGroupMeServer(groups={"Mock Group": 10}, chats={"Rob": 10}) as server:
+        async def lookups():
+            async with AsyncGroupMe(api_token="mock", api_url=server.api_url) as ag:
+                await ag.get_group_id("Mock Group")
+                await ag.get_chat_id("Rob")
+                # Created after the listings were cached, within their TTL
+                server.groups["30000000"] = Conversation("group", "30000000", "New Group", 5, server.users[:3], [], 1)
+                user = {"user_id": "4000", "id": "8000", "name": "Sam", "nickname": "Sam"}
+                server.chats["4000"] = Conversation("chat", "4000", "Sam", 5, [user, server.me], [], 2)
+                groups_before = server.requests["GET groups"]
+                ids = (await ag.get_group_id("New Group"), await ag.get_chat_id("Sam"),
+                       len(await ag.get_group_members(name="New Group")))
+                assert server.requests["GET groups"] > groups_before
+                with pytest.raises(BadNameException):
+                    await ag.get_group_id("Nowhere")
+                return ids
+
+        assert asyncio.run(lookups()) == ("30000000", "4000", 3)
+
+
+def test_send_message_sends_long_text_as_ordered_chunks():
+    text = ("word " * 300 + "\n") * 5
+    with MockGroupMeServer() as server:
+        async def send():
+            async with AsyncGroupMe(api_token="mock", api_url=server.api_url) as ag:
+                await ag.send_message(text, name="Mock Group", group=True)
+
+        asyncio.run(send())
+        sent = [body["message"] for body in server.sent]
+        assert [message["text"] for message in sent] == GroupMe.split_message(None, text)
+        assert len({message["source_guid"] for message in sent}) == len(sent) > 1
+
+
+def test_throttled_requests_are_retried():
+    with MockGroupMeServer(groups={"Mock Group": 300}, throttle_every=3) as server:
+        async def fetch():
+            async with AsyncGroupMe(api_token="mock", api_url=server.api_url,
+                                    retry_policy=RetryPolicy(backoff=0.01)) as ag:
+                return await ag.get_all_messages(name="Mock Group", group=True)
+
+        assert len(asyncio.run(fetch())) == 300
+        assert server.request_count > server.requests["GET groups/{id}/messages"] > 3
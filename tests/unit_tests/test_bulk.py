@@ -0,0 +1,72 @@
+import json
+
+from benchmarks.mock_server import MockGroupMeServer
+from groupme.bulk import bulk_fetch, fetch_conversation
+from groupme.groupme import GroupMe
+
+
+class ListSink:
+
+    def __init__(self):
+        self.messages = []
+        self.closed = False
+
+    def write(self, page):
+        self.messages += page
+
+    def close(self):
+        self.closed = True
+
+
+def test_fetch_conversation_streams_history_into_sink():
+    with MockGroupMeServer(groups={"Mock Group": 250}) as server:
+        g = GroupMe(api_token="mock", api_url=server.api_url)
+        no_system = lambda page: [m for m in page if m['sender_id'] != "system"]
+        expected = no_system(g.get_all_messages(name="Mock Group", group=True))
+
+        sink = ListSink()
+        progress = []
+        group = {"kind": "group", "id": server.group_id("Mock Group"), "name": "Mock Group"}
+        count = fetch_conversation(g, group, sink, progress=lambda *args: progress.append(args[1:]), filt=no_system)
+        assert sink.messages == expected and count == len(expected)
+        assert [done for _, _, done in progress] == [False, False, False, True]
+        assert progress[-1] == (3, count, True)
+        g.close()
+
+
+def test_bulk_fetch_writes_every_conversation_and_restores_client(tmp_path):
+    with MockGroupMeServer(groups={"Group A": 230, "Group B": 40}, chats={"Rob": 120}) as server:
+        g = GroupMe(api_token="mock", api_url=server.api_url, pool_size=2)
+        rate_limiter = g.rate_limiter
+
+        results = bulk_fetch(g, directory=str(tmp_path), workers=4, rate_limit=500, progress=None)
+        assert results == {f"group_{server.group_id('Group A')}": 230, f"group_{server.group_id('Group B')}": 40,
+                           "chat_3000": 120}
+        with open(tmp_path / "chat_3000.jsonl") as f:
+            assert [json.loads(line) for line in f] == g.get_all_messages(name="Rob", chat=True)
+        assert g.rate_limiter is rate_limiter and g.pool_size == 2
+
+        # A conversation that fails is reported as None without stopping the others
+        sinks = {}
+        conversations = [{"kind": "group", "id": server.group_id("Group B"), "name": "Group B"},
+                         {"kind": "group", "id": "404", "name": "Gone"}]
+        results = bulk_fetch(g, conversations=conversations, progress=None,
+                             sink_factory=lambda conversation: sinks.setdefault(conversation['id'], ListSink()))
+        assert results == {f"group_{server.group_id('Group B')}": 40, "group_404": None}
+        assert all(sink.closed for sink in sinks.values())
+        g.close()
+
+
+def test_resize_pool_closes_the_old_connections():
+    with MockGroupMeServer(groups={"Group A": 10}) as server:
+        g = GroupMe(api_token="mock", api_url=server.api_url, pool_size=2)
+        g.get_all_messages(name="Group A", group=True)
+        old = g.session.get_adapter(server.api_url)
+        assert len(old.poolmanager.pools) == 1
+
+        g.resize_pool(4)
+        assert len(old.poolmanager.pools) == 0
+        adapter = g.session.get_adapter(server.api_url)
+        assert adapter is not old and adapter._pool_maxsize == 4
+        assert len(g.get_all_messages(name="Group A", group=True)) == 10
+        g.close()
@@ -0,0 +1,48 @@
+import pytest
+
+pytest.importorskip("numpy")
+
+from groupme.columnar import MessageColumns, leaderboards
+from groupme.group_stats import STATS
+
+
+MEMBERS = [{"user_id": "1", "name": "Rob"}, {"user_id": "2", "name": "Alec"}, {"user_id": "3", "name": "Brian"}]
+
+
+def message(id, sender_id, text="hi", likes=(), name=None, created_at=1568390400):
+    return {"id": str(id), "sender_id": sender_id, "name": name or f"user {sender_id}", "text": text,
+            "favorited_by": list(likes), "created_at": created_at + id, "attachments": []}
+
+
+MESSAGES = [message(9, "1", "Go Birds!", likes=("2", "3")), message(8, "system", "Rob added Alec", likes=("1",)),
+            message(7, "4", "bye", likes=("1",), name="Isabella"), message(6, "2", None, likes=("1", "3")),
+            message(5, "1", "lol"), message(4, "5", "hello", name=None), message(3, "4", "old name", name="Izzy"),
+            message(2, "2", "Eagles", likes=("9",))]
+
+
+def python_stats(messages, metrics):
+    stats = {metric: STATS[metric](MEMBERS) for metric in metrics}
+    for m in messages:
+        for stat in stats.values():
+            stat.add(m)
+    return {metric: stat.result() for metric, stat in stats.items()}
+
+
+def test_vectorized_leaderboards_match_group_stats():
+    metrics = list(STATS)
+    expected = python_stats(MESSAGES, metrics)
+    result = leaderboards(MessageColumns.from_messages(MESSAGES), MEMBERS, metrics)
+    most_liked, expected_most_liked = result.pop("most_liked"), expected.pop("most_liked")
+    assert result == expected
+    assert most_liked[0] == expected_most_liked[0] == 2
+    assert [(name, post["id"], post["favorited_by"]) for name, post in most_liked[1]] == \
+        [(name, post["id"], tuple(post["favorited_by"])) for name, post in expected_most_liked[1]]
+    assert list(result["orphaned_users"]) == ["4", "5"]
+
+
+def test_where_mask_recomputes_over_a_date_window():
+    columns = MessageColumns.from_messages(MESSAGES)
+    window = columns.between(min_created_at=1568390400 + 5)
+    recent = [m for m in MESSAGES if m["created_at"] >= 1568390400 + 5]
+    assert leaderboards(columns, MEMBERS, ["num_posts", "num_liked"], where=window) == \
+        python_stats(recent, ["num_posts", "num_liked"])
@@ -0,0 +1,20 @@
+import pytest
+
+from groupme.decoder import DECODERS, get_decoder
+
+
+PAGE = '{"response": {"count": 1, "messages": [{"id": "1", "text": "Go Birds! é"}]}, "meta": {"code": 200}}'
+
+
+@pytest.mark.parametrize("name", list(DECODERS))
+def test_decoders_parse_bytes_and_extract_messages(name):
+    decoder = get_decoder(name)
+    raw = PAGE.encode("utf-8")
+    assert decoder.loads(raw)["response"]["count"] == 1
+    assert decoder.messages(raw) == [{"id": "1", "text": "Go Birds! é"}]
+    assert decoder.messages(b'{"response": {"direct_messages": []}}') == []
+
+
+def test_unknown_decoder_is_an_error():
+    with pytest.raises(ValueError):
+        get_decoder("simdjson-not-installed")
@@ -0,0 +1,33 @@
+import gzip
+import json
+
+import pytest
+
+from benchmarks.mock_server import MockGroupMeServer
+from groupme.export import ExportCheckpoint, export_messages
+from groupme.groupme import GroupMe
+
+
+def test_interrupted_gzip_export_resumes_from_checkpoint(tmp_path):
+    path = str(tmp_path / "group.jsonl.gz")
+    with MockGroupMeServer(groups={"Mock Group": 1050}) as server:
+        g = GroupMe(api_token="mock", api_url=server.api_url)
+
+        def interrupt(pages, messages):
+            if pages == 5:
+                raise KeyboardInterrupt
+
+        with pytest.raises(KeyboardInterrupt):
+            export_messages(g, path, "Mock Group", group=True, checkpoint_every=2, progress=interrupt)
+        checkpoint = ExportCheckpoint(path)
+        assert (checkpoint.messages, checkpoint.done) == (500, False)
+
+        requests = server.requests["GET groups/{id}/messages"]
+        assert export_messages(g, path, "Mock Group", group=True, checkpoint_every=2) == 1050
+        assert server.requests["GET groups/{id}/messages"] - requests <= 8  # Only the 6 pages left (+ 304s)
+        assert export_messages(g, path, "Mock Group", group=True) == 1050  # Already done
+        g.close()
+
+    with gzip.open(path, "rt") as f:
+        ids = [json.loads(line)['id'] for line in f]
+    assert len(ids) == len(set(ids)) == 1050
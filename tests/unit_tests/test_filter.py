@@ -1 +1,56 @@
-# TODO: write unit test
\ No newline at end of file
+from datetime import date, datetime
+
+from groupme.filter import MessageFilter, date_to_epoch
+from groupme.groupme import GroupMe
+
+
+def message(text="hello", day=date(2019, 9, 13), hour=12, sender_id="1", name="Rob", id="1"):
+    created_at = int(datetime(day.year, day.month, day.day, hour).timestamp())
+    return {"id": id, "text": text, "created_at": created_at, "sender_id": sender_id, "name": name}
+
+
+def test_filter_text_uses_regex():
+    f = MessageFilter(text="^Hello!$")
+    assert f.filter_messages([message("Hello!"), message("Hello!!"), message(None)]) == [message("Hello!")]
+
+
+def test_filter_date_on_covers_whole_day():
+    f = MessageFilter(date_on=date(2019, 9, 13))
+    messages = [message(hour=0), message(hour=23), message(day=date(2019, 9, 14), hour=0),
+                message(day=date(2019, 9, 12), hour=23)]
+    assert f.filter_messages(messages) == messages[:2]
+
+
+def test_filter_date_before_and_after_are_inclusive():
+    f = MessageFilter(date_after=date(2019, 9, 13), date_before=date(2019, 9, 14))
+    messages = [message(day=date(2019, 9, 12)), message(day=date(2019, 9, 13), hour=0),
+                message(day=date(2019, 9, 14), hour=23), message(day=date(2019, 9, 15), hour=0)]
+    assert f.filter_messages(messages) == messages[1:3]
+
+
+def test_filter_user_by_name_in_direct_messages():
+    f = MessageFilter(username="Rob")
+    assert f.filter_messages([message(name="Rob"), message(name="Brian")]) == [message(name="Rob")]
+
+
+def test_filter_lambda_exposes_lower_date_bound():
+    assert MessageFilter(date_after=date(2019, 9, 13)).filter_lambda().min_created_at == \
+        date_to_epoch(date(2019, 9, 13))
+    assert MessageFilter(text="hi").filter_lambda().min_created_at is None
+
+
+def test_pagination_stops_once_past_date_after():
+    g = GroupMe()
+    pages = {0: [message(day=date(2019, 9, 15), id="4"), message(day=date(2019, 9, 14), id="3")],
+             "3": [message(day=date(2019, 9, 13), id="2"), message(day=date(2019, 9, 12), id="1")],
+             "1": [message(day=date(2019, 9, 11), id="0")]}
+    requested = []
+
+    def get_1page_group(groupid, before=0, filt=None):
+        requested.append(before)
+        return pages.get(before)
+
+    g.get_1page_group = get_1page_group
+    filt = MessageFilter(date_after=date(2019, 9, 13), groupme=g).filter_lambda()
+    assert [m['id'] for m in g.iter_messages(groupid="1", group=True, filt=filt)] == ["4", "3", "2"]
+    assert requested == [0, "3"]
@@ -0,0 +1,91 @@
+import time
+
+import groupme.group_stats as group_stats
+
+from benchmarks.mock_server import BASE_TIME, TIME_STEP, MockGroupMeServer
+from groupme.archive import MessageArchive
+from groupme.leaderboard_store import LeaderboardStore
+
+
+METRICS = ["num_posts", "num_likes", "len_posts", "orphaned_users"]
+
+
+def test_update_group_stats_only_rescans_new_and_recent_messages(tmp_path, monkeypatch):
+    with MockGroupMeServer(groups={"Mock Group": 1000}) as server:
+        g = group_stats.GM_INSTANCE
+        monkeypatch.setattr(g, "api_url", server.api_url)
+        g.invalidate_directory()
+        group = server.groups[server.group_id("Mock Group")]
+        path = str(tmp_path / "leaderboards.json")
+        # Re-scan roughly the newest 50 messages
+        window = time.time() - (BASE_TIME + 950 * TIME_STEP)
+
+        def fetches(update):
+            before = server.requests.get("GET groups/{id}/messages", 0)
+            result = update()
+            return result, server.requests["GET groups/{id}/messages"] - before
+
+        result, requests = fetches(lambda: group_stats.update_group_stats(
+            "Mock Group", METRICS, store=LeaderboardStore(path), rescan_window=window))
+        assert result == group_stats.group_stats("Mock Group", METRICS)
+        assert requests >= 10
+
+        group.size = 1150  # New messages arrive
+        result, requests = fetches(lambda: group_stats.update_group_stats(
+            "Mock Group", METRICS, store=LeaderboardStore(path), rescan_window=window))
+        expected = group_stats.group_stats("Mock Group", METRICS)
+        assert {metric: result[metric] for metric in METRICS[:3]} == {metric: expected[metric] for metric in METRICS[:3]}
+        assert result["orphaned_users"].keys() == expected["orphaned_users"].keys()
+        assert requests <= 3
+        g.invalidate_directory()
+
+
+def test_update_group_stats_rescans_likes_through_the_archive(tmp_path, monkeypatch):
+    with MockGroupMeServer(groups={"Mock Group": 1000}) as server:
+        g = group_stats.GM_INSTANCE
+        monkeypatch.setattr(g, "api_url", server.api_url)
+        monkeypatch.setattr(g, "archive", MessageArchive(str(tmp_path / "archive.db")))
+        g.invalidate_directory()
+        groupid = server.group_id("Mock Group")
+        path = str(tmp_path / "leaderboards.json")
+        metrics = ["num_likes", "num_liked", "most_liked"]
+        # Re-scan roughly the newest 300 messages
+        window = time.time() - (BASE_TIME + 700 * TIME_STEP)
+        group_stats.update_group_stats("Mock Group", metrics, store=LeaderboardStore(path), rescan_window=window)
+
+        server.like(groupid, 750, [user['user_id'] for user in server.users])  # Archived, but still in the window
+        result = group_stats.update_group_stats("Mock Group", metrics, store=LeaderboardStore(path),
+                                                rescan_window=window)
+        g.archive.close()
+        monkeypatch.setattr(g, "archive", None)
+        expected = group_stats.group_stats("Mock Group", metrics)
+        assert {metric: result[metric] for metric in metrics[:2]} == {metric: expected[metric] for metric in metrics[:2]}
+        most_liked = lambda result: (result[0], [(name, post['id']) for name, post in result[1]])
+        assert most_liked(result["most_liked"]) == most_liked(expected["most_liked"])
+        assert result["most_liked"][1][0][1]['id'] == str(server.groups[groupid].message_id(750))
+        g.invalidate_directory()
+
+
+def test_update_group_stats_keeps_its_tally_when_members_change(tmp_path, monkeypatch):
+    with MockGroupMeServer(groups={"Mock Group": 1000}) as server:
+        g = group_stats.GM_INSTANCE
+        monkeypatch.setattr(g, "api_url", server.api_url)
+        g.invalidate_directory()
+        group = server.groups[server.group_id("Mock Group")]
+        path = str(tmp_path / "leaderboards.json")
+        window = time.time() - (BASE_TIME + 950 * TIME_STEP)
+        group_stats.update_group_stats("Mock Group", METRICS, store=LeaderboardStore(path), rescan_window=window)
+
+        # One member leaves and a former member (who has posts) rejoins
+        group.members = group.members[1:] + server.users[len(group.members):len(group.members) + 1]
+        g.invalidate_directory()
+        before = server.requests["GET groups/{id}/messages"]
+        result = group_stats.update_group_stats("Mock Group", METRICS, store=LeaderboardStore(path),
+                                                rescan_window=window)
+        assert server.requests["GET groups/{id}/messages"] - before <= 3
+        expected = group_stats.group_stats("Mock Group", METRICS)
+        assert {metric: result[metric] for metric in METRICS[:3]} == {metric: expected[metric] for metric in METRICS[:3]}
+        assert result["orphaned_users"].keys() == expected["orphaned_users"].keys()
+        assert group.members[-1]['user_id'] not in result["orphaned_users"]
+        assert server.users[0]['user_id'] in result["orphaned_users"]
+        g.invalidate_directory()
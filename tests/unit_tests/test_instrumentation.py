@@ -0,0 +1,26 @@
+from groupme.instrumentation import Instrumentation, endpoint_name
+
+
+def test_endpoint_name_groups_routes():
+    assert endpoint_name("groups/123/messages") == "groups/{id}/messages"
+    assert endpoint_name("groups/123/messages?token=abc") == "groups/{id}/messages"
+    assert endpoint_name("direct_messages") == "direct_messages"
+
+
+def test_records_requests_retries_phases_and_calls_hooks():
+    instrumentation = Instrumentation()
+    events = []
+    instrumentation.add_hook(lambda event, data: events.append(event))
+
+    instrumentation.request("GET", "groups/1/messages", 429, 0.002, 10)
+    instrumentation.retry("GET", "groups/1/messages", 429, 0.5)
+    instrumentation.request("GET", "groups/2/messages", 200, 0.030, 1000)
+    with instrumentation.phase("json"):
+        pass
+
+    stats = instrumentation.endpoints["GET groups/{id}/messages"]
+    assert (stats.requests, stats.errors, stats.retries, stats.bytes) == (2, 1, 1, 1010)
+    assert stats.percentile(0.5) == 5 and stats.percentile(1.0) == 30
+    assert instrumentation.phases["network"] == 0.032
+    assert events == ["request", "retry", "request", "phase"]
+    assert "GET groups/{id}/messages" in instrumentation.report()
@@ -0,0 +1,23 @@
+from groupme.message import CompactMessage, Projection
+
+
+RAW = {"id": "1", "created_at": 1568390400, "sender_id": "42", "name": "Rob", "text": "Go Birds!",
+       "favorited_by": ["7", "8"], "avatar_url": "https://i.groupme.com/rob", "attachments": []}
+
+
+def test_projection_keeps_only_chosen_fields_and_reads_like_a_dict():
+    message = Projection(("sender_id", "text", "favorited_by", "missing")).message(RAW)
+    assert isinstance(message, CompactMessage)
+    assert message['text'] == "Go Birds!" and message.get('sender_id') == "42"
+    assert message['favorited_by'] == ("7", "8")
+    assert 'text' in message and 'avatar_url' not in message and 'missing' not in message
+    assert message.get('avatar_url') is None
+    assert message.to_dict() == {"sender_id": "42", "text": "Go Birds!", "favorited_by": ("7", "8")}
+    assert not hasattr(message, "__dict__")
+
+
+def test_projection_interns_repeated_ids_and_shares_classes():
+    project = Projection(("sender_id", "name"))
+    first, second = project([dict(RAW), {**RAW, "sender_id": "".join(["4", "2"])}])
+    assert first['sender_id'] is second['sender_id']
+    assert type(first) is type(Projection(["sender_id", "name"]).message(RAW))
@@ -0,0 +1,68 @@
+import pytest
+
+import groupme.group_stats as group_stats
+
+from benchmarks.mock_server import MockGroupMeServer
+from groupme.groupme import GroupMe
+from groupme.message_iterator import MessageIterator
+
+
+def test_has_next_next_fetches_each_page_once():
+    with MockGroupMeServer(groups={"Mock Group": 450}) as server:
+        g = GroupMe(api_token="mock", api_url=server.api_url)
+        it = MessageIterator(name="Mock Group", group=True, groupme=g)
+        pages = []
+        while it.has_next():
+            assert it.has_next()  # Asking again doesn't fetch again
+            pages.append(it.next())
+        assert [len(page) for page in pages] == [100, 100, 100, 100, 50]
+        assert server.requests["GET groups/{id}/messages"] == 6  # 5 pages, then the 304 that ends the history
+        assert it.next() is None
+        g.close()
+
+
+def test_prefetch_returns_the_same_pages():
+    with MockGroupMeServer(groups={"Mock Group": 450}) as server:
+        g = GroupMe(api_token="mock", api_url=server.api_url)
+        skip_system = lambda page: [m for m in page if m['sender_id'] != "system"]
+        expected = list(MessageIterator(name="Mock Group", group=True, groupme=g, filt=skip_system))
+        before = server.requests["GET groups/{id}/messages"]
+
+        it = MessageIterator(name="Mock Group", group=True, groupme=g, filt=skip_system, prefetch=True)
+        pages = list(it)
+        assert pages == expected and len(pages) == 5
+        assert server.requests["GET groups/{id}/messages"] - before == 6
+        assert it.executor is None  # Prefetch thread stopped once history ran out
+
+        projected = list(MessageIterator(name="Mock Group", group=True, groupme=g, prefetch=True,
+                                         fields=("id", "text")))
+        assert [[m.to_dict() for m in page] for page in projected] == \
+               [[{"id": m["id"], "text": m["text"]} for m in page] for page in
+                MessageIterator(name="Mock Group", group=True, groupme=g)]
+        g.close()
+
+
+def test_prefetch_thread_stops_when_the_caller_does(monkeypatch):
+    with MockGroupMeServer(groups={"Mock Group": 450}) as server:
+        g = GroupMe(api_token="mock", api_url=server.api_url)
+        with MessageIterator(name="Mock Group", group=True, groupme=g, prefetch=True) as it:
+            for page in it:
+                break  # Stop early with a page still being prefetched
+        assert it.executor is None
+
+        it = MessageIterator(name="Mock Group", group=True, groupme=g, prefetch=True)
+        while it.has_next():
+            it.next()
+        assert it.executor is None
+
+        def fail(stat, page):
+            raise ValueError
+        monkeypatch.setattr(group_stats, "GM_INSTANCE", g)
+        monkeypatch.setattr(group_stats.NumPostsStat, "update", fail)
+        closed = []
+        close = MessageIterator.close
+        monkeypatch.setattr(MessageIterator, "close", lambda self: closed.append(self) or close(self))
+        with pytest.raises(ValueError):
+            group_stats.group_stats("Mock Group", ["num_posts"])
+        assert closed and closed[-1].executor is None
+        g.close()
@@ -0,0 +1,44 @@
+import time
+
+import pytest
+
+from benchmarks.mock_server import MockGroupMeServer
+from groupme.groupme import GroupMe, RateLimitException
+from groupme.ratelimit import RateLimiter, RetryPolicy
+
+
+def test_get_all_messages_pages_whole_history():
+    with MockGroupMeServer(groups={"Mock Group": 450}, chats={"Rob": 30}) as server:
+        g = GroupMe(api_token="mock", api_url=server.api_url)
+        messages = g.get_all_messages(name="Mock Group", group=True)
+        assert len(messages) == 450
+        assert len({m['id'] for m in messages}) == 450
+        assert [int(m['id']) for m in messages] == sorted((int(m['id']) for m in messages), reverse=True)
+        assert len(g.get_all_messages(name="Rob", chat=True)) == 30
+        g.close()
+
+
+def test_throttled_requests_are_retried():
+    with MockGroupMeServer(groups={"Mock Group": 300}, throttle_every=3) as server:
+        g = GroupMe(api_token="mock", api_url=server.api_url, retry_policy=RetryPolicy(backoff=0.01))
+        assert g.rate_limiter is None  # Unthrottled unless asked for
+        assert len(g.get_all_messages(name="Mock Group", group=True)) == 300
+        assert server.request_count > server.requests["GET groups/{id}/messages"] > 3
+        g.close()
+
+
+def test_retry_after_longer_than_the_policy_allows_fails_without_retrying():
+    with MockGroupMeServer(groups={"Mock Group": 300}, throttle_every=1, retry_after=120) as server:
+        g = GroupMe(api_token="mock", api_url=server.api_url, retry_policy=RetryPolicy(max_backoff=8))
+        with pytest.raises(RateLimitException):
+            g.get_group_id("Mock Group")
+        assert server.request_count == 1
+        g.close()
+
+    with MockGroupMeServer(groups={"Mock Group": 300}, throttle_every=2, retry_after=0.2) as server:
+        g = GroupMe(api_token="mock", api_url=server.api_url, rate_limit=RateLimiter(50, max_rate=100))
+        start = time.monotonic()
+        g.get_group_id("Mock Group")
+        assert time.monotonic() - start >= 0.2  # Retry-After waited out in full
+        assert g.rate_limiter.rate < 50  # The adaptive limiter backed off
+        g.close()
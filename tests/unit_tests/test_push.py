@@ -0,0 +1,61 @@
+import asyncio
+import threading
+import time
+
+from benchmarks.mock_server import MockGroupMeServer
+from groupme.groupme import GroupMe
+from groupme.push import PushSubscriber
+
+
+def wait_for(condition, timeout=5):
+    deadline = time.time() + timeout
+    while not condition() and time.time() < deadline:
+        time.sleep(0.01)
+    return condition()
+
+
+def test_push_delivers_and_gap_fills_after_reconnect():
+    with MockGroupMeServer(groups={"Group A": 50, "Group B": 50}, chats={"Rob": 30}, push_timeout=0.5) as server:
+        g = GroupMe(api_token="mock", api_url=server.api_url)
+        received = []
+        subscriber = PushSubscriber(g, callback=received.append, push_url=server.push_url)
+        with subscriber:
+            assert subscriber.wait_connected(5)
+            group_a, group_b = server.group_id("Group A"), server.group_id("Group B")
+            pushed = [server.add_message(group_a), server.add_message("3000")]
+            assert wait_for(lambda: len(received) == 2)
+            assert received == pushed
+            assert "GET groups/{id}/messages" not in server.requests  # Nothing polled
+
+            # Posted while the push server has lost our session: fetched over REST once we're back
+            missed = [server.add_message(group_b, push=False) for _ in range(150)] + \
+                     [server.add_message("3000", push=False) for _ in range(3)]
+            server.drop_push_clients()
+            assert wait_for(lambda: len(received) == 155)
+            assert received[2:] == missed
+            later = server.add_message(group_a)
+            assert wait_for(lambda: len(received) == 156) and received[-1] == later
+        g.close()
+
+
+def test_push_async_iterator():
+    with MockGroupMeServer(groups={"Group A": 10}, push_timeout=0.5) as server:
+        g = GroupMe(api_token="mock", api_url=server.api_url)
+        subscriber = PushSubscriber(g, push_url=server.push_url)
+
+        async def first_two():
+            messages = []
+            async for message in subscriber:
+                messages.append(message)
+                if len(messages) == 2:
+                    return messages
+
+        post = threading.Thread(target=lambda: subscriber.wait_connected(5) and
+                                [server.add_message(server.group_id("Group A")) for _ in range(2)])
+        post.start()
+        messages = asyncio.run(asyncio.wait_for(first_two(), 5))
+        post.join()
+        subscriber.stop()
+        group = server.groups[server.group_id("Group A")]
+        assert messages == [group.message(10), group.message(11)]
+        g.close()
@@ -0,0 +1,26 @@
+from groupme.ratelimit import RateLimiter, RetryPolicy, parse_retry_after
+
+
+def test_limiter_halves_on_throttle_and_recovers_up_to_max():
+    limiter = RateLimiter(20, max_rate=21, increase=0.5)
+    limiter.throttled()
+    assert limiter.rate == 10
+    for _ in range(100):
+        limiter.succeeded()
+    assert limiter.rate == 21
+
+
+def test_limiter_reserve_waits_once_burst_is_spent():
+    limiter = RateLimiter(10, burst=2)
+    assert limiter.reserve() == 0
+    assert limiter.reserve() == 0
+    assert 0 < limiter.reserve() <= 0.1
+
+
+def test_retry_policy_honors_retry_after_and_caps_backoff():
+    policy = RetryPolicy(backoff=1, max_backoff=8)
+    assert policy.delay(0, "3") == 3
+    assert policy.delay(0, "120") is None  # Longer than the policy waits: give up rather than retry early
+    assert all(0 <= policy.delay(10) <= 8 for _ in range(20))
+    assert parse_retry_after("Wed, 21 Oct 2015 07:28:00 GMT") == 0
+    assert parse_retry_after("soon") is None
@@ -0,0 +1,60 @@
+import groupme.group_stats as group_stats
+
+from benchmarks.mock_server import MockGroupMeServer
+from groupme.message import CompactMessage
+from groupme.reducers import RegexTally, WordCount, reduce_groups, reduce_pages
+
+
+def test_parallel_group_stats_match_a_single_pass(monkeypatch):
+    with MockGroupMeServer(groups={"Mock Group": 2500}) as server:
+        g = group_stats.GM_INSTANCE
+        monkeypatch.setattr(g, "api_url", server.api_url)
+        g.invalidate_directory()
+        metrics = list(group_stats.STATS)
+        expected = group_stats.group_stats("Mock Group", metrics)
+        assert group_stats.group_stats("Mock Group", metrics, executor="thread", workers=4) == expected
+        processed = group_stats.group_stats("Mock Group", metrics, executor="process", workers=2)
+        assert processed == expected
+        # Same types too: the most-liked posts come back as CompactMessages whichever way they were tallied
+        compact = lambda result: [(name, isinstance(post, CompactMessage), post.to_dict()) for name, post in result[1]]
+        assert compact(processed["most_liked"]) == compact(expected["most_liked"])
+        assert expected["most_liked"][1] and all(is_compact for _, is_compact, _ in compact(expected["most_liked"]))
+        g.invalidate_directory()
+
+
+def test_parallel_chunks_stay_small_in_a_large_group(monkeypatch):
+    with MockGroupMeServer(groups={"Mock Group": 3000}, members=5000) as server:
+        g = group_stats.GM_INSTANCE
+        monkeypatch.setattr(g, "api_url", server.api_url)
+        g.invalidate_directory()
+        groupid, members = group_stats.group_members("Mock Group")
+        assert len(members) == 5000
+        pages = list(g.iter_pages(groupid=groupid, group=True))
+        metrics = ["num_posts", "num_likes", "num_liked", "len_posts", "orphaned_users"]
+
+        blank = group_stats.STATS["num_posts"](members).empty()
+        assert not blank.scoreboard and blank.names is None  # Chunks don't carry the member list
+        expected = {metric: group_stats.STATS[metric](members) for metric in metrics}
+        reduce_pages(pages, expected)
+        stats = {metric: group_stats.STATS[metric](members) for metric in metrics}
+        reduce_pages(pages, stats, executor="process", workers=2, chunk_pages=2)
+        assert {metric: stat.result() for metric, stat in stats.items()} == \
+               {metric: stat.result() for metric, stat in expected.items()}
+        assert len(stats["num_posts"].result()) == 5000
+        g.invalidate_directory()
+
+
+def test_custom_reducers_over_many_groups():
+    with MockGroupMeServer(groups={"A": 700, "B": 300}) as server:
+        g = group_stats.GroupMe(api_token="mock", api_url=server.api_url)
+        pages = {groupid: list(g.iter_pages(groupid=groupid, group=True)) for groupid in server.groups}
+
+        def make_reducers(members):
+            return {"words": WordCount(top=5), "go": RegexTally(r"\bGo\b", by="sender_id")}
+
+        results = reduce_groups(g, make_reducers, executor="process", workers=2, chunk_pages=2)
+        for groupid, group_pages in pages.items():
+            assert results[groupid] == {name: reducer.result()
+                                        for name, reducer in reduce_pages(group_pages, make_reducers(None)).items()}
+        assert sum(results[server.group_id("A")]["go"].values()) > 0
+        g.close()
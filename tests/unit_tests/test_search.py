@@ -0,0 +1,57 @@
+import re
+
+from benchmarks.mock_server import MockGroupMeServer
+from groupme.archive import MessageArchive
+from groupme.filter import MessageFilter
+from groupme.groupme import GroupMe
+from groupme.message_iterator import MessageIterator
+from groupme.search import SearchQuery, regex_to_fts
+
+
+def test_search_query():
+    query = SearchQuery('go "Birds are"* cat*')
+    assert query.to_fts() == '"go" AND "birds are"* AND "cat"*'
+    assert query.matches("Go Birds arena, Catan tonight")
+    assert not query.matches("go birds")
+    assert not query.matches("ago birds are catan")  # Words match whole, not inside other words
+    assert not query.matches(None)
+
+
+def test_regex_to_fts():
+    assert regex_to_fts(r"^Hello!$") == '"hello"'
+    assert regex_to_fts(r"^Go Birds") == '"go" AND "birds"*'
+    assert regex_to_fts(r"\bgo (birds)!") == '"go" AND "birds"'
+    assert regex_to_fts(r"foo.*bar baz") == '"baz"*'
+    # Nothing every match is guaranteed to contain as a whole/leading word
+    assert regex_to_fts(r"Birds") is None
+    assert regex_to_fts(r"go|birds") is None
+    assert regex_to_fts(r"(") is None
+
+
+def test_archive_search_matches_full_scan(tmp_path):
+    path = str(tmp_path / "archive.db")
+    with MockGroupMeServer(groups={"Mock Group": 600}) as server:
+        g = GroupMe(api_token="mock", api_url=server.api_url)
+        everything = g.get_all_messages(name="Mock Group", group=True)
+        g.close()
+
+        g = GroupMe(api_token="mock", api_url=server.api_url, archive_path=path)
+        for text, search in ((r"^Go ", None), (None, '"go birds" eag*'), (r"lol$", "pizza")):
+            message_filter = MessageFilter(text=text, search=search, groupme=g)
+            expected = message_filter.filter_messages(everything)
+            assert expected and message_filter.match
+            assert g.get_all_messages(name="Mock Group", group=True, filt=message_filter.filter_lambda()) == expected
+            pages = MessageIterator(name="Mock Group", group=True, filt=message_filter.filter_lambda(), groupme=g)
+            assert [m for page in pages for m in page] == expected
+        g.close()
+
+    # Indexing messages archived before full-text search existed
+    archive = MessageArchive(path)
+    archive.db.execute("DROP TABLE messages_fts")
+    archive.close()
+    archive = MessageArchive(path)
+    conversation = archive.conversation_key(groupid=server.group_id("Mock Group"))
+    found = [m for page in archive.iter_pages(conversation, match='"pizza"') for m in page]
+    assert [m['id'] for m in found] == [m['id'] for m in everything
+                                        if m['text'] and re.search(r"\bpizza\b", m['text'], re.I)]
+    archive.close()
@@ -0,0 +1,72 @@
+from benchmarks.mock_server import BASE_TIME, TIME_STEP, MockGroupMeServer
+from groupme.groupme import GroupMe
+from groupme.seek_index import SeekIndex
+
+
+def page(*ids):
+    return [{"id": str(i), "created_at": i * 10} for i in ids]
+
+
+def test_bracket_finds_nearest_indexed_ids_around_date():
+    index = SeekIndex()
+    index.record("group:1", page(90, 80))
+    index.record("group:1", page(50, 40))
+    assert index.bracket("group:1", 600) == (50, 80)
+    assert index.bracket("group:1", 50) == (None, 40)
+    assert index.bracket("group:1", 1000) == (90, None)
+    assert index.bracket("group:2", 600) == (None, None)
+
+
+def test_persists_between_instances(tmp_path):
+    path = str(tmp_path / "seek.json")
+    index = SeekIndex(path)
+    index.record("chat:7", page(20, 10))
+    index.save()
+    assert SeekIndex(path).bracket("chat:7", 150) == (10, 20)
+
+
+def created_before(max_created_at):
+    """ A filter with an upper date bound, like MessageFilter's. """
+
+    filt = lambda page: [m for m in page if m['created_at'] < max_created_at]
+    filt.max_created_at = max_created_at
+    return filt
+
+
+def test_seek_before_id_matches_full_scan_with_few_requests():
+    with MockGroupMeServer(groups={"Mock Group": 20000}, chats={"Rob": 3000}) as server:
+        groupid = server.group_id("Mock Group")
+        group, chat = server.groups[groupid], server.chats["3000"]
+        g = GroupMe(api_token="mock", api_url=server.api_url)
+
+        def seek(client, max_created_at, endpoint="GET groups/{id}/messages", **conversation):
+            before = server.requests.get(endpoint, 0)
+            before_id = client.seek_before_id(max_created_at=max_created_at, **conversation)
+            return before_id, server.requests[endpoint] - before
+
+        # Cold index: probes land exactly on the oldest message in the date range
+        date = BASE_TIME + 12345 * TIME_STEP - 1
+        before_id, requests = seek(g, date, groupid=groupid)
+        assert before_id == group.message_id(12345) and requests <= 20
+        assert g.get_all_messages(groupid=groupid, group=True, filt=created_before(date)) == \
+               [group.message(i) for i in range(12344, -1, -1)]
+
+        # Warm index: the same or a nearby date costs at most the one page that confirms it
+        assert seek(g, date, groupid=groupid) == (group.message_id(12345), 1)
+        assert seek(g, date + 55 * TIME_STEP, groupid=groupid) == (group.message_id(12400), 1)
+
+        # A date before the first message leaves nothing to page through; one after the newest starts at the top
+        cold = GroupMe(api_token="mock", api_url=server.api_url)
+        before_id, requests = seek(cold, BASE_TIME - 1, groupid=groupid)
+        assert requests <= 20
+        assert cold.get_1page_group(groupid, before=before_id) is None
+        assert seek(cold, BASE_TIME + 20000 * TIME_STEP, groupid=groupid) == (0, 1)
+
+        # Direct messages
+        date = BASE_TIME + 1234 * TIME_STEP - 1
+        before_id, requests = seek(cold, date, endpoint="GET direct_messages", chatid="3000")
+        assert before_id == chat.message_id(1234) and requests <= 15
+        assert cold.get_all_messages(chatid="3000", chat=True, filt=created_before(date)) == \
+               created_before(date)(g.get_all_messages(chatid="3000", chat=True))
+        g.close()
+        cold.close()
@@ -0,0 +1,73 @@
+import time
+
+from benchmarks.mock_server import MockGroupMeServer
+from groupme.groupme import BadMessageException, BadRequestException, GroupMe
+
+
+GROUPS = {f"Group {n}": 10 for n in range(4)}
+
+
+def test_send_queue_keeps_order_per_conversation_with_unique_guids():
+    with MockGroupMeServer(groups=GROUPS, latency=0.01) as server:
+        g = GroupMe(api_token="mock", api_url=server.api_url)
+        long_text = "\n".join(f"part {n} " + "x" * 900 for n in range(3))
+        with g.send_queue(workers=4) as queue:
+            futures = [queue.submit(f"{name} message {n}", name=name, group=True)
+                       for n in range(5) for name in GROUPS]
+            futures.append(queue.submit(long_text, name="Group 0", group=True))
+
+        results = [future.result() for future in futures]
+        assert all(result.ok for chunks in results for result in chunks)
+        sent = [body["message"] for body in server.sent]
+        for name in GROUPS:
+            assert [m["text"] for m in sent if m["text"].startswith(name)] == [f"{name} message {n}" for n in range(5)]
+        assert [m["text"] for m in sent if m["text"].startswith("part")] == g.split_message(long_text)
+        assert [result.text for result in results[-1]] == g.split_message(long_text)
+
+        guids = [result.source_guid for chunks in results for result in chunks]
+        assert len(set(guids)) == len(guids) == len(sent)
+        assert set(guids) == {m["source_guid"] for m in sent}
+        g.close()
+
+
+def test_send_queue_sends_to_conversations_concurrently():
+    latency = 0.1
+    with MockGroupMeServer(groups=GROUPS, latency=latency) as server:
+        g = GroupMe(api_token="mock", api_url=server.api_url)
+        g.get_group_id("Group 0")  # Warm the directory so only sends are timed
+        start = time.perf_counter()
+        with g.send_queue(workers=4) as queue:
+            for n in range(2):
+                for name in GROUPS:
+                    queue.submit(f"{name} message {n}", name=name, group=True)
+            results = queue.join()
+        elapsed = time.perf_counter() - start
+        assert len(server.sent) == len(results) == 8
+        assert elapsed < 8 * latency * 0.6  # Sequential sending would take 8 round trips
+        g.close()
+
+
+def test_failed_chunk_stops_the_rest_of_its_message(monkeypatch):
+    with MockGroupMeServer(groups=GROUPS) as server:
+        g = GroupMe(api_token="mock", api_url=server.api_url)
+        post_message = g.post_message
+
+        def flaky_post_message(text, **target):
+            if text.startswith("part 1"):
+                raise BadMessageException
+            return post_message(text, **target)
+
+        monkeypatch.setattr(g, "post_message", flaky_post_message)
+        long_text = "\n".join(f"part {n} " + "x" * 900 for n in range(3))
+        with g.send_queue() as queue:
+            failed = queue.submit(long_text, name="Group 0", group=True)
+            after = queue.submit("after", name="Group 0", group=True)
+            missing = queue.submit("hello?", groupid="404", group=True)
+
+        first, second = failed.result()
+        assert first.ok and not second.ok and isinstance(second.error, BadMessageException)
+        assert [body["message"]["text"] for body in server.sent if body["message"]["text"] != "hello?"] == \
+               [first.text, "after"]  # "part 2" was never sent
+        assert after.result()[0].ok
+        assert isinstance(missing.result()[0].error, BadRequestException)
+        g.close()
@@ -0,0 +1,28 @@
+from groupme.groupme import GroupMe
+
+
+def split(m):
+    return GroupMe().split_message(m)
+
+
+def test_short_message_is_one_chunk():
+    assert split("Hello!") == ["Hello!"]
+
+
+def test_prefers_newlines_then_spaces_then_hard_cuts():
+    lines = ["a" * 600, "b b " * 100, "c" * 600]
+    chunks = split("\n".join(lines))
+    assert chunks[0] == lines[0]
+    assert chunks[1] == lines[1]
+    assert split(("word " * 400).strip())[0] == ("word " * 200).strip()
+    assert split("x" * 2500) == ["x" * 1000, "x" * 1000, "x" * 500]
+
+
+def test_never_exceeds_max_length_or_loses_text():
+    m = "\n".join(("line %d " % i) * (i % 37) + "y" * (i * 13 % 1500) for i in range(500))
+    chunks = split(m)
+    assert all(0 < len(chunk) <= 1000 for chunk in chunks)
+    rejoined = "".join(chunks)
+    assert rejoined.replace(" ", "").replace("\n", "") == m.replace(" ", "").replace("\n", "")
+    # Only the single separator at each cut is dropped
+    assert len(m) - len(rejoined) <= len(chunks) - 1
@@ -0,0 +1,83 @@
+import logging
+import threading
+import time
+
+from benchmarks.mock_server import MockGroupMeServer
+from groupme.groupme import APIAuthException, GroupMe
+
+
+def test_tail_follows_many_groups_with_adaptive_polling(caplog):
+    with MockGroupMeServer(groups={"Busy": 500, "Quiet": 500, "Other": 500}) as server:
+        g = GroupMe(api_token="mock", api_url=server.api_url)
+        busy, quiet = server.group_id("Busy"), server.group_id("Quiet")
+        stop = threading.Event()
+        received = []
+
+        def follow():
+            for message in g.tail(group_names=["Busy", "Quiet"], min_interval=0.02, max_interval=0.2, stop=stop):
+                received.append(message)
+
+        thread = threading.Thread(target=follow)
+        with caplog.at_level(logging.INFO):
+            thread.start()
+            while "GET groups/{id}/messages" not in server.requests:  # Caught up to the newest messages
+                time.sleep(0.01)
+            posted = []
+            for i in range(10):
+                posted.append(server.add_message(busy, push=False))
+                time.sleep(0.05)
+            posted += [server.add_message(busy, push=False) for _ in range(150)]  # A burst bigger than one page
+            posted.append(server.add_message(quiet, push=False))
+            server.add_message(server.group_id("Other"), push=False)  # Not followed
+            deadline = time.time() + 5
+            while len(received) < len(posted) and time.time() < deadline:
+                time.sleep(0.02)
+            time.sleep(0.5)
+            stop.set()
+            thread.join(5)
+        g.close()
+
+    assert sorted(received, key=lambda m: (m['group_id'], int(m['id']))) == \
+           sorted(posted, key=lambda m: (m['group_id'], int(m['id'])))
+    assert [m['id'] for m in received if m['group_id'] == busy] == [m['id'] for m in posted[:160]]
+    assert not [r for r in caplog.records if r.levelno >= logging.ERROR]  # 304s are "nothing new", not errors
+
+
+def test_tail_drops_or_backs_off_failing_conversations(monkeypatch, caplog):
+    with MockGroupMeServer(groups={"Left": 100, "Locked": 100, "Kept": 100}) as server:
+        g = GroupMe(api_token="mock", api_url=server.api_url)
+        left, locked, kept = (server.group_id(name) for name in ("Left", "Locked", "Kept"))
+        get_messages_after = g.get_messages_after
+
+        def refuse_locked(after, groupid=None, **kwargs):
+            if groupid == locked:
+                raise APIAuthException
+            return get_messages_after(after, groupid=groupid, **kwargs)
+
+        monkeypatch.setattr(g, "get_messages_after", refuse_locked)
+        del server.groups[left]  # Left the group: polling it now 404s
+        stop = threading.Event()
+        received = []
+
+        def follow():
+            for message in g.tail(groupids=[left, locked, kept], min_interval=0.02, max_interval=0.3, stop=stop):
+                received.append(message)
+
+        thread = threading.Thread(target=follow)
+        with caplog.at_level(logging.WARNING):
+            thread.start()
+            time.sleep(0.2)
+            posted = [server.add_message(kept, push=False) for _ in range(3)]
+            deadline = time.time() + 5
+            while len(received) < len(posted) and time.time() < deadline:
+                time.sleep(0.02)
+            time.sleep(0.3)
+            stop.set()
+            thread.join(5)
+        g.close()
+
+    assert received == posted
+    dropped = [r for r in caplog.records if "no longer following" in r.getMessage()]
+    refused = [r for r in caplog.records if "was refused" in r.getMessage()]
+    assert len(dropped) == 1 and f"group:{left}" in dropped[0].getMessage()
+    assert 1 <= len(refused) <= 5  # Retried only every max_interval, not every min_interval
@@ -0,0 +1,57 @@
+from benchmarks.mock_server import MockGroupMeServer
+from groupme.filter import MessageFilter
+from groupme.groupme import GroupMe
+from groupme.user_directory import UserDirectory
+
+
+MEMBERS = {"10": [{"user_id": "1", "name": "Rob", "nickname": "Robert"},
+                  {"user_id": "2", "name": "Alec", "nickname": "Al"}],
+           "20": [{"user_id": "2", "name": "Alec", "nickname": "Big Al"}]}
+
+
+def test_lookups_by_id_name_and_nickname_across_groups():
+    users = UserDirectory(MEMBERS)
+    assert users.member("10", "1")["nickname"] == "Robert"
+    assert users.member(20, "1") is None
+    assert users.user_id(name="Alec") == users.user_id(nickname="Big Al") == "2"
+    assert users.user_id(nickname="Robert", groupid="10") == "1"
+    assert users.display_name("20", "2") == "Big Al"
+
+
+def test_former_members_are_recorded_and_survive_a_rebuild():
+    users = UserDirectory(MEMBERS)
+    users.add_former_member("10", "3", "Isabella")
+    users.add_former_member("10", "1", "Rob")  # Still a member
+    users.add_former_member("10", "system", "GroupMe")
+    assert users.former_members("10") == {"3": "Isabella"}
+    assert users.user_id(name="Isabella", groupid="10") == "3"
+    assert UserDirectory(MEMBERS, former=users.former).former_members("10") == {"3": "Isabella"}
+
+
+def test_message_filter_resolves_username_through_the_directory(monkeypatch):
+    g = GroupMe()
+    monkeypatch.setattr(g, "user_directory", lambda refresh=False: UserDirectory(MEMBERS))
+    f = MessageFilter(username="Robert", groupme=g)
+    messages = [{"id": "2", "group_id": "10", "sender_id": "1", "name": "Bobby", "text": "hi", "created_at": 1},
+                {"id": "1", "group_id": "10", "sender_id": "2", "name": "Robert", "text": "hi", "created_at": 1}]
+    assert [m["id"] for m in f.filter_messages(messages)] == ["2"]
+
+
+def test_client_name_and_id_lookups_go_through_the_directory():
+    with MockGroupMeServer(groups={"Mock Group": 10}, chats={"Rob": 10}) as server:
+        g = GroupMe(api_token="mock", api_url=server.api_url)
+        assert g.get_user_id(nickname="Nickname 3") == "1003"
+        assert g.get_user_id(name="User 3", groupid=server.group_id("Mock Group")) == "1003"
+        assert g.get_user_name("1003") == "User 3"
+        assert server.requests.get("GET chats") is None  # Found among group members without listing chats
+        assert g.get_user_name("3000") == "Rob"
+        assert g.user_directory().user_id(name="Rob") == "3000"
+        g.close()
+
+
+def test_get_user_id_still_accepts_a_member_list():
+    g = GroupMe(api_token="mock")
+    g.user_directory = None  # Not consulted when members are given
+    assert g.get_user_id(MEMBERS["10"], "Alec") == "2"
+    assert g.get_user_id(MEMBERS["10"], nickname="Robert") == "1"
+    assert g.get_user_id(MEMBERS["10"], "Nobody") is None